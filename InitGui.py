@@ -53,7 +53,8 @@ class AplanWorkbench(Workbench):
             from webtest.http import StopableWSGIServer
         except ImportError as ie:
             aplanutils.missingPythonModule(str(ie.name or ""))
-        self.server = StopableWSGIServer.create(server.app, port=8080, host="0.0.0.0")
+        # Every open event stream (see server.streamEvents) holds one of the server threads
+        self.server = StopableWSGIServer.create(server.app, port=8080, host="0.0.0.0", threads=8)
 
     def Deactivated(self):
         self.server.shutdown()
@@ -36,7 +36,7 @@ if FreeCAD.GuiUp:
 from . import base_aplanpythonobject
 from aplanobjects import graphs
 from aplansolvers.aplan_obstruction_detectors import base_obstruction_detector as base
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 try:
     import typing
 except ImportError as ie:
@@ -80,3 +80,5 @@ class GeomConstraints(base_aplanpythonobject.BaseAplanPythonObject):
                         obstrGraph.add_node(component.Label)
 
             obstrGraph.exportToFile(obj.FileLocation)
+            with result_store.ResultStore.forWorkingDir(analysis.WorkingDir) as store:
+                store.replaceConstraints(obj.Label, motionDirection.name, obstrGraph.edges)
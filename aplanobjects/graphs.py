@@ -29,13 +29,19 @@ __author__ = "Martijn Cramer"
 __url__ = "https://www.freecadweb.org"
 
 try:
-    from collections import defaultdict
+    from collections import defaultdict, OrderedDict
     import graphviz
     import json
+    import math
     import networkx as nx
+    import numpy as np
+    import os
     import pickle
+    import sqlite3
     import typing
     import uuid
+    import weakref
+    from xml.sax.saxutils import escape, quoteattr
 except ImportError as ie:
     print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
 
@@ -118,6 +124,52 @@ class ObstructionGraph(nx.DiGraph):
         return self
 
 
+def node_key(mask: int) -> str:
+    """ID of a subassembly in the exports and the web app: its bitmask over the sorted component labels, in hexadecimal."""
+    return "{:x}".format(mask)
+
+
+def _stream_json(file_loc: str, labels: typing.List[str], masks: typing.Iterable[int],
+                 hyperedges: typing.Iterable[typing.Tuple[int, typing.Sequence[int]]]) -> None:
+    """Writes the graph record by record, so that neither the graph nor the JSON document has to be held in memory."""
+    with open(file_loc, 'w') as file:
+        file.write('{{"labels": {}, "nodes": ['.format(json.dumps(labels)))
+        separator: str = ""
+        for mask in masks:
+            file.write('{}\n{}'.format(separator, json.dumps({"id": node_key(mask),
+                                                              "elements": [label for index, label in enumerate(labels) if mask >> index & 1]})))
+            separator = ","
+        file.write('], "hyperedges": [')
+        separator = ""
+        for parent, children in hyperedges:
+            file.write('{}\n{}'.format(separator, json.dumps({"parent": node_key(parent), "children": [node_key(child) for child in children]})))
+            separator = ","
+        file.write(']}\n')
+
+
+def _stream_graphml(file_loc: str, labels: typing.List[str], masks: typing.Iterable[int],
+                    hyperedges: typing.Iterable[typing.Tuple[int, typing.Sequence[int]]]) -> None:
+    """Writes the graph as GraphML, record by record. Every hyperedge becomes an AND node with an edge from its parent
+    and an edge to each of its children, which keeps the file readable by tools without hyperedge support.
+    """
+    with open(file_loc, 'w') as file:
+        file.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                   '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                   '<key id="type" for="node" attr.name="type" attr.type="string"/>\n'
+                   '<key id="elements" for="node" attr.name="elements" attr.type="string"/>\n'
+                   '<graph id="AND-OR_graph" edgedefault="directed">\n')
+        for mask in masks:
+            file.write('<node id={}><data key="type">or</data><data key="elements">{}</data></node>\n'.format(
+                quoteattr(node_key(mask)), escape(json.dumps([label for index, label in enumerate(labels) if mask >> index & 1]))))
+        for index, (parent, children) in enumerate(hyperedges):
+            and_key: str = quoteattr("e{}".format(index))
+            file.write('<node id={}><data key="type">and</data></node>\n'.format(and_key))
+            file.write('<edge source={} target={}/>\n'.format(quoteattr(node_key(parent)), and_key))
+            for child in children:
+                file.write('<edge source={} target={}/>\n'.format(and_key, quoteattr(node_key(child))))
+        file.write('</graph>\n</graphml>\n')
+
+
 class AndOrGraph:
     def __init__(self) -> None:
         self.nodes = set()
@@ -126,15 +178,33 @@ class AndOrGraph:
         self.outgoing_edges = defaultdict(set)
         self.parent_nodes = defaultdict(set)
         self.child_nodes = defaultdict(set)
+        # Canonical key (the frozenset of a node's elements) -> node
+        self.node_index: typing.Dict[typing.FrozenSet[str], Node] = {}
+
+    @classmethod
+    def from_hyperedges(cls, subassemblies: typing.Iterable[typing.Iterable[str]],
+                        hyperedges: typing.Iterable[typing.Tuple[typing.Iterable[str], typing.Iterable[typing.Iterable[str]]]]) -> AndOrGraph:
+        """Builds the nodes of the subassemblies and the (parent, children) hyperedges between them in one pass."""
+        graph: AndOrGraph = cls()
+        for subassembly in subassemblies:
+            graph.add_node(Node(elements=sorted(subassembly)))
+        for parent, children in hyperedges:
+            graph.add_edge(AndEdge(graph.node_index[frozenset(parent)], [graph.node_index[frozenset(child)] for child in children]))
+        return graph
 
     def add_node(self, node: Node) -> None:
         self.nodes.add(node)
+        self.node_index.setdefault(frozenset(node.elements), node)
 
     def add_nodes_from(self, nodes: typing.Iterable[Node]) -> None:
-        self.nodes.update(set(nodes))
+        for node in nodes:
+            self.add_node(node)
 
     def remove_node(self, node: Node) -> None:
         self.nodes.remove(node)
+        key: typing.FrozenSet[str] = frozenset(node.elements)
+        if self.node_index.get(key) is node:
+            self.node_index.pop(key)
 
         for parent_node in self.parent_nodes[node]:
             self.child_nodes[parent_node].remove(node)
@@ -163,10 +233,7 @@ class AndOrGraph:
             self.outgoing_edges.pop(node)
 
     def get_node(self, elements):
-        elements.sort()
-        for node in self.nodes:
-            if node.elements == elements:
-                return node
+        return self.node_index.get(frozenset(elements))
 
     def add_edge(self, edge):
         self.edges.add(edge)
@@ -232,10 +299,665 @@ class AndOrGraph:
             pickle.dump(self.__dict__, output_file)
 
     def load(self, file_loc):
-        name = self.name 
         with open(file_loc, "rb") as input_file:
             self.__dict__.update(pickle.load(input_file))
-        self.name = name
+        if "node_index" not in self.__dict__ or not self.node_index:
+            # Pickled before the node index existed
+            self.node_index = {}
+            for node in self.nodes:
+                self.node_index.setdefault(frozenset(node.elements), node)
+
+    def to_compact(self) -> CompactAndOrGraph:
+        compact_graph: CompactAndOrGraph = CompactAndOrGraph({label for node in self.nodes for label in node.elements})
+        node_ids: typing.Dict[Node, int] = {node: compact_graph.add_node_mask(compact_graph.to_mask(node.elements)) for node in self.nodes}
+        for edge in self.edges:
+            compact_graph.add_edge_ids(node_ids[edge.parent_node], [node_ids[child_node] for child_node in edge.child_nodes])
+        return compact_graph
+
+    def export_json(self, file_loc: str) -> None:
+        self.to_compact().export_json(file_loc)
+
+    def export_graphml(self, file_loc: str) -> None:
+        self.to_compact().export_graphml(file_loc)
+
+
+class StoredAndOrGraph:
+    """AND/OR graph kept in an SQLite file, written while it is generated and loaded lazily when it is queried.
+
+    Subassemblies are stored as bitmasks over the sorted component labels (see IAndOrGraphGenerator) and hyperedges as
+    (parent, child1, child2) rows, so the graph is never held in memory as a whole. Node objects are only created for
+    the subassemblies that are queried, and the same Node is returned for a subassembly as long as it is referenced.
+    """
+
+    _SCHEMA: typing.Final[str] = """
+    CREATE TABLE IF NOT EXISTS components (bit INTEGER PRIMARY KEY, label TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS nodes (mask BLOB PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_nodes_length ON nodes (length, mask);
+    CREATE TABLE IF NOT EXISTS edges (parent BLOB NOT NULL, child1 BLOB NOT NULL, child2 BLOB NOT NULL);
+    CREATE INDEX IF NOT EXISTS idx_edges_parent ON edges (parent);
+    CREATE INDEX IF NOT EXISTS idx_edges_child1 ON edges (child1);
+    CREATE INDEX IF NOT EXISTS idx_edges_child2 ON edges (child2);
+    """
+    _PAGE_SIZE: typing.Final[int] = 10000
+
+    def __init__(self, file_loc: str, labels: typing.Optional[typing.List[str]] = None) -> None:
+        """Creates a new, empty graph file for the given component labels, or opens an existing one if no labels are given."""
+        self._file_loc: str = file_loc
+        self._connection: sqlite3.Connection = sqlite3.connect(file_loc)
+        # Lets worker processes read the nodes while the hyperedges are being written
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        if labels is not None:
+            self._connection.executescript("DROP TABLE IF EXISTS components; DROP TABLE IF EXISTS nodes; DROP TABLE IF EXISTS edges;")
+            self._connection.executescript(self._SCHEMA)
+            self._connection.executemany("INSERT INTO components (bit, label) VALUES (?, ?)", enumerate(labels))
+            self._connection.commit()
+        self._labels: typing.List[str] = [row[0] for row in self._connection.execute("SELECT label FROM components ORDER BY bit")]
+        self._bits: typing.Dict[str, int] = {label: 1 << index for index, label in enumerate(self._labels)}
+        self._no_bytes: int = max(1, (len(self._labels) + 7) // 8)
+        self._node_cache: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    @property
+    def file_loc(self) -> str:
+        return self._file_loc
+
+    @property
+    def labels(self) -> typing.List[str]:
+        return self._labels
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    # ********************* START: Bitmask interface *********************
+
+    def add_subassemblies(self, masks: typing.Iterable[int]) -> None:
+        self._connection.executemany("INSERT OR IGNORE INTO nodes (mask, length) VALUES (?, ?)",
+                                     ((self.__encode(mask), bin(mask).count("1")) for mask in masks))
+
+    def add_cutsets(self, cutsets: typing.Iterable[typing.Tuple[int, int, int]]) -> None:
+        self._connection.executemany("INSERT INTO edges (parent, child1, child2) VALUES (?, ?, ?)",
+                                     ((self.__encode(parent), self.__encode(child1), self.__encode(child2)) for parent, child1, child2 in cutsets))
+
+    def has_subassembly(self, mask: int) -> bool:
+        return self._connection.execute("SELECT 1 FROM nodes WHERE mask = ?", (self.__encode(mask),)).fetchone() is not None
+
+    def count_subassemblies(self, length: int) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM nodes WHERE length = ?", (length,)).fetchone()[0]
+
+    def iter_subassemblies(self, length: typing.Optional[int] = None) -> typing.Iterator[int]:
+        """Iterates the subassemblies (of a given length) page by page, so that rows can be added in between."""
+        lengths: typing.Iterable[int] = [length] if length is not None else \
+            [row[0] for row in self._connection.execute("SELECT DISTINCT length FROM nodes ORDER BY length")]
+        for length_ in lengths:
+            last: bytes = b""
+            while True:
+                rows: typing.List = self._connection.execute("SELECT mask FROM nodes WHERE length = ? AND mask > ? ORDER BY mask LIMIT ?",
+                                                             (length_, last, self._PAGE_SIZE)).fetchall()
+                for row in rows:
+                    yield self.__decode(row[0])
+                if len(rows) < self._PAGE_SIZE:
+                    break
+                last = rows[-1][0]
+
+    def number_of_cutsets(self, mask: int) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM edges WHERE parent = ?", (self.__encode(mask),)).fetchone()[0]
+
+    def iter_cutsets(self, mask: int, offset: int = 0, limit: typing.Optional[int] = None) -> typing.Iterator[typing.Tuple[int, int]]:
+        """Iterates the child masks of the hyperedges of the subassembly `mask` in insertion order; `offset` and `limit` select a page of them."""
+        for row in self._connection.execute("SELECT child1, child2 FROM edges WHERE parent = ? ORDER BY rowid LIMIT ? OFFSET ?", 
+                                            (self.__encode(mask), -1 if limit is None else limit, offset)).fetchall():
+            yield self.__decode(row[0]), self.__decode(row[1])
+
+    def iter_parents(self, mask: int) -> typing.Iterator[typing.Tuple[int, int, int]]:
+        encoded: bytes = self.__encode(mask)
+        for row in self._connection.execute("SELECT parent, child1, child2 FROM edges WHERE child1 = ? OR child2 = ?", (encoded, encoded)).fetchall():
+            yield self.__decode(row[0]), self.__decode(row[1]), self.__decode(row[2])
+
+    def iter_hyperedges(self) -> typing.Iterator[typing.Tuple[int, typing.Tuple[int, int]]]:
+        for row in self._connection.execute("SELECT parent, child1, child2 FROM edges"):
+            yield self.__decode(row[0]), (self.__decode(row[1]), self.__decode(row[2]))
+
+    def __encode(self, mask: int) -> bytes:
+        # Big-endian, so that the byte order of the BLOBs matches the order of the masks
+        return mask.to_bytes(self._no_bytes, "big")
+
+    def __decode(self, data: bytes) -> int:
+        return int.from_bytes(data, "big")
+
+    def export_json(self, file_loc: str) -> None:
+        _stream_json(file_loc, self._labels, self.iter_subassemblies(), self.iter_hyperedges())
+
+    def export_graphml(self, file_loc: str) -> None:
+        _stream_graphml(file_loc, self._labels, self.iter_subassemblies(), self.iter_hyperedges())
+
+    # ********************* END: Bitmask interface *********************
+
+    # ********************* START: AndOrGraph interface *********************
+
+    @property
+    def nodes(self) -> typing.Iterator[Node]:
+        return (self.__get_node(mask) for mask in self.iter_subassemblies())
+
+    def number_of_nodes(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM nodes").fetchone()[0]
+
+    def number_of_edges(self) -> int:
+        return self._connection.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+
+    def get_node(self, elements) -> typing.Optional[Node]:
+        mask: int = 0
+        for label in elements:
+            if label not in self._bits:
+                return None
+            mask |= self._bits[label]
+        return self.__get_node(mask) if self.has_subassembly(mask) else None
+
+    def get_outgoing_edges(self, node: Node) -> typing.List[AndEdge]:
+        return [AndEdge(node, self.__get_children(child1, child2)) for child1, child2 in self.iter_cutsets(self.__to_mask(node))]
+
+    def get_incoming_edges(self, node: Node) -> typing.List[AndEdge]:
+        return [AndEdge(self.__get_node(parent), self.__get_children(child1, child2)) for parent, child1, child2 in self.iter_parents(self.__to_mask(node))]
+
+    def load(self) -> AndOrGraph:
+        """Materializes the whole graph as an AndOrGraph."""
+        graph: AndOrGraph = AndOrGraph()
+        nodes: typing.Dict[int, Node] = {mask: self.__get_node(mask) for mask in self.iter_subassemblies()}
+        graph.add_nodes_from(nodes.values())
+        graph.add_edges_from([AndEdge(nodes[self.__decode(row[0])], self.__get_children(self.__decode(row[1]), self.__decode(row[2])))
+                              for row in self._connection.execute("SELECT parent, child1, child2 FROM edges")])
+        return graph
+
+    def __get_node(self, mask: int) -> Node:
+        node: typing.Optional[Node] = self._node_cache.get(mask)
+        if node is None:
+            node = Node(elements=[label for index, label in enumerate(self._labels) if mask >> index & 1])
+            self._node_cache[mask] = node
+        return node
+
+    def __get_children(self, child1: int, child2: int) -> typing.List[Node]:
+        return sorted([self.__get_node(child1), self.__get_node(child2)], key=lambda node: node.elements)
+
+    def __to_mask(self, node: Node) -> int:
+        mask: int = 0
+        for label in node.elements:
+            mask |= self._bits[label]
+        return mask
+
+    # ********************* END: AndOrGraph interface *********************
+
+
+class _GrowableArray:
+    """NumPy array with amortized O(1) appends."""
+
+    def __init__(self, dtype, row_shape: typing.Tuple[int, ...] = ()) -> None:
+        self._data: np.ndarray = np.zeros((16,) + row_shape, dtype=dtype)
+        self._size: int = 0
+
+    @classmethod
+    def wrap(cls, data: np.ndarray) -> _GrowableArray:
+        """Wraps an existing (e.g. memory-mapped) array without copying it; it is only copied once it has to grow."""
+        array: _GrowableArray = cls(data.dtype, data.shape[1:])
+        array._data = data
+        array._size = len(data)
+        return array
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[:self._size]
+
+    def append(self, value) -> int:
+        if self._size == len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._data[self._size] = value
+        self._size += 1
+        return self._size - 1
+
+    def extend(self, values) -> None:
+        values = np.asarray(values, dtype=self._data.dtype)
+        while self._size + len(values) > len(self._data):
+            self._data = np.concatenate([self._data, np.zeros_like(self._data)])
+        self._data[self._size:self._size+len(values)] = values
+        self._size += len(values)
+
+
+class _NodeMapping:
+    """Read-only mapping from a node to the set of edges or nodes returned by `getter`, mirroring AndOrGraph's defaultdict indexes."""
+
+    def __init__(self, getter: typing.Callable[[Node], typing.Set]) -> None:
+        self._getter: typing.Callable[[Node], typing.Set] = getter
+
+    def __getitem__(self, node: Node) -> typing.Set:
+        return self._getter(node)
+
+
+class CompactAndOrGraph:
+    """Array-backed AND/OR graph.
+
+    Nodes are integer IDs whose elements are stored as bitmasks over the sorted component labels, in a (nodes x words)
+    uint64 array. Hyperedges are stored in CSR style: a parent ID per edge, and child offsets into a flat array of child IDs.
+    The outgoing and incoming edges of every node are indexed by CSR arrays as well; these are rebuilt lazily after edges
+    have been added. Removed nodes and edges are only flagged as such.
+
+    The methods taking and returning Node and AndEdge objects mirror AndOrGraph; Node objects are created on demand and
+    keep their identity while they are referenced. The methods taking IDs avoid creating any objects.
+    """
+
+    def __init__(self, labels: typing.Iterable[str]) -> None:
+        self._labels: typing.List[str] = sorted(labels)
+        self._bits: typing.Dict[str, int] = {label: 1 << index for index, label in enumerate(self._labels)}
+        self._no_words: int = max(1, math.ceil(len(self._labels) / 64))
+
+        self._masks: _GrowableArray = _GrowableArray(np.uint64, (self._no_words,))
+        self._node_alive: _GrowableArray = _GrowableArray(np.bool_)
+        self._node_ids: typing.Dict[int, int] = {}
+        # IDs of the nodes of a loaded graph sorted by mask, searched instead of building _node_ids for them
+        self._sorted_node_ids: typing.Optional[np.ndarray] = None
+
+        self._edge_parents: _GrowableArray = _GrowableArray(np.int32)
+        self._child_offsets: _GrowableArray = _GrowableArray(np.int64)
+        self._child_offsets.append(0)
+        self._children: _GrowableArray = _GrowableArray(np.int32)
+        self._edge_alive: _GrowableArray = _GrowableArray(np.bool_)
+
+        self._out_index: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]] = None
+        self._in_index: typing.Optional[typing.Tuple[np.ndarray, np.ndarray]] = None
+        self._node_cache: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+        self.outgoing_edges: _NodeMapping = _NodeMapping(lambda node: set(self.__edges_of(self.out_edge_ids(self.__id_of(node)))))
+        self.incoming_edges: _NodeMapping = _NodeMapping(lambda node: set(self.__edges_of(self.in_edge_ids(self.__id_of(node)))))
+        self.child_nodes: _NodeMapping = _NodeMapping(lambda node: {self.__node_of(child_id) for edge_id in self.out_edge_ids(self.__id_of(node))
+                                                                    for child_id in self.edge_children(edge_id)})
+        self.parent_nodes: _NodeMapping = _NodeMapping(lambda node: {self.__node_of(self.edge_parent(edge_id)) for edge_id in self.in_edge_ids(self.__id_of(node))})
+
+    @property
+    def labels(self) -> typing.List[str]:
+        return self._labels
+
+    # ********************* START: ID interface *********************
+
+    def to_mask(self, elements: typing.Iterable[str]) -> int:
+        mask: int = 0
+        for label in elements:
+            mask |= self._bits[label]
+        return mask
+
+    def to_elements(self, mask: int) -> typing.List[str]:
+        return [label for index, label in enumerate(self._labels) if mask >> index & 1]
+
+    def add_node_mask(self, mask: int) -> int:
+        node_id: typing.Optional[int] = self.__find_node_id(mask)
+        if node_id is None:
+            node_id = self._masks.append([(mask >> (64*word)) & 0xFFFFFFFFFFFFFFFF for word in range(self._no_words)])
+            self._node_alive.append(True)
+            self._node_ids[mask] = node_id
+        elif not self._node_alive.view[node_id]:
+            self._node_alive.view[node_id] = True
+        return node_id
+
+    def node_id(self, mask: int) -> typing.Optional[int]:
+        node_id: typing.Optional[int] = self.__find_node_id(mask)
+        return node_id if node_id is not None and self._node_alive.view[node_id] else None
+
+    def __find_node_id(self, mask: int) -> typing.Optional[int]:
+        node_id: typing.Optional[int] = self._node_ids.get(mask)
+        if node_id is None and self._sorted_node_ids is not None:
+            # Binary search on the memory-mapped masks
+            low: int = 0
+            high: int = len(self._sorted_node_ids)
+            while low < high:
+                middle: int = (low + high) // 2
+                middle_mask: int = self.node_mask(int(self._sorted_node_ids[middle]))
+                if middle_mask < mask:
+                    low = middle + 1
+                elif middle_mask > mask:
+                    high = middle
+                else:
+                    return int(self._sorted_node_ids[middle])
+        return node_id
+
+    def node_mask(self, node_id: int) -> int:
+        mask: int = 0
+        for word, value in enumerate(self._masks.view[node_id]):
+            mask |= int(value) << (64*word)
+        return mask
+
+    def node_ids(self) -> np.ndarray:
+        return np.flatnonzero(self._node_alive.view)
+
+    def node_bits(self, node_ids: typing.Optional[np.ndarray] = None) -> np.ndarray:
+        """Returns the elements of the nodes (all of them by default) as a (nodes x labels) boolean array."""
+        masks: np.ndarray = self._masks.view if node_ids is None else self._masks.view[node_ids]
+        bits: np.ndarray = np.unpackbits(np.ascontiguousarray(masks, dtype='<u8').view(np.uint8), axis=1, bitorder='little')
+        return bits[:, :len(self._labels)].astype(np.bool_)
+
+    def node_sizes(self) -> np.ndarray:
+        """Returns the number of elements of every node."""
+        byte_counts: np.ndarray = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+        return byte_counts[np.ascontiguousarray(self._masks.view, dtype='<u8').view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+    def add_edge_ids(self, parent_id: int, child_ids: typing.Sequence[int]) -> int:
+        edge_id: int = self._edge_parents.append(parent_id)
+        self._children.extend(child_ids)
+        self._child_offsets.append(len(self._children))
+        self._edge_alive.append(True)
+        self._out_index = None
+        self._in_index = None
+        return edge_id
+
+    def edge_parent(self, edge_id: int) -> int:
+        return int(self._edge_parents.view[edge_id])
+
+    def edge_children(self, edge_id: int) -> np.ndarray:
+        offsets: np.ndarray = self._child_offsets.view
+        return self._children.view[offsets[edge_id]:offsets[edge_id+1]]
+
+    def edge_ids(self) -> np.ndarray:
+        return np.flatnonzero(self._edge_alive.view)
+
+    def edge_arrays(self) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the parent per edge, the child offsets per edge and the child IDs, including those of removed edges."""
+        return self._edge_parents.view, self._child_offsets.view, self._children.view
+
+    def out_edge_ids(self, node_id: int) -> np.ndarray:
+        offsets, edge_ids = self.__get_out_index()
+        if node_id+1 >= len(offsets):
+            # Added after the index was built; adding an edge would have reset it
+            return edge_ids[:0]
+        edge_ids = edge_ids[offsets[node_id]:offsets[node_id+1]]
+        return edge_ids[self._edge_alive.view[edge_ids]]
+
+    def in_edge_ids(self, node_id: int) -> np.ndarray:
+        offsets, edge_ids = self.__get_in_index()
+        if node_id+1 >= len(offsets):
+            # Added after the index was built; adding an edge would have reset it
+            return edge_ids[:0]
+        edge_ids = edge_ids[offsets[node_id]:offsets[node_id+1]]
+        return edge_ids[self._edge_alive.view[edge_ids]]
+
+    def number_of_cutsets(self, mask: int) -> int:
+        node_id: typing.Optional[int] = self.node_id(mask)
+        return 0 if node_id is None else len(self.out_edge_ids(node_id))
+
+    def iter_cutsets(self, mask: int, offset: int = 0, limit: typing.Optional[int] = None) -> typing.Iterator[typing.Tuple[int, ...]]:
+        """Iterates the child masks of the hyperedges of the subassembly `mask`, like StoredAndOrGraph.iter_cutsets."""
+        node_id: typing.Optional[int] = self.node_id(mask)
+        if node_id is not None:
+            for edge_id in self.out_edge_ids(node_id)[offset:None if limit is None else offset + limit]:
+                yield tuple(self.node_mask(int(child_id)) for child_id in self.edge_children(edge_id))
+
+    def iter_hyperedges(self) -> typing.Iterator[typing.Tuple[int, typing.Tuple[int, ...]]]:
+        for edge_id in self.edge_ids():
+            yield self.node_mask(self.edge_parent(edge_id)), tuple(self.node_mask(int(child_id)) for child_id in self.edge_children(edge_id))
+
+    def remove_node_id(self, node_id: int) -> None:
+        self._node_alive.view[node_id] = False
+        self._edge_alive.view[self.out_edge_ids(node_id)] = False
+        self._edge_alive.view[self.in_edge_ids(node_id)] = False
+
+    def remove_edge_id(self, edge_id: int) -> None:
+        self._edge_alive.view[edge_id] = False
+
+    def number_of_nodes(self) -> int:
+        return int(np.count_nonzero(self._node_alive.view))
+
+    def number_of_edges(self) -> int:
+        return int(np.count_nonzero(self._edge_alive.view))
+
+    def __get_out_index(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        if self._out_index is None:
+            self._out_index = self.__build_index(self._edge_parents.view, np.arange(len(self._edge_parents), dtype=np.int64))
+        return self._out_index
+
+    def __get_in_index(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        if self._in_index is None:
+            self._in_index = self.__build_index(self._children.view, np.repeat(np.arange(len(self._edge_parents), dtype=np.int64),
+                                                                               np.diff(self._child_offsets.view)))
+        return self._in_index
+
+    def __build_index(self, node_ids: np.ndarray, edge_ids: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        order: np.ndarray = np.argsort(node_ids, kind="stable")
+        offsets: np.ndarray = np.zeros(len(self._node_alive)+1, dtype=np.int64)
+        np.cumsum(np.bincount(node_ids, minlength=len(self._node_alive)), out=offsets[1:])
+        return offsets, edge_ids[order]
+
+    # ********************* END: ID interface *********************
+
+    # ********************* START: File format *********************
+
+    FORMAT: typing.Final[str] = "aplan-and-or-graph"
+    FORMAT_VERSION: typing.Final[int] = 1
+    _ARRAYS: typing.Final[typing.Tuple[str, ...]] = ("masks", "sorted_node_ids", "edge_parents", "child_offsets", "children",
+                                                       "out_offsets", "out_edges", "in_offsets", "in_edges")
+
+    def save(self, file_loc: str) -> str:
+        """Writes the graph to the directory '{file_loc}/AND-OR_graph.aog' and returns its path.
+
+        The directory holds a JSON header (format, version, labels) and one .npy file per array: the node masks, the node IDs 
+        sorted by mask and the CSR arrays of the hyperedges and of the outgoing/incoming edge indexes. Removed nodes and 
+        edges are dropped and the remaining ones renumbered.
+        """
+        dir_loc: str = os.path.join(file_loc, "AND-OR_graph.aog")
+        os.makedirs(dir_loc, exist_ok=True)
+
+        node_ids: np.ndarray = self.node_ids()
+        new_node_ids: np.ndarray = np.full(len(self._node_alive), -1, dtype=np.int32)
+        new_node_ids[node_ids] = np.arange(len(node_ids), dtype=np.int32)
+        edge_ids: np.ndarray = self.edge_ids()
+        child_counts: np.ndarray = np.diff(self._child_offsets.view)[edge_ids]
+        child_offsets: np.ndarray = np.zeros(len(edge_ids)+1, dtype=np.int64)
+        np.cumsum(child_counts, out=child_offsets[1:])
+        children: np.ndarray = new_node_ids[np.concatenate([self.edge_children(edge_id) for edge_id in edge_ids])] \
+            if len(edge_ids) else np.zeros(0, dtype=np.int32)
+
+        graph: CompactAndOrGraph = CompactAndOrGraph(self._labels)
+        graph._masks = _GrowableArray.wrap(self._masks.view[node_ids])
+        graph._node_alive = _GrowableArray.wrap(np.ones(len(node_ids), dtype=np.bool_))
+        graph._edge_parents = _GrowableArray.wrap(new_node_ids[self._edge_parents.view[edge_ids]])
+        graph._child_offsets = _GrowableArray.wrap(child_offsets)
+        graph._children = _GrowableArray.wrap(children.astype(np.int32))
+        graph._edge_alive = _GrowableArray.wrap(np.ones(len(edge_ids), dtype=np.bool_))
+        out_offsets, out_edges = graph.__get_out_index()
+        in_offsets, in_edges = graph.__get_in_index()
+        masks: np.ndarray = graph._masks.view
+        arrays: typing.Dict[str, np.ndarray] = {"masks": masks,
+                                                # lexsort's last key (the most significant word) is its primary one
+                                                "sorted_node_ids": np.lexsort(masks.T).astype(np.int32),
+                                                "edge_parents": graph._edge_parents.view,
+                                                "child_offsets": child_offsets,
+                                                "children": graph._children.view,
+                                                "out_offsets": out_offsets,
+                                                "out_edges": out_edges,
+                                                "in_offsets": in_offsets,
+                                                "in_edges": in_edges}
+        for name, array in arrays.items():
+            np.save(os.path.join(dir_loc, "{}.npy".format(name)), array)
+        with open(os.path.join(dir_loc, "header.json"), 'w') as file:
+            json.dump({"format": self.FORMAT, "version": self.FORMAT_VERSION, "labels": self._labels,
+                       "no_nodes": len(node_ids), "no_edges": len(edge_ids)}, file)
+        return dir_loc
+
+    @classmethod
+    def load(cls, dir_loc: str, mmap_mode: typing.Optional[str] = "r") -> CompactAndOrGraph:
+        """Loads a graph written by save. By default the arrays are memory-mapped read-only, so nothing is deserialized and 
+        a node's outgoing hyperedges are read from disk on access. The graph can still be modified: an array is copied 
+        into memory once it has to grow.
+        """
+        with open(os.path.join(dir_loc, "header.json")) as file:
+            header: typing.Dict = json.load(file)
+        if header.get("format") != cls.FORMAT or header.get("version") != cls.FORMAT_VERSION:
+            raise ValueError("Unsupported AND/OR graph file: {} version {}".format(header.get("format"), header.get("version")))
+
+        arrays: typing.Dict[str, np.ndarray] = {name: np.load(os.path.join(dir_loc, "{}.npy".format(name)), mmap_mode=mmap_mode) 
+                                                for name in cls._ARRAYS}
+        graph: CompactAndOrGraph = cls(header["labels"])
+        graph._masks = _GrowableArray.wrap(arrays["masks"])
+        graph._node_alive = _GrowableArray.wrap(np.ones(header["no_nodes"], dtype=np.bool_))
+        graph._sorted_node_ids = arrays["sorted_node_ids"]
+        graph._edge_parents = _GrowableArray.wrap(arrays["edge_parents"])
+        graph._child_offsets = _GrowableArray.wrap(arrays["child_offsets"])
+        graph._children = _GrowableArray.wrap(arrays["children"])
+        graph._edge_alive = _GrowableArray.wrap(np.ones(header["no_edges"], dtype=np.bool_))
+        graph._out_index = (arrays["out_offsets"], arrays["out_edges"])
+        graph._in_index = (arrays["in_offsets"], arrays["in_edges"])
+        return graph
+
+    def export_json(self, file_loc: str) -> None:
+        _stream_json(file_loc, self._labels, (self.node_mask(node_id) for node_id in self.node_ids()), self.iter_hyperedges())
+
+    def export_graphml(self, file_loc: str) -> None:
+        _stream_graphml(file_loc, self._labels, (self.node_mask(node_id) for node_id in self.node_ids()), self.iter_hyperedges())
+
+    # ********************* END: File format *********************
+
+    # ********************* START: AndOrGraph interface *********************
+
+    @property
+    def nodes(self) -> typing.Iterator[Node]:
+        return (self.__node_of(node_id) for node_id in self.node_ids())
+
+    @property
+    def edges(self) -> typing.Iterator[AndEdge]:
+        return self.__edges_of(self.edge_ids())
+
+    def add_node(self, node: Node) -> None:
+        self._node_cache[self.add_node_mask(self.to_mask(node.elements))] = node
+
+    def add_nodes_from(self, nodes: typing.Iterable[Node]) -> None:
+        for node in nodes:
+            self.add_node(node)
+
+    def remove_node(self, node: Node) -> None:
+        self.remove_node_id(self.__id_of(node))
+
+    def get_node(self, elements) -> typing.Optional[Node]:
+        if any(label not in self._bits for label in elements):
+            return None
+        node_id: typing.Optional[int] = self.node_id(self.to_mask(elements))
+        return self.__node_of(node_id) if node_id is not None else None
+
+    def add_edge(self, edge: AndEdge) -> None:
+        for node in [edge.parent_node, *edge.child_nodes]:
+            if self.node_id(self.to_mask(node.elements)) is None:
+                self.add_node(node)
+        self.add_edge_ids(self.__id_of(edge.parent_node), [self.__id_of(child_node) for child_node in edge.child_nodes])
+
+    def add_edges_from(self, edges: typing.Iterable[AndEdge]) -> None:
+        for edge in edges:
+            self.add_edge(edge)
+
+    def remove_edge(self, edge: AndEdge) -> None:
+        child_ids: typing.List[int] = sorted(self.__id_of(child_node) for child_node in edge.child_nodes)
+        for edge_id in self.out_edge_ids(self.__id_of(edge.parent_node)):
+            if sorted(self.edge_children(edge_id).tolist()) == child_ids:
+                self.remove_edge_id(int(edge_id))
+                return
+        raise KeyError(edge)
+
+    def to_and_or_graph(self) -> AndOrGraph:
+        graph: AndOrGraph = AndOrGraph()
+        graph.add_nodes_from(self.nodes)
+        graph.add_edges_from(self.edges)
+        return graph
+
+    def __id_of(self, node: Node) -> int:
+        node_id: typing.Optional[int] = self.node_id(self.to_mask(node.elements))
+        if node_id is None:
+            raise KeyError(node.name)
+        return node_id
+
+    def __node_of(self, node_id: int) -> Node:
+        node: typing.Optional[Node] = self._node_cache.get(node_id)
+        if node is None:
+            node = Node(elements=self.to_elements(self.node_mask(node_id)))
+            self._node_cache[node_id] = node
+        return node
+
+    def __edges_of(self, edge_ids: typing.Iterable[int]) -> typing.Iterator[AndEdge]:
+        return (AndEdge(self.__node_of(self.edge_parent(edge_id)), [self.__node_of(int(child_id)) for child_id in self.edge_children(edge_id)])
+                for edge_id in edge_ids)
+
+    # ********************* END: AndOrGraph interface *********************
+
+
+class LazyAndOrGraph:
+    """AND/OR graph whose hyperedges are computed on first access, e.g. for planners that only explore part of it.
+
+    The cuts of a subassembly (bitmask over the sorted component labels) are computed by `get_cuts` and memoized in a
+    least recently used cache of at most `max_cached_nodes` subassemblies; evicted cuts are computed again when needed.
+    Only the downward direction is available, as the parents of a subassembly are unknown until the graph is enumerated.
+    """
+
+    def __init__(self, labels: typing.Iterable[str], get_cuts: typing.Callable[[int], typing.Iterable[typing.Tuple[int, ...]]],
+                 max_cached_nodes: int = 100000) -> None:
+        self._labels: typing.List[str] = sorted(labels)
+        self._bits: typing.Dict[str, int] = {label: 1 << index for index, label in enumerate(self._labels)}
+        self._get_cuts: typing.Callable[[int], typing.Iterable[typing.Tuple[int, ...]]] = get_cuts
+        self._max_cached_nodes: int = max_cached_nodes
+        self._cuts: OrderedDict = OrderedDict()
+        self._node_cache: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        self.no_expansions: int = 0
+
+        self.outgoing_edges: _NodeMapping = _NodeMapping(lambda node: {AndEdge(node, [self.__get_node(child) for child in cut])
+                                                                       for cut in self.cuts(self.__to_mask(node))})
+        self.child_nodes: _NodeMapping = _NodeMapping(lambda node: {self.__get_node(child) for cut in self.cuts(self.__to_mask(node)) 
+                                                                    for child in cut})
+
+    @property
+    def labels(self) -> typing.List[str]:
+        return self._labels
+
+    @property
+    def root_mask(self) -> int:
+        return (1 << len(self._labels)) - 1
+
+    @property
+    def root(self) -> Node:
+        return self.__get_node(self.root_mask)
+
+    def to_mask(self, elements: typing.Iterable[str]) -> int:
+        mask: int = 0
+        for label in elements:
+            mask |= self._bits[label]
+        return mask
+
+    def to_elements(self, mask: int) -> typing.List[str]:
+        return [label for index, label in enumerate(self._labels) if mask >> index & 1]
+
+    def cuts(self, mask: int) -> typing.Tuple[typing.Tuple[int, ...], ...]:
+        cuts: typing.Optional[typing.Tuple[typing.Tuple[int, ...], ...]] = self._cuts.get(mask)
+        if cuts is None:
+            cuts = tuple(self._get_cuts(mask)) if mask & (mask - 1) else ()
+            self.no_expansions += 1
+            self._cuts[mask] = cuts
+            if len(self._cuts) > self._max_cached_nodes:
+                self._cuts.popitem(last=False)
+        else:
+            self._cuts.move_to_end(mask)
+        return cuts
+
+    def get_node(self, elements) -> typing.Optional[Node]:
+        # Not checked against the graph: that would require its enumeration
+        if any(label not in self._bits for label in elements):
+            return None
+        return self.__get_node(self.to_mask(elements))
+
+    def clear_cache(self) -> None:
+        self._cuts.clear()
+
+    def __get_node(self, mask: int) -> Node:
+        node: typing.Optional[Node] = self._node_cache.get(mask)
+        if node is None:
+            node = Node(elements=self.to_elements(mask))
+            self._node_cache[mask] = node
+        return node
+
+    def __to_mask(self, node: Node) -> int:
+        return self.to_mask(node.elements)
 
 
 class Node:
@@ -243,9 +965,15 @@ class Node:
         self.guid = uuid.uuid4()
         self.name = f'[{", ".join(elements)}]'
         self.elements = elements
+        # Annotated by a planner; single components need no disassembly
+        self.type = 'end' if len(elements) == 1 else ''
+        self.cost = 0.0
 
 
 class AndEdge:
     def __init__(self, parent_node, child_nodes):
         self.parent_node = parent_node
-        self.child_nodes = child_nodes
\ No newline at end of file
+        self.child_nodes = child_nodes
+        # Annotated by a planner: the cheapest agent and the cost per agent
+        self.agent = ""
+        self.cost = {}
\ No newline at end of file
@@ -36,7 +36,7 @@ if FreeCAD.GuiUp:
     from aplanviewprovider.view_topo_constraints import VPTopoConstraints
 from . import base_aplanpythonobject
 from aplanobjects import graphs
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 try:
     import typing
 except ImportError as ie:
@@ -70,3 +70,5 @@ class TopoConstraints(base_aplanpythonobject.BaseAplanPythonObject):
                         conGraph.add_node(component.Label)
             
             conGraph.exportToFile(obj.FileLocation)
+            with result_store.ResultStore.forWorkingDir(analysis.WorkingDir) as store:
+                store.replaceConstraints(obj.Label, result_store.NO_DIRECTION, conGraph.edges)
@@ -31,24 +31,188 @@ import aplanobjects.graphs as graphs
 import abc
 import copy
 import itertools
-import networkx as nx
-import numpy as np
 import typing
 
 
+class FeasibilityChecker:
+    """Memoized feasibility checks of subassemblies encoded as bitmasks.
+
+    The blocking clauses are precompiled to bitmasks and every result is stored in a memo table keyed by the subassembly's mask,
+    so that repeated checks of the same subassembly cost a dictionary lookup. The checker only holds plain data and can therefore
+    be shipped to worker processes. If `maxMemoSize` is given, a memo table is cleared once it holds that many results, which 
+    bounds the memory of long-lived checkers, e.g. the one behind a LazyAndOrGraph.
+    """
+
+    def __init__(self, neighborMasks: typing.Dict[int, int], blockingClauseMasks: typing.Dict[int, typing.List[int]],
+                 maxMemoSize: typing.Optional[int] = None) -> None:
+        self._neighborMasks: typing.Dict[int, int] = neighborMasks
+        # (component bit, clause masks) pairs: a subassembly that intersects every clause but lacks the component is infeasible
+        self._blockingClauses: typing.List[typing.Tuple[int, typing.List[int]]] = [(componentBit, clauseMasks) for componentBit, clauseMasks in blockingClauseMasks.items() 
+                                                                                   if clauseMasks]
+        self._topoMemo: typing.Dict[int, bool] = {}
+        self._geomMemo: typing.Dict[int, bool] = {}
+        self._blockedMemo: typing.Dict[int, int] = {}
+        self._maxMemoSize: typing.Optional[int] = maxMemoSize
+
+    @property
+    def neighborMasks(self) -> typing.Dict[int, int]:
+        return self._neighborMasks
+
+    @property
+    def blockingClauseMasks(self) -> typing.Dict[int, typing.List[int]]:
+        return dict(self._blockingClauses)
+
+    def withMaxMemoSize(self, maxMemoSize: int) -> "FeasibilityChecker":
+        """Returns a checker with the same constraints and its own memo tables of at most `maxMemoSize` results each."""
+        return FeasibilityChecker(self._neighborMasks, self.blockingClauseMasks, maxMemoSize)
+
+    def getNeighbors(self, subassembly: int) -> int:
+        neighbors: int = 0
+        for bit in IAndOrGraphGenerator._iterBits(subassembly):
+            neighbors |= self._neighborMasks[bit]
+        return neighbors & ~subassembly
+
+    def isTopologicallyFeasible(self, subassembly: int) -> bool:
+        if subassembly not in self._topoMemo:
+            # Grow the connected part from the lowest component until it no longer changes
+            reached: int = subassembly & -subassembly
+            frontier: int = reached
+            while frontier:
+                grown: int = 0
+                for bit in IAndOrGraphGenerator._iterBits(frontier):
+                    grown |= self._neighborMasks[bit]
+                frontier = grown & subassembly & ~reached
+                reached |= frontier
+            self.__reserve(self._topoMemo)
+            self._topoMemo[subassembly] = reached == subassembly
+        return self._topoMemo[subassembly]
+
+    def isTopologicallyFeasibleExtension(self, subassembly: int, componentBit: int) -> bool:
+        """O(1) connectivity check of `subassembly` extended by one component, given that `subassembly` itself is connected."""
+        return bool(self._neighborMasks[componentBit] & subassembly)
+
+    def isGeometricallyFeasible(self, subassembly: int) -> bool:
+        feasible: typing.Optional[bool] = self._geomMemo.get(subassembly)
+        if feasible is None:
+            feasible = True
+            for componentBit, clauseMasks in self._blockingClauses:
+                if not subassembly & componentBit and all(clauseMask & subassembly for clauseMask in clauseMasks):
+                    feasible = False
+                    break
+            self.__reserve(self._geomMemo)
+            self._geomMemo[subassembly] = feasible
+        return feasible
+
+    def getBlocked(self, subassembly: int) -> int:
+        """Returns the mask of the components outside `subassembly` that it blocks; the subassembly is geometrically feasible iff it is 0.
+
+        The supersets of a subassembly can only be geometrically feasible if they contain all of these components.
+        """
+        blocked: typing.Optional[int] = self._blockedMemo.get(subassembly)
+        if blocked is None:
+            blocked = 0
+            for componentBit, clauseMasks in self._blockingClauses:
+                if not subassembly & componentBit and all(clauseMask & subassembly for clauseMask in clauseMasks):
+                    blocked |= componentBit
+            self.__reserve(self._blockedMemo)
+            self._blockedMemo[subassembly] = blocked
+        return blocked
+
+    def __reserve(self, memo: typing.Dict) -> None:
+        if self._maxMemoSize is not None and len(memo) >= self._maxMemoSize:
+            memo.clear()
+
+    def clearMemo(self) -> None:
+        self._topoMemo.clear()
+        self._geomMemo.clear()
+        self._blockedMemo.clear()
+
+    def isFeasible(self, subassembly: int) -> bool:
+        return self.isTopologicallyFeasible(subassembly) and self.isGeometricallyFeasible(subassembly)
+
+    def isFeasibleExtension(self, subassembly: int, componentBit: int) -> bool:
+        return self.isTopologicallyFeasibleExtension(subassembly, componentBit) and self.isGeometricallyFeasible(subassembly | componentBit)
+
+
+class ComponentSymmetry:
+    """Classes of interchangeable components, given as bitmasks.
+
+    Swapping two components of a class maps every constraint graph onto itself, so subassemblies that only differ in which 
+    members of a class they contain are equivalent. Such subassemblies are represented by their canonical form, which contains
+    the lowest members of every class. The symmetry only holds plain data and can therefore be shipped to worker processes.
+    """
+
+    def __init__(self, classMasks: typing.Iterable[int]) -> None:
+        self._classMasks: typing.List[int] = [classMask for classMask in classMasks if classMask & (classMask - 1)]
+        self._classBits: typing.List[typing.List[int]] = [list(IAndOrGraphGenerator._iterBits(classMask)) for classMask in self._classMasks]
+        # Per class, the mask of its k lowest members at index k
+        self._prefixMasks: typing.List[typing.List[int]] = [list(itertools.accumulate(bits, lambda prefix, bit: prefix | bit, initial=0)) 
+                                                            for bits in self._classBits]
+
+    @property
+    def classMasks(self) -> typing.List[int]:
+        return self._classMasks
+
+    def __bool__(self) -> bool:
+        return bool(self._classMasks)
+
+    def canonicalize(self, subassembly: int) -> int:
+        for classMask, prefixMasks in zip(self._classMasks, self._prefixMasks):
+            members: int = subassembly & classMask
+            if members:
+                subassembly = (subassembly ^ members) | prefixMasks[bin(members).count("1")]
+        return subassembly
+
+    def iterOrbit(self, subassembly: int) -> typing.Iterator[int]:
+        """Yields every subassembly equivalent to `subassembly`, including itself."""
+        choices: typing.List[typing.List[int]] = [[sum(combination) for combination in itertools.combinations(bits, bin(subassembly & classMask).count("1"))]
+                                                  for classMask, bits in zip(self._classMasks, self._classBits)]
+        fixed: int = subassembly
+        for classMask in self._classMasks:
+            fixed &= ~classMask
+        for members in itertools.product(*choices):
+            yield fixed | sum(members)
+
+    def iterCutOrbit(self, parent: int, child: int) -> typing.Iterator[typing.Tuple[int, int, int]]:
+        """Yields every (parent, child, other child) cutset equivalent to splitting `parent` into `child` and the rest.
+
+        Only the number of members of each class of `child` matters, so `child` does not have to be a subset of `parent`.
+        """
+        fixed: int = child
+        for classMask in self._classMasks:
+            fixed &= ~classMask
+        for parent_ in self.iterOrbit(parent):
+            choices: typing.List[typing.List[int]] = [[sum(combination) for combination in 
+                                                       itertools.combinations(IAndOrGraphGenerator._iterBits(parent_ & classMask), bin(child & classMask).count("1"))]
+                                                      for classMask in self._classMasks]
+            cutsets: typing.Set[typing.FrozenSet[int]] = set()
+            for members in itertools.product(*choices):
+                child_: int = fixed | sum(members)
+                if frozenset((child_, parent_ ^ child_)) not in cutsets:
+                    cutsets.add(frozenset((child_, parent_ ^ child_)))
+                    yield parent_, child_, parent_ ^ child_
+
+
 class IAndOrGraphGenerator(metaclass=abc.ABCMeta):
-    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict) -> None:
-        obj.Proxy = self
-        if not hasattr(obj, "Type"):
-            obj.addProperty(
-                "App::PropertyString",
-                "Type",
-                "AND/OR graph generator",
-                "Type of AND/OR graph generator"
-            )
-            obj.setEditorMode("Type", 1)  # read-only
+    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict,
+                 shapeKeys: typing.Optional[typing.Dict[str, typing.Hashable]] = None) -> None:
+        # Without a document object, e.g. for the subproblems of HierarchicalCutset
+        if obj is not None:
+            obj.Proxy = self
+            if not hasattr(obj, "Type"):
+                obj.addProperty(
+                    "App::PropertyString",
+                    "Type",
+                    "AND/OR graph generator",
+                    "Type of AND/OR graph generator"
+                )
+                obj.setEditorMode("Type", 1)  # read-only
 
         self._components = components
+        # Subassemblies are encoded as integer bitmasks; bit i is set if the i-th component (sorted by label) is part of it.
+        # Python integers are arbitrary-precision, so any number of components fits.
+        self._labels: typing.List[str] = sorted(self._components)
+        self._bits: typing.Dict[str, int] = {label: 1 << index for index, label in enumerate(self._labels)}
 
         self._topoConstraints: graphs.ConnectionGraph = graphs.ConnectionGraph()
         if "topological" in constraints:
@@ -64,11 +228,49 @@ class IAndOrGraphGenerator(metaclass=abc.ABCMeta):
 
         self._geomConstraints: typing.List[graphs.ObstructionGraph] = constraints.get("geometrical", [graphs.ObstructionGraph()])
         
-        self._blockingRules: typing.Dict[str, typing.List[typing.List[str]]] = {}
+        self._blockingClauses: typing.Dict[str, typing.List[typing.FrozenSet[str]]] = {}
         if self._geomConstraints:
-            self._blockingRules = self.__getBlockingRules(self._components, self._geomConstraints)
+            self._blockingClauses = self.__getBlockingClauses(self._components, self._geomConstraints)
+
+        self._feasibilityChecker: FeasibilityChecker = FeasibilityChecker(
+            {self._bits[label]: self._toMask(neighbor for neighbor in self._topoConstraints.neighbors(label) if neighbor in self._bits)
+             if label in self._topoConstraints else 0 for label in self._labels},
+            {self._bits[component]: [self._toMask(clause) for clause in clauses] 
+             for component, clauses in self._blockingClauses.items() if component in self._bits})
+
+        self._symmetry: ComponentSymmetry = ComponentSymmetry(self._toMask(interchangeableComponents) 
+                                                              for interchangeableComponents in self.__getInterchangeableComponents(shapeKeys))
+
+    def expandInterchangeable(self, graph: typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph]) -> typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph]:
+        """Expands a graph generated over classes of interchangeable components into the graph over the components themselves."""
+        subassemblies: typing.Set[int]
+        cutsets: typing.List[typing.Tuple[int, typing.Sequence[int]]]
+        if isinstance(graph, graphs.CompactAndOrGraph):
+            subassemblies = {graph.node_mask(int(nodeId)) for nodeId in graph.node_ids()}
+            cutsets = list(graph.iter_hyperedges())
+        else:
+            subassemblies = {self._toMask(node.elements) for node in graph.nodes}
+            cutsets = [(self._toMask(edge.parent_node.elements), [self._toMask(child.elements) for child in edge.child_nodes]) for edge in graph.edges]
+
+        if isinstance(graph, graphs.CompactAndOrGraph):
+            compactGraph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph(self._labels)
+            nodeIds: typing.Dict[int, int] = {subassembly_: compactGraph.add_node_mask(subassembly_) 
+                                              for subassembly in subassemblies for subassembly_ in self._symmetry.iterOrbit(subassembly)}
+            for parent, children in cutsets:
+                for parent_, child1, child2 in self._symmetry.iterCutOrbit(parent, children[0]):
+                    compactGraph.add_edge_ids(nodeIds[parent_], (nodeIds[child1], nodeIds[child2]))
+            return compactGraph
+
+        oa_graph = graphs.AndOrGraph()
+        nodes: typing.Dict[int, graphs.Node] = {subassembly_: graphs.Node(elements=self._toElements(subassembly_)) 
+                                                for subassembly in subassemblies for subassembly_ in self._symmetry.iterOrbit(subassembly)}
+        oa_graph.add_nodes_from(nodes.values())
+        for parent, children in cutsets:
+            for parent_, child1, child2 in self._symmetry.iterCutOrbit(parent, children[0]):
+                oa_graph.add_edge(graphs.AndEdge(nodes[parent_], sorted([nodes[child1], nodes[child2]], key=lambda node: node.elements)))
+        return oa_graph
 
-    def __checkTopologicalFeasibility(self, subassembly: typing.Iterable[str]) -> typing.Tuple[typing.Tuple[bool, str], bool]:
+    def _checkTopologicalFeasibility(self, subassembly: typing.Iterable[str]) -> typing.Tuple[typing.Tuple[bool, str], bool]:
         succeeded: bool = False
         errorMsg: str = ""
         topoFeasible: bool = False
@@ -79,26 +281,111 @@ class IAndOrGraphGenerator(metaclass=abc.ABCMeta):
             errorMsg = "[TOPO_CHECK]: The following component(s) is/are not part of the connection graph: {}".format(excessComponents)
         else:
             succeeded = True
-            topoFeasible = nx.is_connected(self._topoConstraints.subgraph(subassembly))
+            topoFeasible = self._feasibilityChecker.isTopologicallyFeasible(self._toMask(subassembly))
 
         return ((succeeded, errorMsg), topoFeasible)
 
-    def __checkGeometricalFeasibility(self, subassembly: typing.Iterable[str]) -> typing.Tuple[typing.Tuple[bool, str], bool]:
+    def _checkGeometricalFeasibility(self, subassembly: typing.Iterable[str]) -> typing.Tuple[typing.Tuple[bool, str], bool]:
         succeeded: bool = False
         errorMsg: str = ""
         geomFeasible: bool = True
 
-        for component, rules in self._blockingRules.items():
-            for rule in rules:
-                if (set(rule).issubset(set(subassembly)) and component not in subassembly):
-                    geomFeasible = False
-        succeeded = True
+        excessComponents: typing.Set[str] = set(subassembly).difference(self._bits.keys())
+        if excessComponents:
+            errorMsg = "[GEOM_CHECK]: The following component(s) is/are not part of the assembly: {}".format(excessComponents)
+        else:
+            succeeded = True
+            geomFeasible = self._feasibilityChecker.isGeometricallyFeasible(self._toMask(subassembly))
 
         return ((succeeded, errorMsg), geomFeasible)
 
-    def __getBlockingRules(self, components: typing.Iterable[str], geomConstraints: typing.Iterable[graphs.ObstructionGraph]) -> typing.Dict[str, typing.List[typing.List[str]]]:
-        blockingRulesTemp = {comp: [list(set(prod)) for prod in itertools.product(*[obstructionGraph.successors(comp) for obstructionGraph in geomConstraints])] for comp in components}
-        return {component: list(np.unique(np.array(rule, dtype=object))) for component, rule in blockingRulesTemp.items() if rule != []}
+    def _toMask(self, subassembly: typing.Iterable[str]) -> int:
+        mask: int = 0
+        for label in subassembly:
+            mask |= self._bits[label]
+        return mask
+
+    def _toElements(self, mask: int) -> typing.List[str]:
+        return [self._labels[index] for index in self._iterBitIndices(mask)]
+
+    @staticmethod
+    def _iterBits(mask: int) -> typing.Iterator[int]:
+        while mask:
+            bit: int = mask & -mask
+            yield bit
+            mask ^= bit
+
+    @staticmethod
+    def _iterBitIndices(mask: int) -> typing.Iterator[int]:
+        while mask:
+            bit: int = mask & -mask
+            yield bit.bit_length() - 1
+            mask ^= bit
+
+    def __getBlockingClauses(self, components: typing.Iterable[str], geomConstraints: typing.Iterable[graphs.ObstructionGraph]) -> typing.Dict[str, typing.List[typing.FrozenSet[str]]]:
+        """Returns per component the sets of its obstacles in each motion direction, i.e. its blocking rules in conjunctive normal form.
+
+        A component is blocked by a subassembly that intersects every clause, which is the same as containing one of the component's 
+        blocking rules (one obstacle per direction). Enumerating those rules is exponential in the number of directions; the clauses 
+        are not. Clauses that are supersets of another clause are implied by it and pruned. Components that are free in at least one
+        direction, including those missing from an obstruction graph, have no clauses. Obstacles that are not among the components
+        (e.g. excluded parts) are ignored, so a component whose only obstacles in a direction are such parts is free in it.
+        """
+        componentSet: typing.FrozenSet[str] = frozenset(components)
+        blockingClauses: typing.Dict[str, typing.List[typing.FrozenSet[str]]] = {}
+        for component in componentSet:
+            clauses: typing.List[typing.FrozenSet[str]] = []
+            for obstructionGraph in geomConstraints:
+                clause: typing.FrozenSet[str] = componentSet.intersection(obstructionGraph.successors(component)) \
+                    if component in obstructionGraph else frozenset()
+                if not clause:
+                    clauses = []
+                    break
+                clauses.append(clause)
+            minimalClauses: typing.List[typing.FrozenSet[str]] = []
+            for clause in sorted(set(clauses), key=len):
+                if not any(minimalClause.issubset(clause) for minimalClause in minimalClauses):
+                    minimalClauses.append(clause)
+            if minimalClauses:
+                blockingClauses[component] = minimalClauses
+        return blockingClauses
+
+    def __getInterchangeableComponents(self, shapeKeys: typing.Optional[typing.Dict[str, typing.Hashable]]) -> typing.List[typing.List[str]]:
+        """Groups the components that can be swapped without changing any constraint graph, and have the same shape key if given.
+
+        Two components are interchangeable if their neighbors in the connection graph, and their obstacles and the components
+        they obstruct in every obstruction graph, are the same apart from each other. Swapping is transitive, so every
+        component only has to be compared with the first member of each class. Shapes are only compared if the caller passes
+        `shapeKeys` (any hashable per component); otherwise equal constraint neighborhoods suffice.
+        """
+        def isInterchangeable(component1: str, component2: str) -> bool:
+            if shapeKeys is not None and shapeKeys.get(component1) != shapeKeys.get(component2):
+                return False
+            others: typing.Set[str] = {component1, component2}
+            if (component1 in self._topoConstraints) != (component2 in self._topoConstraints):
+                return False
+            if component1 in self._topoConstraints and \
+                    set(self._topoConstraints.neighbors(component1)) - others != set(self._topoConstraints.neighbors(component2)) - others:
+                return False
+            for obstructionGraph in self._geomConstraints:
+                successors1: typing.Set[str] = set(obstructionGraph.successors(component1)) if component1 in obstructionGraph else set()
+                successors2: typing.Set[str] = set(obstructionGraph.successors(component2)) if component2 in obstructionGraph else set()
+                predecessors1: typing.Set[str] = set(obstructionGraph.predecessors(component1)) if component1 in obstructionGraph else set()
+                predecessors2: typing.Set[str] = set(obstructionGraph.predecessors(component2)) if component2 in obstructionGraph else set()
+                if successors1 - others != successors2 - others or predecessors1 - others != predecessors2 - others or \
+                        (component2 in successors1) != (component1 in successors2):
+                    return False
+            return True
+
+        classes: typing.List[typing.List[str]] = []
+        for component in self._labels:
+            for class_ in classes:
+                if isInterchangeable(class_[0], component):
+                    class_.append(component)
+                    break
+            else:
+                classes.append([component])
+        return [class_ for class_ in classes if len(class_) > 1]
 
     def __getstate__(self) -> None:
         return None
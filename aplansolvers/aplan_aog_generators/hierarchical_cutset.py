@@ -0,0 +1,226 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+__title__ = ""
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+import aplansolvers.aplan_aog_generators.base_aog_generator as base
+import aplansolvers.aplan_aog_generators.reverse_cutset as reverse_cutset
+import aplansolvers.aplan_aog_generators.top_down_cutset as top_down_cutset
+import aplanobjects.graphs as graphs
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import typing
+
+
+# (labels, topological edges, geometrical edges per motion direction)
+_Subproblem = typing.Tuple[typing.List[str], typing.List[typing.Tuple[str, str]], typing.List[typing.List[typing.Tuple[str, str]]]]
+# (labels, subassemblies, hyperedges) with the subassemblies as bitmasks over the sorted labels
+_SubproblemGraph = typing.Tuple[typing.List[str], typing.List[int], typing.List[typing.Tuple[int, typing.Tuple[int, ...]]]]
+
+
+def _generateTask(generatorType: typing.Type[base.IAndOrGraphGenerator], subproblem: _Subproblem, kwargs: typing.Dict) -> _SubproblemGraph:
+    labels, topoEdges, geomEdges = subproblem
+    topoConstraints: graphs.ConnectionGraph = graphs.ConnectionGraph()
+    topoConstraints.add_nodes_from(labels)
+    topoConstraints.add_edges_from(topoEdges)
+    geomConstraints: typing.List[graphs.ObstructionGraph] = []
+    for edges in geomEdges:
+        obstructionGraph: graphs.ObstructionGraph = graphs.ObstructionGraph()
+        obstructionGraph.add_nodes_from(labels)
+        obstructionGraph.add_edges_from(edges)
+        geomConstraints.append(obstructionGraph)
+
+    generator: base.IAndOrGraphGenerator = generatorType(None, set(labels), {"topological": topoConstraints, "geometrical": geomConstraints})
+    graph: graphs.CompactAndOrGraph = generator.generate(compact=True, **kwargs)
+    if kwargs.get("symmetric"):
+        # The subproblems are composed over the components themselves
+        graph = generator.expandInterchangeable(graph)
+    return graph.labels, [graph.node_mask(int(nodeId)) for nodeId in graph.node_ids()], list(graph.iter_hyperedges())
+
+
+class HierarchicalCutset(base.IAndOrGraphGenerator):
+    """Generates the AND/OR graph of an assembly whose compounds are fixed groups of components.
+
+    At the top level every compound is a single, black-box component: it is connected to and obstructed by whatever any of its
+    members is connected to or obstructed by. The graph of every compound is generated separately from the constraints between 
+    its members, and the top-level graph is composed with them, i.e. the full assembly is disassembled into compounds (and loose 
+    components) first, and the compounds into their components next. The subproblems are independent, so they are generated in 
+    parallel and cached by their constraints; after a change only the affected subproblems are generated again.
+
+    Unlike the components of an analysis (see AplanAnalysis::getComponents), which include every compound as a single 
+    component, `components` and `constraints` have to be given at member level: the members of the compounds are components,
+    the compounds are not, and the constraints between the members are known, e.g. detected with the compounds ungrouped. 
+    `compounds` maps every compound's label to the labels of its members.
+    """
+
+    # Graphs of the latest subproblems by the digest of their generator and constraints, shared by all instances
+    _cache: OrderedDict = OrderedDict()
+    _CACHE_SIZE: typing.Final[int] = 64
+    # Keyword arguments of the generators' generate methods that can be passed on for the subproblems
+    _GENERATOR_KWARGS: typing.Final[typing.Dict[typing.Type[base.IAndOrGraphGenerator], typing.FrozenSet[str]]] = {
+        reverse_cutset.ReverseCutset: frozenset({"symmetric"}),
+        top_down_cutset.TopDownCutset: frozenset()
+    }
+
+    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict, compounds: typing.Dict[str, typing.Iterable[str]],
+                 generatorType: typing.Type[base.IAndOrGraphGenerator] = reverse_cutset.ReverseCutset) -> None:
+        super().__init__(obj, components, constraints)
+        self._generatorType: typing.Type[base.IAndOrGraphGenerator] = generatorType
+
+        # Top-level components: the compounds and the components that are not part of any compound
+        self._units: typing.Dict[str, typing.Set[str]] = {}
+        unitOf: typing.Dict[str, str] = {}
+        for compound, members in compounds.items():
+            members = set(members)
+            if compound in self._bits:
+                raise ValueError("Compound '{}' is one of the components; the components and constraints have to be given at member level, "
+                                 "i.e. with the members of the compounds instead of the compounds".format(compound))
+            if members.difference(self._bits.keys()):
+                raise ValueError("The following member(s) of compound '{}' is/are not among the components: {}".format(compound, members.difference(self._bits.keys())))
+            if members.intersection(unitOf.keys()):
+                raise ValueError("The following component(s) is/are part of more than one compound: {}".format(members.intersection(unitOf.keys())))
+            if not self._feasibilityChecker.isTopologicallyFeasible(self._toMask(members)):
+                raise ValueError("The members of compound '{}' are not connected by the topological constraints".format(compound))
+            if members:
+                self._units[compound] = members
+                unitOf.update((member, compound) for member in members)
+        for component in self._labels:
+            if component not in unitOf:
+                self._units[component] = {component}
+                unitOf[component] = component
+        self._unitOf: typing.Dict[str, str] = unitOf
+
+    def addProperties(self, obj) -> None:
+        if hasattr(obj, "Type"):
+            obj.Type = self.__class__.__name__
+
+    def generate(self, noProcesses: int = 1, compact: bool = False, cacheDir: typing.Optional[str] = None,
+                 **kwargs) -> typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph]:
+        """Generates the AND/OR graph; the keyword arguments are passed on to the generator of the subproblems.
+
+        With `noProcesses` > 1, the subproblems are generated in parallel. If a `cacheDir` is given, the graphs of the subproblems 
+        are also cached on disk, in the format of CompactAndOrGraph.save. Only the keyword arguments in _GENERATOR_KWARGS are
+        supported; the graphs of subproblems generated with `symmetric` set are expanded before they are composed.
+        """
+        unsupported: typing.Set[str] = set(kwargs.keys()).difference(self._GENERATOR_KWARGS.get(self._generatorType, frozenset()))
+        if unsupported:
+            raise TypeError("{} does not support the following keyword argument(s) for its subproblems: {}".format(self._generatorType.__name__, unsupported))
+
+        subproblems: typing.Dict[str, _Subproblem] = {"": self.__getTopLevel()}
+        subproblems.update((unit, self.__getCompound(members)) for unit, members in self._units.items() if len(members) > 1)
+
+        digests: typing.Dict[str, str] = {key: self.__digest(subproblem, kwargs) for key, subproblem in subproblems.items()}
+        results: typing.Dict[str, _SubproblemGraph] = {}
+        for key, digest in digests.items():
+            onDisk: bool = cacheDir is not None and os.path.isdir(os.path.join(cacheDir, digest, "AND-OR_graph.aog"))
+            if digest not in self._cache and onDisk:
+                graph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph.load(os.path.join(cacheDir, digest, "AND-OR_graph.aog"))
+                self._cache[digest] = (graph.labels, [graph.node_mask(int(nodeId)) for nodeId in graph.node_ids()], list(graph.iter_hyperedges()))
+            if digest in self._cache:
+                results[key] = self._cache[digest]
+                self._cache.move_to_end(digest)
+                # Generated by an earlier call without a cacheDir or with another one
+                if cacheDir is not None and not onDisk:
+                    self.__saveToCache(os.path.join(cacheDir, digest), results[key])
+
+        missing: typing.List[str] = [key for key in subproblems.keys() if key not in results]
+        if noProcesses > 1 and len(missing) > 1:
+            with ProcessPoolExecutor(max_workers=noProcesses) as executor:
+                generated: typing.List[_SubproblemGraph] = list(executor.map(_generateTask, [self._generatorType]*len(missing), 
+                                                                             [subproblems[key] for key in missing], [kwargs]*len(missing)))
+        else:
+            generated = [_generateTask(self._generatorType, subproblems[key], kwargs) for key in missing]
+        for key, result in zip(missing, generated):
+            results[key] = self._cache[digests[key]] = result
+            if cacheDir is not None:
+                self.__saveToCache(os.path.join(cacheDir, digests[key]), result)
+        while len(self._cache) > self._CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+        return self.__compose(results, compact)
+
+    def __getTopLevel(self) -> _Subproblem:
+        units: typing.List[str] = sorted(self._units.keys())
+        topoEdges: typing.Set[typing.Tuple[str, str]] = {tuple(sorted((self._unitOf[edge[0]], self._unitOf[edge[1]]))) 
+                                                         for edge in self._topoConstraints.edges 
+                                                         if edge[0] in self._unitOf and edge[1] in self._unitOf and self._unitOf[edge[0]] != self._unitOf[edge[1]]}
+        geomEdges: typing.List[typing.List[typing.Tuple[str, str]]] = [sorted({(self._unitOf[edge[0]], self._unitOf[edge[1]]) for edge in obstructionGraph.edges
+                                                                              if edge[0] in self._unitOf and edge[1] in self._unitOf and self._unitOf[edge[0]] != self._unitOf[edge[1]]})
+                                                                       for obstructionGraph in self._geomConstraints]
+        return units, sorted(topoEdges), geomEdges
+
+    def __getCompound(self, members: typing.Set[str]) -> _Subproblem:
+        topoEdges: typing.List[typing.Tuple[str, str]] = sorted(tuple(sorted(edge)) for edge in self._topoConstraints.subgraph(members).edges)
+        geomEdges: typing.List[typing.List[typing.Tuple[str, str]]] = [sorted(obstructionGraph.subgraph(members).edges) for obstructionGraph in self._geomConstraints]
+        return sorted(members), topoEdges, geomEdges
+
+    def __digest(self, subproblem: _Subproblem, kwargs: typing.Dict) -> str:
+        return hashlib.sha1(json.dumps([self._generatorType.__name__, subproblem, kwargs], sort_keys=True, default=str).encode()).hexdigest()
+
+    def __saveToCache(self, dirLoc: str, result: _SubproblemGraph) -> None:
+        labels, subassemblies, hyperedges = result
+        graph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph(labels)
+        nodeIds: typing.Dict[int, int] = {subassembly: graph.add_node_mask(subassembly) for subassembly in subassemblies}
+        for parent, children in hyperedges:
+            graph.add_edge_ids(nodeIds[parent], [nodeIds[child] for child in children])
+        os.makedirs(dirLoc, exist_ok=True)
+        graph.save(dirLoc)
+
+    def __compose(self, results: typing.Dict[str, _SubproblemGraph], compact: bool) -> typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph]:
+        """Maps the subassemblies of every subproblem onto the components of the assembly and merges the graphs;
+        a compound is a leaf of the top-level graph and the root of its own graph.
+        """
+        subassemblies: typing.Set[int] = set()
+        cutsets: typing.List[typing.Tuple[int, typing.Tuple[int, ...]]] = []
+        for key, (labels, subassemblies_, hyperedges) in results.items():
+            # Top-level components stand for all of their members
+            bits: typing.List[int] = [self._toMask(self._units[label]) if key == "" else self._bits[label] for label in labels]
+
+            def toMask(mask: int) -> int:
+                return sum(bits[index] for index in self._iterBitIndices(mask))
+
+            subassemblies.update(toMask(subassembly) for subassembly in subassemblies_)
+            cutsets.extend((toMask(parent), tuple(toMask(child) for child in children)) for parent, children in hyperedges)
+
+        if compact:
+            compactGraph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph(self._labels)
+            nodeIds: typing.Dict[int, int] = {subassembly: compactGraph.add_node_mask(subassembly) for subassembly in subassemblies}
+            for parent, children in cutsets:
+                compactGraph.add_edge_ids(nodeIds[parent], [nodeIds[child] for child in children])
+            return compactGraph
+
+        oa_graph = graphs.AndOrGraph()
+        nodes: typing.Dict[int, graphs.Node] = {subassembly: graphs.Node(elements=self._toElements(subassembly)) for subassembly in subassemblies}
+        oa_graph.add_nodes_from(nodes.values())
+        for parent, children in cutsets:
+            oa_graph.add_edge(graphs.AndEdge(nodes[parent], sorted([nodes[child] for child in children], key=lambda node: node.elements)))
+
+        return oa_graph
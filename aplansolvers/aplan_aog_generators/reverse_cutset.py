@@ -29,56 +29,269 @@ __url__ = "https://www.freecadweb.org"
 import aplansolvers.aplan_aog_generators.base_aog_generator as base
 import aplanobjects.graphs as graphs
 
-import itertools
+from concurrent.futures import ProcessPoolExecutor
 import math
-import numpy as np
 import typing
 
 
+def expandSubassemblies(frontier: typing.Iterable[int], feasibilityChecker: base.FeasibilityChecker,
+                        symmetry: typing.Optional[base.ComponentSymmetry] = None) -> typing.Set[int]:
+    """Returns the feasible subassemblies obtained by adding one neighboring component to a subassembly of the frontier.
+
+    With a `symmetry`, only the canonical forms of the subassemblies are returned.
+    """
+    level: typing.Set[int] = set()
+    for subassembly in frontier:
+        for neighbor in base.IAndOrGraphGenerator._iterBits(feasibilityChecker.getNeighbors(subassembly)):
+            candidate: int = subassembly | neighbor if symmetry is None else symmetry.canonicalize(subassembly | neighbor)
+            if candidate not in level and feasibilityChecker.isGeometricallyFeasible(candidate):
+                level.add(candidate)
+    return level
+
+
+def iterCutsets(parent: int, levels: typing.Dict[int, typing.Set[int]], feasible: typing.Set[int],
+                symmetry: typing.Optional[base.ComponentSymmetry] = None) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Yields every unordered split of `parent` into two feasible subassemblies once, as a (larger, smaller) pair of masks.
+
+    Either the 2^|parent| submasks of the parent are enumerated, or the feasible subassemblies of at least half its size are scanned,
+    whichever is cheaper; in both cases the complement is looked up in the set of feasible subassemblies.
+    With a `symmetry`, the levels only hold canonical subassemblies and one split per class of equivalent splits is yielded,
+    with the complement in canonical form; the canonical larger sides of a canonical parent are subsets of it.
+    """
+    parentLength: int = _length(parent)
+    lowestBit: int = parent & -parent
+    minChildLength: int = math.ceil(parentLength/2)
+    noCandidates: int = sum(len(levels.get(length, ())) for length in range(minChildLength, parentLength))
+    if symmetry is not None:
+        for childLength in range(minChildLength, parentLength):
+            for child in levels.get(childLength, ()):
+                if child & ~parent == 0:
+                    rest: int = symmetry.canonicalize(parent ^ child)
+                    if rest in feasible and (2*childLength != parentLength or child <= rest):
+                        yield child, rest
+    elif (1 << (parentLength-1)) <= noCandidates:
+        # Only the submasks containing the parent's lowest bit, so that every split is enumerated once
+        rest: int = parent ^ lowestBit
+        submask: int = rest
+        while True:
+            child: int = submask | lowestBit
+            if child != parent and child in feasible and parent ^ child in feasible:
+                yield (child, parent ^ child) if 2*_length(child) >= parentLength else (parent ^ child, child)
+            if not submask:
+                break
+            submask = (submask - 1) & rest
+    else:
+        for childLength in range(minChildLength, parentLength):
+            for child in levels.get(childLength, ()):
+                if child & ~parent == 0 and parent ^ child in feasible and (2*childLength != parentLength or child & lowestBit):
+                    yield child, parent ^ child
+
+
+def _length(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+class _StoredLevel:
+    def __init__(self, storedGraph: graphs.StoredAndOrGraph, length: int) -> None:
+        self._storedGraph: graphs.StoredAndOrGraph = storedGraph
+        self._length: int = length
+        self._noSubassemblies: typing.Optional[int] = None
+
+    def __len__(self) -> int:
+        if self._noSubassemblies is None:
+            self._noSubassemblies = self._storedGraph.count_subassemblies(self._length)
+        return self._noSubassemblies
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return self._storedGraph.iter_subassemblies(self._length)
+
+
+class _StoredLevels:
+    """Read-only view of the levels of a StoredAndOrGraph with the interface of the in-memory levels dict used by iterCutsets."""
+    def __init__(self, storedGraph: graphs.StoredAndOrGraph) -> None:
+        self._storedGraph: graphs.StoredAndOrGraph = storedGraph
+        self._levels: typing.Dict[int, _StoredLevel] = {}
+
+    def get(self, length: int, default: typing.Any = None) -> _StoredLevel:
+        if length not in self._levels:
+            self._levels[length] = _StoredLevel(self._storedGraph, length)
+        return self._levels[length]
+
+
+class _StoredFeasible:
+    def __init__(self, storedGraph: graphs.StoredAndOrGraph) -> None:
+        self._storedGraph: graphs.StoredAndOrGraph = storedGraph
+
+    def __contains__(self, mask: int) -> bool:
+        return self._storedGraph.has_subassembly(mask)
+
+
+# **** START: Worker process state ****
+
+# Read-only data shared by all tasks of a worker process, set once by the pool's initializer
+_workerContext: typing.Dict[str, typing.Any] = {}
+
+
+def _initWorker(context: typing.Dict[str, typing.Any]) -> None:
+    _workerContext.clear()
+    _workerContext.update(context)
+    if "levels" in context:
+        _workerContext["feasible"] = set().union(*context["levels"].values())
+    elif "fileLoc" in context:
+        storedGraph: graphs.StoredAndOrGraph = graphs.StoredAndOrGraph(context["fileLoc"])
+        _workerContext["levels"] = _StoredLevels(storedGraph)
+        _workerContext["feasible"] = _StoredFeasible(storedGraph)
+
+
+def _expandTask(frontier: typing.List[int]) -> typing.Set[int]:
+    return expandSubassemblies(frontier, _workerContext["feasibilityChecker"], _workerContext.get("symmetry"))
+
+
+def _cutsetsTask(parents: typing.List[int]) -> typing.List[typing.Tuple[int, int, int]]:
+    return [(parent, child1, child2) for parent in parents 
+            for child1, child2 in iterCutsets(parent, _workerContext["levels"], _workerContext["feasible"], _workerContext.get("symmetry"))]
+
+# **** END: Worker process state ****
+
+
 class ReverseCutset(base.IAndOrGraphGenerator):
-    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict) -> None:
-        super().__init__(obj, components, constraints)
+    # Number of tasks per worker process a level or the set of parents is split into, to balance the load
+    _TASKS_PER_WORKER: typing.Final[int] = 4
+    # Number of subassemblies of a level expanded at once when streaming to disk
+    _STREAMING_CHUNK_SIZE: typing.Final[int] = 10000
+
+    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict,
+                 shapeKeys: typing.Optional[typing.Dict[str, typing.Hashable]] = None) -> None:
+        super().__init__(obj, components, constraints, shapeKeys)
 
     def addProperties(self, obj) -> None:
         if hasattr(obj, "Type"):
             obj.Type = self.__class__.__name__
 
-    def generate(self) -> graphs.AndOrGraph:
-        nodes = self._components
-        nof_nodes = len(nodes)
-        
-        sublength_dict = {1: [[node] for node in nodes], 2: [list(edge) for edge in self._topoConstraints.edges if self.__checkGeometricalFeasibility(edge)], nof_nodes: [sorted(nodes)]}
-        neighbor_dict = {node: list(self._topoConstraints.neighbors(node)) for node in nodes}
-
-        for length in range(3, nof_nodes):
-            subassemblies = []
-            for subassembly in sublength_dict[length-1]:
-                neighbors = np.unique([neighbor for node in subassembly for neighbor in neighbor_dict[node] if neighbor not in subassembly])
-                subassemblies_temp = [sorted(list(itertools.chain.from_iterable([[item] if type(item) != list else item for item in prod]))) for prod in itertools.product([subassembly], neighbors)]
-                subassemblies += [subassembly for subassembly in subassemblies_temp if subassembly not in subassemblies and self.__checkGeometricalFeasibility(subassembly)]
-            sublength_dict[length] = subassemblies
-        subassemblies = sorted(list(itertools.chain.from_iterable(sublength_dict.values())), key=len)[::-1]
-
-        cutsets = []
-        append = cutsets.append
-        for triplet3_len in range(3,nof_nodes+1)[::-1]:
-            for triplet1_len in range(math.ceil(triplet3_len/2),triplet3_len)[::-1]:
-                for triplet in list(itertools.product(sublength_dict[triplet1_len],sublength_dict[triplet3_len-triplet1_len],sublength_dict[triplet3_len])):
-                    if sorted(list(itertools.chain.from_iterable(triplet[0:2]))) == triplet[2] and list(set(triplet[0])&set(triplet[1])) == []: append([subassemblies.index(triplet[2]), sorted(triplet[0:2])])
-        cutsets += [[subassemblies.index(two_subassembly), [[two_subassembly[0]], [two_subassembly[1]]]] for two_subassembly in sublength_dict[2]]
-
-        cutset_dict = {key: list(itertools.chain.from_iterable([group[1:] for group in list(groups)])) for key, groups in itertools.groupby(sorted(cutsets), lambda x: x[0])}
+    def generate(self, noProcesses: int = 1, fileLoc: typing.Optional[str] = None, compact: bool = False,
+                 symmetric: bool = False) -> typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph, graphs.StoredAndOrGraph]:
+        """Generates the AND/OR graph; with `noProcesses` > 1, each level of subassemblies and the cutsets are computed in parallel.
+
+        If a `fileLoc` is given, the graph is streamed to that file instead (see __generateStored).
+        If `compact` is set, a CompactAndOrGraph is returned instead of an AndOrGraph of Node and AndEdge objects.
+        If `symmetric` is set, the graph is generated over the classes of interchangeable components: it only holds the canonical
+        subassemblies and one hyperedge per class of equivalent cutsets (see expandInterchangeable).
+        """
+        symmetry: typing.Optional[base.ComponentSymmetry] = self._symmetry if symmetric and self._symmetry else None
+        if fileLoc is not None:
+            return self.__generateStored(noProcesses, fileLoc, symmetry)
+
+        noComponents: int = len(self._labels)
+        fullMask: int = (1 << noComponents) - 1
+        feasibilityChecker: base.FeasibilityChecker = self._feasibilityChecker
+        canonicalize: typing.Callable[[int], int] = symmetry.canonicalize if symmetry is not None else (lambda mask: mask)
+
+        # Feasible subassemblies per length
+        levels: typing.Dict[int, typing.Set[int]] = {1: {canonicalize(bit) for bit in self._bits.values()},
+                                                     2: {canonicalize(self._toMask(edge)) for edge in self._topoConstraints.edges 
+                                                         if feasibilityChecker.isGeometricallyFeasible(self._toMask(edge))}}
+        levels[noComponents] = {fullMask}
+
+        parents: typing.List[int]
+        cutsets: typing.Iterable[typing.Tuple[int, int, int]]
+        if noProcesses > 1:
+            with ProcessPoolExecutor(max_workers=noProcesses, initializer=_initWorker,
+                                     initargs=({"feasibilityChecker": feasibilityChecker, "symmetry": symmetry},)) as executor:
+                for length in range(3, noComponents):
+                    # Shards are deduplicated locally by the workers and merged here
+                    levels[length] = set().union(*executor.map(_expandTask, self.__shard(list(levels[length-1]), noProcesses)))
+
+            # Parents are independent of each other
+            parents = [parent for length in range(2, noComponents+1) for parent in levels.get(length, set())]
+            with ProcessPoolExecutor(max_workers=noProcesses, initializer=_initWorker, initargs=({"levels": levels, "symmetry": symmetry},)) as executor:
+                cutsets = [cutset for chunk in executor.map(_cutsetsTask, self.__shard(parents, noProcesses)) for cutset in chunk]
+        else:
+            for length in range(3, noComponents):
+                levels[length] = expandSubassemblies(levels[length-1], feasibilityChecker, symmetry)
+
+            feasible: typing.Set[int] = set().union(*levels.values())
+            parents = [parent for length in range(2, noComponents+1) for parent in levels.get(length, set())]
+            cutsets = ((parent, child1, child2) for parent in parents for child1, child2 in iterCutsets(parent, levels, feasible, symmetry))
+
+        if compact:
+            compactGraph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph(self._labels)
+            nodeIds: typing.Dict[int, int] = {subassembly: compactGraph.add_node_mask(subassembly) for level in levels.values() for subassembly in level}
+            for parent, child1, child2 in cutsets:
+                compactGraph.add_edge_ids(nodeIds[parent], (nodeIds[child1], nodeIds[child2]))
+            return compactGraph
 
         oa_graph = graphs.AndOrGraph()
-        nodes = {graphs.Node(elements=sorted(subassembly)) for subassembly in subassemblies}
-        oa_graph.add_nodes_from(nodes)
-        
-        edges = set()
-        for key, cutsets in cutset_dict.items():
-            parent_node = oa_graph.get_node(subassemblies[key])
-            for cutset in cutsets:
-                child_nodes = [oa_graph.get_node(cut) for cut in cutset]
-                edges.add(graphs.AndEdge(parent_node, child_nodes))
-        oa_graph.add_edges_from(edges)
-
-        return oa_graph
\ No newline at end of file
+        nodes: typing.Dict[int, graphs.Node] = {subassembly: graphs.Node(elements=self._toElements(subassembly)) 
+                                                for level in levels.values() for subassembly in level}
+        oa_graph.add_nodes_from(nodes.values())
+
+        # Cutsets: splits of a feasible subassembly into two disjoint feasible subassemblies
+        for parent, child1, child2 in cutsets:
+            oa_graph.add_edge(graphs.AndEdge(nodes[parent], sorted([nodes[child1], nodes[child2]], key=lambda node: node.elements)))
+
+        return oa_graph
+
+    def __generateStored(self, noProcesses: int, fileLoc: str, symmetry: typing.Optional[base.ComponentSymmetry]) -> graphs.StoredAndOrGraph:
+        """Writes every level and the hyperedges of a parent level to disk as soon as they are produced.
+
+        Only the level being expanded and the hyperedges of one parent level are held in memory;
+        membership tests during the cutset search are indexed lookups in the file.
+        """
+        noComponents: int = len(self._labels)
+        feasibilityChecker: base.FeasibilityChecker = self._feasibilityChecker
+        storedGraph: graphs.StoredAndOrGraph = graphs.StoredAndOrGraph(fileLoc, self._labels)
+
+        canonicalize: typing.Callable[[int], int] = symmetry.canonicalize if symmetry is not None else (lambda mask: mask)
+        storedGraph.add_subassemblies(canonicalize(bit) for bit in self._bits.values())
+        storedGraph.add_subassemblies(canonicalize(self._toMask(edge)) for edge in self._topoConstraints.edges 
+                                      if feasibilityChecker.isGeometricallyFeasible(self._toMask(edge)))
+        storedGraph.commit()
+
+        executor: typing.Optional[ProcessPoolExecutor] = None
+        if noProcesses > 1:
+            executor = ProcessPoolExecutor(max_workers=noProcesses, initializer=_initWorker,
+                                           initargs=({"feasibilityChecker": feasibilityChecker, "symmetry": symmetry},))
+        try:
+            for length in range(3, noComponents):
+                if executor is not None:
+                    for level in executor.map(_expandTask, self.__shard(list(storedGraph.iter_subassemblies(length-1)), noProcesses)):
+                        storedGraph.add_subassemblies(level)
+                else:
+                    frontier: typing.List[int] = []
+                    for subassembly in storedGraph.iter_subassemblies(length-1):
+                        frontier.append(subassembly)
+                        if len(frontier) == self._STREAMING_CHUNK_SIZE:
+                            storedGraph.add_subassemblies(expandSubassemblies(frontier, feasibilityChecker, symmetry))
+                            frontier = []
+                    storedGraph.add_subassemblies(expandSubassemblies(frontier, feasibilityChecker, symmetry))
+                # Candidates of a level are never checked again in the next one
+                feasibilityChecker.clearMemo()
+                storedGraph.commit()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        storedGraph.add_subassemblies([(1 << noComponents) - 1])
+        storedGraph.commit()
+
+        if noProcesses > 1:
+            executor = ProcessPoolExecutor(max_workers=noProcesses, initializer=_initWorker, initargs=({"fileLoc": fileLoc, "symmetry": symmetry},))
+        try:
+            levels: _StoredLevels = _StoredLevels(storedGraph)
+            feasible: _StoredFeasible = _StoredFeasible(storedGraph)
+            for parentLength in range(2, noComponents+1):
+                parents: typing.List[int] = list(storedGraph.iter_subassemblies(parentLength))
+                if executor is not None:
+                    for chunk in executor.map(_cutsetsTask, self.__shard(parents, noProcesses)):
+                        storedGraph.add_cutsets(chunk)
+                else:
+                    storedGraph.add_cutsets((parent, child1, child2) for parent in parents for child1, child2 in iterCutsets(parent, levels, feasible, symmetry))
+                storedGraph.commit()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+        return storedGraph
+
+    def __shard(self, items: typing.List[int], noProcesses: int) -> typing.List[typing.List[int]]:
+        shardSize: int = max(1, math.ceil(len(items) / (noProcesses * self._TASKS_PER_WORKER)))
+        return [items[index:index+shardSize] for index in range(0, len(items), shardSize)]
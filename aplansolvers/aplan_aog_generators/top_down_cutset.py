@@ -0,0 +1,148 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+__title__ = ""
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+import aplansolvers.aplan_aog_generators.base_aog_generator as base
+import aplanobjects.graphs as graphs
+
+import typing
+
+
+def iterFeasibleCuts(parent: int, feasibilityChecker: base.FeasibilityChecker) -> typing.Iterator[typing.Tuple[int, int]]:
+    """Yields every unordered split of `parent` into two feasible subassemblies once, as a (larger, smaller) pair of masks.
+
+    The side of the cut that contains the parent's lowest component is grown from that component one neighbor at a time, and 
+    after every step it is closed under the components it blocks: a geometrically feasible superset has to contain those 
+    anyway. Sides that block a component outside the parent are not grown any further. Unlike iterCutsets of the bottom-up 
+    generator, this needs no precomputed set of feasible subassemblies; both sides are checked on their own (see TopDownCutset).
+    """
+    parentLength: int = bin(parent).count("1")
+    lowestBit: int = parent & -parent
+    neighborMasks: typing.Dict[int, int] = feasibilityChecker.neighborMasks
+
+    # Single components are always feasible, as in the bottom-up generator
+    if parentLength == 2:
+        yield parent ^ lowestBit, lowestBit
+        return
+    if feasibilityChecker.isFeasible(parent ^ lowestBit):
+        yield parent ^ lowestBit, lowestBit
+
+    # Sides mapped to their neighbors, which are updated incrementally as they grow
+    frontier: typing.Dict[int, int] = {lowestBit: neighborMasks[lowestBit]}
+    seen: typing.Set[int] = {lowestBit}
+    while frontier:
+        nextFrontier: typing.Dict[int, int] = {}
+        for child, childNeighbors in frontier.items():
+            neighbors: int = childNeighbors & parent & ~child
+            while neighbors:
+                neighbor: int = neighbors & -neighbors
+                neighbors ^= neighbor
+                grown: int = child | neighbor
+                grownNeighbors: int = childNeighbors | neighborMasks[neighbor]
+                blocked: int = feasibilityChecker.getBlocked(grown)
+                while blocked and not blocked & ~parent:
+                    grown |= blocked
+                    for bit in base.IAndOrGraphGenerator._iterBits(blocked):
+                        grownNeighbors |= neighborMasks[bit]
+                    blocked = feasibilityChecker.getBlocked(grown)
+                if blocked or grown == parent or grown in seen:
+                    continue
+                seen.add(grown)
+                nextFrontier[grown] = grownNeighbors
+                rest: int = parent ^ grown
+                if feasibilityChecker.isTopologicallyFeasible(grown) and (rest & (rest - 1) == 0 or feasibilityChecker.isFeasible(rest)):
+                    yield (grown, rest) if 2*bin(grown).count("1") >= parentLength else (rest, grown)
+        frontier = nextFrontier
+
+
+class TopDownCutset(base.IAndOrGraphGenerator):
+    """Decomposes the full assembly top-down into feasible two-way cuts, memoizing the cuts of every expanded subassembly.
+
+    Only the subassemblies reachable from the full assembly are generated. Single components are not expanded.
+
+    The feasibility of a subassembly differs from ReverseCutset's. Here, a subassembly is feasible if it is connected and blocks
+    no component outside of it, regardless of how it could be assembled. ReverseCutset only keeps the subassemblies that can be 
+    grown from a single component one neighbor at a time through feasible subassemblies. Every hyperedge of ReverseCutset's 
+    graph that is reachable from the full assembly is therefore part of this graph, but not the other way around: this graph 
+    can hold subassemblies, and thus plans, that ReverseCutset's lacks, e.g. a subassembly whose only connected subsets of 
+    one component less each block its remaining component.
+    """
+
+    def __init__(self, obj, components: typing.Set[str], constraints: typing.Dict,
+                 shapeKeys: typing.Optional[typing.Dict[str, typing.Hashable]] = None) -> None:
+        super().__init__(obj, components, constraints, shapeKeys)
+
+    def addProperties(self, obj) -> None:
+        if hasattr(obj, "Type"):
+            obj.Type = self.__class__.__name__
+
+    def generate(self, compact: bool = False) -> typing.Union[graphs.AndOrGraph, graphs.CompactAndOrGraph]:
+        """Generates the AND/OR graph; if `compact` is set, a CompactAndOrGraph is returned instead of an AndOrGraph."""
+        fullMask: int = (1 << len(self._labels)) - 1
+        cuts: typing.Dict[int, typing.List[typing.Tuple[int, int]]] = self.__expand(fullMask)
+        subassemblies: typing.Set[int] = {fullMask}.union(cuts.keys(), *[cut for cuts_ in cuts.values() for cut in cuts_])
+
+        if compact:
+            compactGraph: graphs.CompactAndOrGraph = graphs.CompactAndOrGraph(self._labels)
+            nodeIds: typing.Dict[int, int] = {subassembly: compactGraph.add_node_mask(subassembly) for subassembly in subassemblies}
+            for parent, cuts_ in cuts.items():
+                for child1, child2 in cuts_:
+                    compactGraph.add_edge_ids(nodeIds[parent], (nodeIds[child1], nodeIds[child2]))
+            return compactGraph
+
+        oa_graph = graphs.AndOrGraph()
+        nodes: typing.Dict[int, graphs.Node] = {subassembly: graphs.Node(elements=self._toElements(subassembly)) for subassembly in subassemblies}
+        oa_graph.add_nodes_from(nodes.values())
+        for parent, cuts_ in cuts.items():
+            for child1, child2 in cuts_:
+                oa_graph.add_edge(graphs.AndEdge(nodes[parent], sorted([nodes[child1], nodes[child2]], key=lambda node: node.elements)))
+
+        return oa_graph
+
+    def generateLazy(self, maxCachedNodes: int = 100000) -> graphs.LazyAndOrGraph:
+        """Returns a view of the AND/OR graph whose cuts are only computed once a subassembly's outgoing edges are accessed.
+
+        The view lives as long as its user, so its feasibility checks are memoized in tables of at most `maxCachedNodes` results.
+        """
+        feasibilityChecker: base.FeasibilityChecker = self._feasibilityChecker.withMaxMemoSize(maxCachedNodes)
+        return graphs.LazyAndOrGraph(self._labels, lambda mask: iterFeasibleCuts(mask, feasibilityChecker), maxCachedNodes)
+
+    def __expand(self, root: int) -> typing.Dict[int, typing.List[typing.Tuple[int, int]]]:
+        """Returns the cuts of every subassembly reachable from `root` that consists of more than one component."""
+        cuts: typing.Dict[int, typing.List[typing.Tuple[int, int]]] = {}
+        stack: typing.List[int] = [root] if root & (root - 1) else []
+        while stack:
+            parent: int = stack.pop()
+            if parent in cuts:
+                continue
+            cuts[parent] = list(iterFeasibleCuts(parent, self._feasibilityChecker))
+            for cut in cuts[parent]:
+                for child in cut:
+                    if child & (child - 1) and child not in cuts:
+                        stack.append(child)
+        return cuts
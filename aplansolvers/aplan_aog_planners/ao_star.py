@@ -0,0 +1,161 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+__title__ = "AO* search on lazily expanded AND/OR graphs"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+import aplanobjects.graphs as graphs
+
+import heapq
+import math
+import typing
+
+
+def unitOperationCost(parent: int, cut: typing.Tuple[int, ...]) -> float:
+    return 1.0
+
+
+def zeroHeuristic(subassembly: int) -> float:
+    return 0.0
+
+
+class AOStarSearch:
+    """Best-first (AO*) search for the cheapest disassembly of an assembly in a LazyAndOrGraph.
+
+    The cost of a disassembly is the sum of the costs of its operations, i.e. of the cuts it consists of. Only the subassemblies
+    on the currently best partial disassembly are expanded, so the search usually touches a small part of the graph. The result
+    is optimal if `heuristic` never overestimates the cost of disassembling a subassembly; e.g. with the unit operation cost,
+    the number of components minus one is exact.
+    """
+
+    def __init__(self, graph: graphs.LazyAndOrGraph,
+                 operationCost: typing.Callable[[int, typing.Tuple[int, ...]], float] = unitOperationCost,
+                 heuristic: typing.Callable[[int], float] = zeroHeuristic) -> None:
+        self._graph: graphs.LazyAndOrGraph = graph
+        self._operationCost: typing.Callable[[int, typing.Tuple[int, ...]], float] = operationCost
+        self._heuristic: typing.Callable[[int], float] = heuristic
+
+        # Current cost estimates, best cuts and solved subassemblies
+        self._costs: typing.Dict[int, float] = {}
+        self._bestCuts: typing.Dict[int, typing.Tuple[int, ...]] = {}
+        self._solved: typing.Set[int] = set()
+        self._expanded: typing.Set[int] = set()
+        self._parents: typing.Dict[int, typing.Set[int]] = {}
+
+    @property
+    def noExpansions(self) -> int:
+        return len(self._expanded)
+
+    def search(self, root: typing.Optional[int] = None,
+               maxExpansions: typing.Optional[int] = None) -> typing.Optional[typing.Dict[int, typing.Tuple[int, ...]]]:
+        """Returns the cut of every subassembly of the cheapest disassembly of `root` (the full assembly by default).
+
+        Returns None if the root cannot be disassembled or if no disassembly was found within `maxExpansions` expansions;
+        calling search again continues where it stopped.
+        """
+        root = self._graph.root_mask if root is None else root
+        self.__initialize(root)
+        while root not in self._solved and self._costs[root] < math.inf:
+            if maxExpansions is not None and len(self._expanded) >= maxExpansions:
+                return None
+            self.__expand(self.__findTip(root))
+        return self.getSolution(root) if root in self._solved else None
+
+    def getCost(self, subassembly: int) -> float:
+        return self._costs[subassembly]
+
+    def getSolution(self, root: int) -> typing.Dict[int, typing.Tuple[int, ...]]:
+        solution: typing.Dict[int, typing.Tuple[int, ...]] = {}
+        stack: typing.List[int] = [root]
+        while stack:
+            subassembly: int = stack.pop()
+            if subassembly in self._bestCuts and subassembly not in solution:
+                solution[subassembly] = self._bestCuts[subassembly]
+                stack.extend(self._bestCuts[subassembly])
+        return solution
+
+    def toAndOrGraph(self, solution: typing.Dict[int, typing.Tuple[int, ...]]) -> graphs.AndOrGraph:
+        """Returns the disassembly as an AndOrGraph with a single outgoing hyperedge per subassembly."""
+        return graphs.AndOrGraph.from_hyperedges([self._graph.to_elements(mask) for mask in set(solution.keys()).union(*solution.values())],
+                                                 [(self._graph.to_elements(parent), [self._graph.to_elements(child) for child in cut]) 
+                                                  for parent, cut in solution.items()])
+
+    def __initialize(self, subassembly: int) -> None:
+        if subassembly not in self._costs:
+            if subassembly & (subassembly - 1):
+                self._costs[subassembly] = self._heuristic(subassembly)
+            else:
+                # Single components need no disassembly
+                self._costs[subassembly] = 0.0
+                self._solved.add(subassembly)
+
+    def __findTip(self, root: int) -> int:
+        """Returns an unexpanded subassembly of the best partial disassembly of the root."""
+        stack: typing.List[int] = [root]
+        while stack:
+            subassembly: int = stack.pop()
+            if subassembly not in self._expanded:
+                return subassembly
+            stack.extend(child for child in self._bestCuts[subassembly] if child not in self._solved)
+        raise RuntimeError("The best partial disassembly has no unexpanded subassembly")
+
+    def __expand(self, subassembly: int) -> None:
+        self._expanded.add(subassembly)
+        for cut in self._graph.cuts(subassembly):
+            for child in cut:
+                self.__initialize(child)
+                self._parents.setdefault(child, set()).add(subassembly)
+        self.__revise(subassembly)
+
+    def __revise(self, subassembly: int) -> None:
+        """Updates the costs of the subassembly and its ancestors, children before their parents."""
+        queue: typing.List[typing.Tuple[int, int]] = [(bin(subassembly).count("1"), subassembly)]
+        queued: typing.Set[int] = {subassembly}
+        while queue:
+            _, subassembly = heapq.heappop(queue)
+            queued.discard(subassembly)
+
+            bestCost: float = math.inf
+            bestCut: typing.Optional[typing.Tuple[int, ...]] = None
+            for cut in self._graph.cuts(subassembly):
+                cost: float = self._operationCost(subassembly, cut) + sum(self._costs[child] for child in cut)
+                if cost < bestCost:
+                    bestCost, bestCut = cost, cut
+            solved: bool = bestCut is not None and all(child in self._solved for child in bestCut)
+
+            if bestCost == self._costs[subassembly] and bestCut == self._bestCuts.get(subassembly) and solved == (subassembly in self._solved):
+                continue
+            self._costs[subassembly] = bestCost
+            if bestCut is not None:
+                self._bestCuts[subassembly] = bestCut
+            if solved:
+                self._solved.add(subassembly)
+            else:
+                self._solved.discard(subassembly)
+            for parent in self._parents.get(subassembly, ()):
+                if parent not in queued:
+                    heapq.heappush(queue, (bin(parent).count("1"), parent))
+                    queued.add(parent)
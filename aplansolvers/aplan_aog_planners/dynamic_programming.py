@@ -0,0 +1,238 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+__title__ = "Optimal disassembly of array-backed AND/OR graphs by dynamic programming"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+import aplanobjects.graphs as graphs
+
+import math
+import numpy as np
+import typing
+
+
+class DynamicProgrammingSearch:
+    """Cheapest disassembly of an assembly in a CompactAndOrGraph, computed over the whole graph bottom-up.
+
+    Every operation of a disassembly removes the smallest subassembly of a cut from the rest of its parent, in one of the
+    motion directions of the obstruction graphs (by name, e.g. {"POS_X": ..., "NEG_X": ...}) in which it is not obstructed.
+    An operation costs `operationCost`, plus `directionChangeCost` if its direction differs from that of the operation
+    that produced its parent. The cost of a subassembly therefore depends on the direction it was removed in, so the
+    costs are kept in a (nodes x directions+1) array, the last column being that of the assembly itself. The columns are
+    filled one subassembly size at a time, smallest first, with array operations over all hyperedges of that size.
+    """
+
+    # Number of hyperedges whose motion directions are checked at once
+    CHUNK_SIZE: typing.Final[int] = 65536
+
+    def __init__(self, graph: typing.Union[graphs.CompactAndOrGraph, graphs.AndOrGraph],
+                 obstructionGraphs: typing.Dict[str, graphs.ObstructionGraph],
+                 operationCost: float = 1.0, directionChangeCost: float = 1.0) -> None:
+        self._graph: graphs.CompactAndOrGraph = graph if isinstance(graph, graphs.CompactAndOrGraph) else graph.to_compact()
+        self._directions: typing.List[str] = list(obstructionGraphs.keys())
+        self._operationCost: float = operationCost
+        self._directionChangeCost: float = directionChangeCost
+
+        # obstructions[i, d*n + j]: component j obstructs component i in direction d
+        noLabels: int = len(self._graph.labels)
+        indices: typing.Dict[str, int] = {label: index for index, label in enumerate(self._graph.labels)}
+        self._obstructions: np.ndarray = np.zeros((noLabels, len(self._directions)*noLabels), dtype=np.float32)
+        for direction, obstructionGraph in enumerate(obstructionGraphs.values()):
+            for source, target in obstructionGraph.edges:
+                if source in indices and target in indices:
+                    self._obstructions[indices[source], direction*noLabels + indices[target]] = 1.0
+
+        self._costs: typing.Optional[np.ndarray] = None
+        self._feasible: typing.Optional[np.ndarray] = None
+        # The best cut, its direction and the cost of the subassemblies of the last solution
+        self._bestCuts: typing.Dict[int, typing.Tuple[int, ...]] = {}
+        self._agents: typing.Dict[int, str] = {}
+        self._solutionCosts: typing.Dict[int, float] = {}
+        self._edgeCosts: typing.Dict[int, typing.Dict[str, float]] = {}
+
+    @property
+    def directions(self) -> typing.List[str]:
+        return self._directions
+
+    def search(self, root: typing.Optional[int] = None) -> typing.Optional[typing.Dict[int, typing.Tuple[int, ...]]]:
+        """Returns the cut of every subassembly of the cheapest disassembly of `root` (the full assembly by default).
+
+        Returns None if the root is not in the graph or cannot be disassembled. The costs of all subassemblies are computed
+        on the first call; later calls only trace the solution.
+        """
+        root = (1 << len(self._graph.labels)) - 1 if root is None else root
+        rootId: typing.Optional[int] = self._graph.node_id(root)
+        if rootId is None:
+            return None
+        costs: np.ndarray = self.__getCosts()
+        if costs[rootId, -1] == math.inf:
+            return None
+
+        self._bestCuts.clear()
+        self._agents.clear()
+        self._solutionCosts.clear()
+        self._edgeCosts.clear()
+        stack: typing.List[typing.Tuple[int, int]] = [(rootId, len(self._directions))]
+        while stack:
+            nodeId, column = stack.pop()
+            subassembly: int = self._graph.node_mask(nodeId)
+            self._solutionCosts[subassembly] = float(costs[nodeId, column])
+            edgeIds: np.ndarray = self._graph.out_edge_ids(nodeId)
+            if len(edgeIds) == 0:
+                continue
+            edgeCosts: np.ndarray = self.__getOperationCosts(edgeIds) + self.__getChangeCosts(column)
+            edgeIndex, direction = np.unravel_index(int(np.argmin(edgeCosts)), edgeCosts.shape)
+            childIds: np.ndarray = self._graph.edge_children(int(edgeIds[edgeIndex]))
+            self._bestCuts[subassembly] = tuple(self._graph.node_mask(int(childId)) for childId in childIds)
+            self._agents[subassembly] = self._directions[direction]
+            self._edgeCosts[subassembly] = {self._directions[direction_]: float(cost) 
+                                            for direction_, cost in enumerate(edgeCosts[edgeIndex]) if cost < math.inf}
+            stack.extend((int(childId), int(direction)) for childId in childIds)
+        return dict(self._bestCuts)
+
+    def getCost(self, subassembly: int) -> float:
+        """Returns the cost of the cheapest disassembly of the subassembly on its own."""
+        nodeId: typing.Optional[int] = self._graph.node_id(subassembly)
+        return math.inf if nodeId is None else float(self.__getCosts()[nodeId, -1])
+
+    def getAgent(self, subassembly: int) -> str:
+        """Returns the direction of the operation of the subassembly in the last solution."""
+        return self._agents[subassembly]
+
+    def toAndOrGraph(self, solution: typing.Dict[int, typing.Tuple[int, ...]]) -> graphs.AndOrGraph:
+        """Returns the last solution as an AndOrGraph with a single outgoing hyperedge per subassembly, annotated with its costs."""
+        graph: graphs.AndOrGraph = graphs.AndOrGraph.from_hyperedges(
+            [self._graph.to_elements(mask) for mask in set(solution.keys()).union(*solution.values())],
+            [(self._graph.to_elements(parent), [self._graph.to_elements(child) for child in cut]) for parent, cut in solution.items()])
+        for node in graph.nodes:
+            node.cost = self._solutionCosts[self._graph.to_mask(node.elements)]
+        for edge in graph.edges:
+            parent: int = self._graph.to_mask(edge.parent_node.elements)
+            edge.agent = self._agents[parent]
+            edge.cost = self._edgeCosts[parent]
+        return graph
+
+    def annotate(self, graph: graphs.AndOrGraph) -> None:
+        """Sets the cost of every node of `graph`, and the costs per direction and cheapest direction of every hyperedge.
+
+        These are the costs of disassembling the subassemblies on their own, i.e. without a preceding operation.
+        """
+        costs: np.ndarray = self.__getCosts()
+        for node in graph.nodes:
+            nodeId: typing.Optional[int] = self._graph.node_id(self._graph.to_mask(node.elements))
+            node.cost = math.inf if nodeId is None else float(costs[nodeId, -1])
+        for edge in graph.edges:
+            edgeId: typing.Optional[int] = self.__findEdgeId(edge)
+            if edgeId is None:
+                continue
+            operationCosts: np.ndarray = self.__getOperationCosts(np.array([edgeId]))[0]
+            edge.cost = {self._directions[direction]: float(cost) for direction, cost in enumerate(operationCosts) if cost < math.inf}
+            edge.agent = self._directions[int(np.argmin(operationCosts))] if edge.cost else ""
+
+    def __findEdgeId(self, edge: graphs.AndEdge) -> typing.Optional[int]:
+        parentId: typing.Optional[int] = self._graph.node_id(self._graph.to_mask(edge.parent_node.elements))
+        if parentId is None:
+            return None
+        childMasks: typing.List[int] = sorted(self._graph.to_mask(child.elements) for child in edge.child_nodes)
+        for edgeId in self._graph.out_edge_ids(parentId):
+            if sorted(self._graph.node_mask(int(childId)) for childId in self._graph.edge_children(int(edgeId))) == childMasks:
+                return int(edgeId)
+        return None
+
+    def __getChangeCosts(self, column: int) -> np.ndarray:
+        """Returns the direction change cost per direction of an operation on a subassembly removed in direction `column`."""
+        changeCosts: np.ndarray = np.full(len(self._directions), self._directionChangeCost)
+        if column < len(self._directions):
+            changeCosts[column] = 0.0
+        else:
+            changeCosts[:] = 0.0
+        return changeCosts
+
+    def __getOperationCosts(self, edgeIds: np.ndarray) -> np.ndarray:
+        """Returns the (edges x directions) costs of the operations of the hyperedges including those of their children."""
+        _, childOffsets, children = self._graph.edge_arrays()
+        childIndices, starts = self.__getChildIndices(childOffsets, edgeIds)
+        childCosts: np.ndarray = np.add.reduceat(self._costs[children[childIndices], :-1], starts, axis=0)
+        return np.where(self._feasible[edgeIds], self._operationCost + childCosts, math.inf)
+
+    @staticmethod
+    def __getChildIndices(childOffsets: np.ndarray, edgeIds: np.ndarray) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the indices of the children of the hyperedges in the child array, and where those of each hyperedge start."""
+        counts: np.ndarray = childOffsets[edgeIds+1] - childOffsets[edgeIds]
+        starts: np.ndarray = np.zeros(len(edgeIds), dtype=np.int64)
+        np.cumsum(counts[:-1], out=starts[1:])
+        return np.repeat(childOffsets[edgeIds] - starts, counts) + np.arange(int(counts.sum()), dtype=np.int64), starts
+
+    def __getCosts(self) -> np.ndarray:
+        if self._costs is not None:
+            return self._costs
+
+        noDirections: int = len(self._directions)
+        sizes: np.ndarray = self._graph.node_sizes()
+        edgeIds: np.ndarray = self._graph.edge_ids()
+        edgeParents, _, _ = self._graph.edge_arrays()
+        self._feasible = self.__getFeasibleDirections(edgeIds)
+
+        # Single components cost nothing, other subassemblies without a feasible cut cannot be disassembled
+        self._costs = np.where(sizes[:, np.newaxis] > 1, math.inf, 0.0).repeat(noDirections+1, axis=1)
+        # Hyperedges by the size of their parent, then by their parent; children are smaller than their parents
+        edgeIds = edgeIds[np.lexsort((edgeParents[edgeIds], sizes[edgeParents[edgeIds]]))]
+        levelStarts: np.ndarray = np.flatnonzero(np.diff(sizes[edgeParents[edgeIds]], prepend=-1))
+        for levelEdgeIds in np.split(edgeIds, levelStarts[1:]) if len(edgeIds) else []:
+            operationCosts: np.ndarray = self.__getOperationCosts(levelEdgeIds)
+            minCosts: np.ndarray = operationCosts.min(axis=1)
+            # Cost per direction the parent was removed in: keep that direction, or change to the cheapest one
+            edgeCosts: np.ndarray = np.empty((len(levelEdgeIds), noDirections+1))
+            np.minimum(operationCosts, (minCosts + self._directionChangeCost)[:, np.newaxis], out=edgeCosts[:, :-1])
+            edgeCosts[:, -1] = minCosts
+            parentIds: np.ndarray = edgeParents[levelEdgeIds]
+            parentStarts: np.ndarray = np.flatnonzero(np.diff(parentIds, prepend=-1))
+            self._costs[parentIds[parentStarts]] = np.minimum.reduceat(edgeCosts, parentStarts, axis=0)
+        return self._costs
+
+    def __getFeasibleDirections(self, edgeIds: np.ndarray) -> np.ndarray:
+        """Returns per hyperedge whether the smallest child can be moved away from the rest of the parent in each direction."""
+        noLabels: int = len(self._graph.labels)
+        noDirections: int = len(self._directions)
+        sizes: np.ndarray = self._graph.node_sizes()
+        edgeParents, childOffsets, children = self._graph.edge_arrays()
+        feasible: np.ndarray = np.zeros((len(edgeParents), noDirections), dtype=np.bool_)
+
+        for chunkStart in range(0, len(edgeIds), self.CHUNK_SIZE):
+            chunkEdgeIds: np.ndarray = edgeIds[chunkStart:chunkStart+self.CHUNK_SIZE]
+            childIndices, starts = self.__getChildIndices(childOffsets, chunkEdgeIds)
+            # The first of the smallest children of every hyperedge
+            childSizes: np.ndarray = sizes[children[childIndices]]
+            edgeIndices: np.ndarray = np.repeat(np.arange(len(chunkEdgeIds)), np.diff(np.append(starts, len(childIndices))))
+            isSmallest: np.ndarray = childSizes == np.minimum.reduceat(childSizes, starts)[edgeIndices]
+            _, firstSmallest = np.unique(edgeIndices[isSmallest], return_index=True)
+            removedIds: np.ndarray = children[childIndices[np.flatnonzero(isSmallest)[firstSmallest]]]
+
+            removed: np.ndarray = self._graph.node_bits(removedIds)
+            rest: np.ndarray = self._graph.node_bits(edgeParents[chunkEdgeIds]) & ~removed
+            obstructed: np.ndarray = (removed.astype(np.float32) @ self._obstructions).reshape(len(chunkEdgeIds), noDirections, noLabels) > 0
+            feasible[chunkEdgeIds] = ~(obstructed & rest[:, np.newaxis, :]).any(axis=2)
+        return feasible
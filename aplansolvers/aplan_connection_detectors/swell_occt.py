@@ -26,7 +26,7 @@ __title__ = "FreeCAD APLAN SwellOCCT connection detector"
 __author__ = "Martijn Cramer"
 __url__ = "https://www.freecadweb.org"
 
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 try:
     import Aplan
     import aplansolvers.aplan_connection_detectors.base_connection_detector as base
@@ -43,6 +43,9 @@ except ImportError as ie:
     aplanutils.missingPythonModule(str(ie.name or ""))
 
 
+DEF_CHUNK_SIZE: int = 10000
+
+
 class RefinementMethod(enum.Enum):
     None_ = ("None", "")
     BoundBox = ("BoundBox_Intersection", "Tooltip information about this refinement method")
@@ -306,7 +309,8 @@ class _TaskPanel(base.ITaskPanel):
                                         "refinementMethod": self._refinementMethod,
                                         "configParamRefinement": configParamRefinement,
                                         "solverMethod": self._solverMethod,
-                                        "configParamSolver": configParamSolver}
+                                        "configParamSolver": configParamSolver,
+                                        "workingDir": str(self._analysis.WorkingDir)}
             self._solverThread = QtCore.QThread()
             self._worker: Worker = Worker(inputParams)
             self._worker.moveToThread(self._solverThread)
@@ -375,6 +379,14 @@ class _TaskPanel(base.ITaskPanel):
         self.obj.Tolerance = self._tolerance
 
 
+class ComponentProperties(typing.NamedTuple):
+    shape: typing.Any
+    volume: float
+    boundBox: typing.Any
+    noFaces: int
+    sampleSpacing: float
+
+
 class SwellOCCTSolver:
     def __init__(self, components: typing.List) -> None:
         self._isRunning: bool = True
@@ -382,85 +394,135 @@ class SwellOCCTSolver:
 
     def setComponents(self, components: typing.List) -> None:
         self._componentsDict = {component.Label: component for component in components}
-
-    def refine(self, method: RefinementMethod, configParam: typing.Dict) -> typing.List:
-        potentialConnections: typing.List = []
+        self._componentProperties: typing.Dict[str, ComponentProperties] = {}
+        self._sampleRate: typing.Optional[float] = None
+        # Sample points are kept across the chunks of a run
+        self._partPointsMeshDict: typing.Dict = {}
+        self._partPointsSampleDict: typing.Dict = {}
+
+    @property
+    def componentProperties(self) -> typing.Dict[str, ComponentProperties]:
+        return self._componentProperties
+
+    def computeComponentProperties(self, sampleRate: float = 0.0) -> typing.Dict[str, ComponentProperties]:
+        # Shape.Volume and Shape.BoundBox trigger a (mass) property computation on the B-rep every time they are accessed,
+        # hence they are computed only once per component and per run.
+        if self._componentProperties and self._sampleRate == sampleRate:
+            return self._componentProperties
+
+        componentProperties: typing.Dict[str, ComponentProperties] = {}
+        for label, component in self._componentsDict.items():
+            if not self._isRunning:
+                return {}
+            if label in self._componentProperties:
+                # Only the sample spacing depends on the run's configuration
+                self._partPointsMeshDict.pop(label, None)
+                self._partPointsSampleDict.pop(label, None)
+                properties: ComponentProperties = self._componentProperties[label]
+                boundBox = properties.boundBox
+                componentProperties[label] = properties._replace(sampleSpacing=min(boundBox.XLength, boundBox.YLength, boundBox.ZLength) * sampleRate)
+                continue
+            shape = component.Shape
+            boundBox = shape.BoundBox
+            componentProperties[label] = ComponentProperties(shape=shape,
+                                                             volume=shape.Volume,
+                                                             boundBox=boundBox,
+                                                             noFaces=len(shape.Faces),
+                                                             sampleSpacing=min(boundBox.XLength, boundBox.YLength, boundBox.ZLength) * sampleRate)
+        self._componentProperties = componentProperties
+        self._sampleRate = sampleRate
+        return self._componentProperties
+
+    def refine(self, method: RefinementMethod, configParam: typing.Dict, chunkSize: int = DEF_CHUNK_SIZE) -> typing.Iterator[typing.List[typing.Tuple[str, str]]]:
+        """Lazily yields the potential connections in chunks of at most `chunkSize` label pairs."""
+        potentialConnections: typing.Iterator[typing.Tuple[str, str]] = iter(())
         if method == RefinementMethod.None_:
-            potentialConnections = [comb for comb in itertools.combinations(self._componentsDict.keys(), 2)]
+            potentialConnections = itertools.combinations(self._componentsDict.keys(), 2)
         elif method == RefinementMethod.BoundBox:
             swellDistance: float = float(configParam["swellDistance"])
+            componentProperties: typing.Dict[str, ComponentProperties] = self.computeComponentProperties(self._sampleRate or 0.0)
             boundBoxDict: typing.Dict = {}
-            for component in self._componentsDict.values():
+            for label, properties in componentProperties.items():
                 if not self._isRunning:
-                    return []
-                boundBoxDict[component.Label] = FreeCAD.BoundBox((component.Shape.BoundBox.XMin-swellDistance/2),
-                                                                 (component.Shape.BoundBox.YMin-swellDistance/2),
-                                                                 (component.Shape.BoundBox.ZMin-swellDistance/2),
-                                                                 (component.Shape.BoundBox.XMax+swellDistance/2),
-                                                                 (component.Shape.BoundBox.YMax+swellDistance/2),
-                                                                 (component.Shape.BoundBox.ZMax+swellDistance/2))
-            
-            for comb in itertools.combinations(boundBoxDict.keys(), 2):
-                if not self._isRunning:
-                    return []
-                if boundBoxDict[comb[0]].intersect(boundBoxDict[comb[1]]):
-                    potentialConnections.append(comb)
-
-        return potentialConnections
+                    return
+                boundBoxDict[label] = FreeCAD.BoundBox((properties.boundBox.XMin-swellDistance/2),
+                                                       (properties.boundBox.YMin-swellDistance/2),
+                                                       (properties.boundBox.ZMin-swellDistance/2),
+                                                       (properties.boundBox.XMax+swellDistance/2),
+                                                       (properties.boundBox.YMax+swellDistance/2),
+                                                       (properties.boundBox.ZMax+swellDistance/2))
+
+            potentialConnections = (comb for comb in itertools.combinations(boundBoxDict.keys(), 2) 
+                                    if boundBoxDict[comb[0]].intersect(boundBoxDict[comb[1]]))
+
+        while self._isRunning:
+            chunk: typing.List[typing.Tuple[str, str]] = list(itertools.islice(potentialConnections, chunkSize))
+            if not chunk:
+                return
+            yield chunk
     
     def solve(self, method: SolverMethod, configParam: typing.Dict, **kwargs) -> typing.Set[typing.Tuple]:
-        potentialConnections: typing.List = kwargs.get("potConnections", list(itertools.combinations(self._componentsDict.keys(), 2)))
-        partPointsMeshDict: typing.Dict = {}
-        partPointsSampleDict: typing.Dict = {}
+        potentialConnections: typing.Iterable[typing.Tuple[str, str]] = kwargs.get("potConnections", itertools.combinations(self._componentsDict.keys(), 2))
+        partPointsMeshDict: typing.Dict = self._partPointsMeshDict
+        partPointsSampleDict: typing.Dict = self._partPointsSampleDict
+        componentProperties: typing.Dict[str, ComponentProperties] = self.computeComponentProperties(float(configParam.get("sampleRate", 0.0)))
+        # Optional list collecting a (label1, label2, connected, duration) record per solved pair
+        pairResults: typing.Optional[typing.List[typing.Tuple[str, str, bool, float]]] = kwargs.get("pairResults")
 
         topologicalConstraints: typing.Set[typing.Tuple] = set()
         for potentialConnection in potentialConnections:
             if not self._isRunning:
                 return set()
+            noConstraints: int = len(topologicalConstraints)
+            timePair: float = time.perf_counter()
             componentLabel1: str = potentialConnection[0]
             componentLabel2: str = potentialConnection[1]
-            component1 = self._componentsDict[potentialConnection[0]]
-            component2 = self._componentsDict[potentialConnection[1]]
+            properties1: ComponentProperties = componentProperties[componentLabel1]
+            properties2: ComponentProperties = componentProperties[componentLabel2]
 
             if method == SolverMethod.DistToShape:
-                if component1.Shape.distToShape(component2.Shape)[0] < float(configParam["minDistance"]):
+                if properties1.shape.distToShape(properties2.shape)[0] < float(configParam["minDistance"]):
                     topologicalConstraints.add(tuple(sorted([componentLabel1, componentLabel2])))
             elif method == SolverMethod.MeshInside:
-                smallestComponent, largestComponent = sorted([component1, component2], key=lambda c: c.Shape.Volume, reverse=False)
-                boundBox = smallestComponent.Shape.BoundBox
-                maxLength: float = min(boundBox.XLength, boundBox.YLength, boundBox.ZLength) * float(configParam["sampleRate"])
+                smallestLabel, largestLabel = sorted([componentLabel1, componentLabel2], key=lambda l: componentProperties[l].volume, reverse=False)
                 meshPoints: typing.List = []
-                if smallestComponent.Label not in partPointsMeshDict.keys():
-                    partPointsMeshDict[smallestComponent.Label] = MeshPart.meshFromShape(Shape=smallestComponent.Shape, MaxLength=maxLength).Points
-                meshPoints = partPointsMeshDict[smallestComponent.Label]
+                if smallestLabel not in partPointsMeshDict.keys():
+                    partPointsMeshDict[smallestLabel] = MeshPart.meshFromShape(Shape=componentProperties[smallestLabel].shape, 
+                                                                               MaxLength=componentProperties[smallestLabel].sampleSpacing).Points
+                meshPoints = partPointsMeshDict[smallestLabel]
+                largestShape = componentProperties[largestLabel].shape
                 for p in meshPoints:
                     if not self._isRunning:
                         return set()
-                    if largestComponent.Shape.isInside(FreeCAD.Vector(p.x, p.y, p.z), float(configParam["tolerance"]), True):
+                    if largestShape.isInside(FreeCAD.Vector(p.x, p.y, p.z), float(configParam["tolerance"]), True):
                         topologicalConstraints.add(tuple(sorted([componentLabel1, componentLabel2])))
                         break
             elif method == SolverMethod.GeoDataInside:
-                smallestComponent, largestComponent = sorted([component1, component2], key=lambda c: c.Shape.Volume, reverse=False)
-                boundBox = smallestComponent.Shape.BoundBox
-                distance: float = min(boundBox.XLength, boundBox.YLength, boundBox.ZLength) * float(configParam["sampleRate"])
+                smallestLabel, largestLabel = sorted([componentLabel1, componentLabel2], key=lambda l: componentProperties[l].volume, reverse=False)
                 samplePoints: typing.List = []
-                if smallestComponent.Label not in partPointsSampleDict.keys():
-                    partPointsSampleDict[smallestComponent.Label] = Aplan.pointSampleShape(smallestComponent.Label, distance)
-                samplePoints = partPointsSampleDict[smallestComponent.Label]
+                if smallestLabel not in partPointsSampleDict.keys():
+                    partPointsSampleDict[smallestLabel] = Aplan.pointSampleShape(smallestLabel, componentProperties[smallestLabel].sampleSpacing)
+                samplePoints = partPointsSampleDict[smallestLabel]
+                largestShape = componentProperties[largestLabel].shape
                 p_: typing.Tuple[float, float, float]
                 for p_ in samplePoints:
                     if not self._isRunning:
                         return set()
-                    if largestComponent.Shape.isInside(FreeCAD.Vector(p_[0], p_[1], p_[2]), float(configParam["tolerance"]), True):
+                    if largestShape.isInside(FreeCAD.Vector(p_[0], p_[1], p_[2]), float(configParam["tolerance"]), True):
                         topologicalConstraints.add(tuple(sorted([componentLabel1, componentLabel2])))
                         break
             elif method == SolverMethod.Proximity:
-                overlappedSubShapes0, overlappedSubShapes1 = component1.Shape.proximity(component2.Shape, float(configParam["tolerance"]))
+                overlappedSubShapes0, overlappedSubShapes1 = properties1.shape.proximity(properties2.shape, float(configParam["tolerance"]))
                 if len(overlappedSubShapes0) > 0 or len(overlappedSubShapes1) > 0:
                     topologicalConstraints.add(tuple(sorted([componentLabel1, componentLabel2])))
             elif method == SolverMethod.Section:
-                if len(component1.Shape.section(component2.Shape, False).Vertexes) > 0:
+                if len(properties1.shape.section(properties2.shape, False).Vertexes) > 0:
                     topologicalConstraints.add(tuple(sorted([componentLabel1, componentLabel2])))
+
+            if pairResults is not None:
+                pairResults.append((*sorted([componentLabel1, componentLabel2]),
+                                    len(topologicalConstraints) > noConstraints,
+                                    time.perf_counter()-timePair))
         
         return topologicalConstraints
     
@@ -477,6 +539,7 @@ class Worker(base.BaseWorker):
         self._configParamRefinement: typing.Dict = self._inputParams["configParamRefinement"]
         self._solverMethod: SolverMethod = self._inputParams["solverMethod"]
         self._configParamSolver: typing.Dict = self._inputParams["configParamSolver"]
+        self._workingDir: typing.Optional[str] = self._inputParams.get("workingDir")
         self._solver: SwellOCCTSolver = SwellOCCTSolver(list(self._componentsDict.values()))
 
     def run(self) -> None:
@@ -484,46 +547,66 @@ class Worker(base.BaseWorker):
                             "type": base.MessageType.INFO})
         self._isRunning = True
         computationTime: float = 0.0
+        store: typing.Optional[result_store.ResultStore] = None
 
         try:           
-            self.progress.emit({"msg": "====== Refining ======",
+            self.progress.emit({"msg": "====== Refining & solving ======",
                                 "type": base.MessageType.INFO})
-            self.progress.emit({"msg": "Performing the {} refinement method".format(self._refinementMethod.value[0]),
+            self.progress.emit({"msg": "Performing the {} refinement method\nand the {} solver method".format(self._refinementMethod.value[0],
+                                                                                                              self._solverMethod.value[0]),
                                 "type": base.MessageType.INFO})
-            time0: float = time.perf_counter()
 
-            potentialConnections: typing.List = self._solver.refine(self._refinementMethod, self._configParamRefinement)
-
-            time1: float = time.perf_counter()
-            computationTime += time1-time0
-            self.progress.emit({"msg": "Found {} potential connections".format(len(potentialConnections)),
-                                "type": base.MessageType.INFO})
-            self.progress.emit({"msg": "> Done: {:.3f}s".format(time1-time0),
-                                "type": base.MessageType.INFO})
+            # The potential connections are refined and solved chunk by chunk, 
+            # so that solving starts before the refinement has finished and memory usage stays bounded.
+            refinementTime: float = 0.0
+            solverTime: float = 0.0
+            noPotentialConnections: int = 0
+            topologicalConstraints: typing.Set[typing.Tuple] = set()
+            runId: int = 0
+            if self._workingDir:
+                store = result_store.ResultStore.forWorkingDir(self._workingDir)
+                runId = store.beginRun("SwellOCCT",
+                                       {"refinementMethod": self._refinementMethod.name,
+                                        "configParamRefinement": self._configParamRefinement,
+                                        "solverMethod": self._solverMethod.name,
+                                        "configParamSolver": self._configParamSolver})
+            chunks: typing.Iterator[typing.List[typing.Tuple[str, str]]] = self._solver.refine(self._refinementMethod, self._configParamRefinement)
+            while self._isRunning:
+                time0: float = time.perf_counter()
+                chunk: typing.Optional[typing.List[typing.Tuple[str, str]]] = next(chunks, None)
+                time1: float = time.perf_counter()
+                refinementTime += time1-time0
+                if chunk is None:
+                    break
+
+                pairResults: typing.List[typing.Tuple[str, str, bool, float]] = []
+                topologicalConstraints.update(self._solver.solve(self._solverMethod, self._configParamSolver, potConnections=chunk, pairResults=pairResults))
+
+                time2: float = time.perf_counter()
+                solverTime += time2-time1
+                if store is not None:
+                    store.upsertPairResults(runId, result_store.NO_DIRECTION, pairResults)
+                    store.commit()
+                noPotentialConnections += len(chunk)
+                self.progress.emit({"msg": "Processed {} potential connections: {} topological constraint(s) so far".format(noPotentialConnections,
+                                                                                                                       len(topologicalConstraints)),
+                                    "type": base.MessageType.INFO})
 
             if not self._isRunning:
                 self.__abort()
                 return
 
-            self.progress.emit({"msg": "====== Solving =======",
+            computationTime = refinementTime + solverTime
+            if store is not None:
+                store.endRun(runId, computationTime)
+                store.commit()
+            self.progress.emit({"msg": "Found {} potential connections".format(noPotentialConnections),
                                 "type": base.MessageType.INFO})
-            self.progress.emit({"msg": "Performing the {} solver method".format(self._solverMethod.value[0]),
-                                "type": base.MessageType.INFO})
-            time2: float = time.perf_counter()
-        
-            topologicalConstraints: typing.Set[typing.Tuple] = self._solver.solve(self._solverMethod, self._configParamSolver, potConnections=potentialConnections)
-
-            time3: float = time.perf_counter()
-            computationTime += time3-time2
             self.progress.emit({"msg": "FOUND {} TOPOLOGICAL CONSTRAINT(S)".format(len(topologicalConstraints)),
                                 "type": base.MessageType.FOCUS})
-            self.progress.emit({"msg": "> Done: {:.3f}s".format(time3-time2),
+            self.progress.emit({"msg": "> Done: {:.3f}s (refining: {:.3f}s, solving: {:.3f}s)".format(computationTime, refinementTime, solverTime),
                                 "type": base.MessageType.INFO})
 
-            if not self._isRunning:
-                self.__abort()
-                return
-
             self.progress.emit({"msg": ">>> FINISHED",
                                 "type": base.MessageType.INFO})
 
@@ -536,6 +619,10 @@ class Worker(base.BaseWorker):
                                 "type": base.MessageType.ERROR})
             self.__abort()
 
+        finally:
+            if store is not None:
+                store.close()
+
     def stop(self) -> None:
         self._isRunning = False
         self._solver.stop()
@@ -32,7 +32,7 @@ import aplansolvers.aplan_obstruction_detectors.base_obstruction_detector as bas
 import aplansolvers.aplan_obstruction_detectors.base_view_obstruction_detector as baseView
 import aplansolvers.aplan_obstruction_detectors.occt as occt
 import ObjectsAplan
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 try:
     import itertools
     import json
@@ -305,7 +305,8 @@ class _TaskPanel(baseView.ITaskPanel):
                                         "configParamSolverGeneral": configParamSolverGeneral,
                                         "motionDirections": self._motionDirections,
                                         "multiprocessingEnabled": self._multiprocessingEnabled,
-                                        "linearDeflection": self._linearDeflection}
+                                        "linearDeflection": self._linearDeflection,
+                                        "workingDir": str(self._analysis.WorkingDir)}
             self._solverThread = QtCore.QThread()
             self._worker: Worker = Worker(self.obj.Type, inputParams)
             self._worker.moveToThread(self._solverThread)
@@ -450,6 +451,7 @@ class Worker(baseView.BaseWorker):
         self._motionDirections: typing.Set[base.CartesianMotionDirection] = self._inputParams["motionDirections"]
         self._multiprocessingEnabled: bool = self._inputParams["multiprocessingEnabled"]
         self._linearDeflection: float = self._inputParams["linearDeflection"]
+        self._workingDir: typing.Optional[str] = self._inputParams.get("workingDir")
 
     def run(self) -> None:
         self.progress.emit({"msg": ">>> STARTED",
@@ -457,8 +459,21 @@ class Worker(baseView.BaseWorker):
         self._isRunning = True
         computationTime: float = 0.0
         solverTime: float = 0.0
+        store: typing.Optional[result_store.ResultStore] = None
 
         try:
+            runId: int = 0
+            if self._workingDir:
+                store = result_store.ResultStore.forWorkingDir(self._workingDir)
+                runId = store.beginRun(self._detectorType,
+                                       {"refinementMethod": self._refinementMethod.name,
+                                        "configParamRefinement": self._configParamRefinement,
+                                        "solverMethod": self._solverMethod.name,
+                                        "configParamSolver": self._configParamSolver,
+                                        "configParamSolverGeneral": self._configParamSolverGeneral,
+                                        "motionDirections": sorted(m.name for m in self._motionDirections),
+                                        "multiprocessingEnabled": self._multiprocessingEnabled,
+                                        "linearDeflection": self._linearDeflection})
             geometricalConstraints: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]] = {}
             if self._multiprocessingEnabled:
                 self.progress.emit({"msg": "====== Multiprocessing ======",
@@ -477,11 +492,13 @@ class Worker(baseView.BaseWorker):
                     self.progress.emit({"msg": "\t{}: FOUND {} GEOMETRICAL CONSTRAINT(S)".format(motionDir.name.upper(), len(geomConstraints[0])),
                                         "type": baseView.MessageType.FOCUS})
                     
-                    fileReadable: bool
-                    missingConstraints: typing.Set[str, str] = {}
-                    excessConstraints: typing.Set[str, str] = {}
-                    groundTruthPath: str = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[:-1] + ["GroundTruth", "GeomConstraints_" + motionDir.name.upper() + ".json"])
-                    fileReadable, missingConstraints, excessConstraints = self.__checkConstraintsCorrectness(groundTruthPath, geomConstraints[0], motionDir)
+                    fileReadable: bool = False
+                    missingConstraints: typing.Set[typing.Tuple[str, str]] = set()
+                    excessConstraints: typing.Set[typing.Tuple[str, str]] = set()
+                    if store is not None:
+                        store.upsertPairResults(runId, motionDir.name, ((source, target, True, None) for source, target in geomConstraints[0]))
+                        groundTruthPath: str = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[:-1] + ["GroundTruth", "GeomConstraints_" + motionDir.name.upper() + ".json"])
+                        fileReadable, missingConstraints, excessConstraints = self.__checkConstraintsCorrectness(store, runId, groundTruthPath, motionDir)
                     if fileReadable:
                         noMissingConstraints: int = len(missingConstraints)
                         noExcessConstraints: int = len(excessConstraints)
@@ -565,11 +582,13 @@ class Worker(baseView.BaseWorker):
                     self.progress.emit({"msg": "\t{}: FOUND {} GEOMETRICAL CONSTRAINT(S)".format(motionDir_.name.upper(), len(geomConstraints_)),
                                         "type": baseView.MessageType.FOCUS})
 
-                    fileReadable: bool
-                    missingConstraints: typing.Set[str, str] = {}
-                    excessConstraints: typing.Set[str, str] = {}
-                    groundTruthPath: str = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[:-1] + ["GroundTruth", "GeomConstraints_" + motionDir_.name.upper() + ".json"])
-                    fileReadable, missingConstraints, excessConstraints = self.__checkConstraintsCorrectness(groundTruthPath, geomConstraints_, motionDir_)
+                    fileReadable: bool = False
+                    missingConstraints: typing.Set[typing.Tuple[str, str]] = set()
+                    excessConstraints: typing.Set[typing.Tuple[str, str]] = set()
+                    if store is not None:
+                        store.upsertPairResults(runId, motionDir_.name, ((source, target, True, None) for source, target in geomConstraints_))
+                        groundTruthPath: str = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[:-1] + ["GroundTruth", "GeomConstraints_" + motionDir_.name.upper() + ".json"])
+                        fileReadable, missingConstraints, excessConstraints = self.__checkConstraintsCorrectness(store, runId, groundTruthPath, motionDir_)
                     if fileReadable:
                         noMissingConstraints: int = len(missingConstraints)
                         noExcessConstraints: int = len(excessConstraints)
@@ -590,6 +609,10 @@ class Worker(baseView.BaseWorker):
             self.progress.emit({"msg": ">>> FINISHED",
                                 "type": baseView.MessageType.INFO})
 
+            if store is not None:
+                store.endRun(runId, computationTime)
+                store.commit()
+
             self._isRunning = False
             self.finished.emit({"time": computationTime,
                                 "constraints": geometricalConstraints})
@@ -598,6 +621,10 @@ class Worker(baseView.BaseWorker):
             self.progress.emit({"msg": ">>> ERROR\n{}\nERROR <<<".format(e),
                                 "type": baseView.MessageType.ERROR})
             self.__abort()
+
+        finally:
+            if store is not None:
+                store.close()
   
     def multiprocess(self) -> typing.Dict[base.CartesianMotionDirection, typing.Tuple[typing.Set[typing.Tuple[str, str]], float]]:
         geometricalConstraints: typing.Dict[base.CartesianMotionDirection, typing.Tuple[typing.Set[typing.Tuple[str, str]], float]] = {}
@@ -679,24 +706,19 @@ class Worker(baseView.BaseWorker):
                     noChecksRefinement += math.floor(intervalLength/stepSize) * len(pair[1])
         return noChecksRefinement
     
-    def __checkConstraintsCorrectness(self, groundTruthPath: str, geometricalConstraints: typing.Set[typing.Tuple[str, str]], motionDirection: base.CartesianMotionDirection) -> typing.Tuple[bool, typing.Set, typing.Set]:
+    def __checkConstraintsCorrectness(self, store: result_store.ResultStore, runId: int, groundTruthPath: str, motionDirection: base.CartesianMotionDirection) -> typing.Tuple[bool, typing.Set, typing.Set]:
         fileReadable: bool = False
-        missingConstraints: typing.Set[str, str] = {}
-        excessConstraints: typing.Set[str, str] = {}
+        missingConstraints: typing.Set[typing.Tuple[str, str]] = set()
+        excessConstraints: typing.Set[typing.Tuple[str, str]] = set()
 
         if os.path.isfile(groundTruthPath) and os.access(groundTruthPath, os.R_OK):
             fileReadable = True
             with open(groundTruthPath) as jsonFile:
                 groundTruth = json.load(jsonFile)
-                groundTruthConstraints: typing.Set[typing.Tuple[str, str]] = {(link["source"], link["target"]) for link in groundTruth["links"]}
-                missingConstraints = groundTruthConstraints.difference(geometricalConstraints)
-                excessConstraints = geometricalConstraints.difference(groundTruthConstraints)
-
-                outputPath: str = '/'.join(FreeCAD.ActiveDocument.FileName.split('/')[:-1] + ["GroundTruth", "CorrectnessCheck_" + motionDirection.name.upper() + ".json"])
-                with open(outputPath, 'w') as f:
-                    output: typing.Dict[str, typing.Set[typing.Tuple[str, str]]] = {"missing": list(missingConstraints), "excess": list(excessConstraints)}
-                    json.dump(output, f)
-
-                return True, missingConstraints, excessConstraints
+            # The ground truth is kept in the result store next to the detected constraints, so the comparison is a query 
+            # and its outcome stays available there (instead of in a separate CorrectnessCheck_*.json file)
+            groundTruthLabel: str = "GroundTruth_" + motionDirection.name.upper()
+            store.replaceConstraints(groundTruthLabel, motionDirection.name, {(link["source"], link["target"]) for link in groundTruth["links"]})
+            missingConstraints, excessConstraints = store.diffPairResults(runId, groundTruthLabel, motionDirection.name)
         
-        return fileReadable, missingConstraints, excessConstraints
\ No newline at end of file
+        return fileReadable, missingConstraints, excessConstraints
@@ -0,0 +1,258 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__title__ = "Headless batch detection of topological and geometrical constraints"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+# Usage:
+#   FREECAD_LIBDIR=<FreeCAD lib dir> python -m aplansolvers.batch --file_path <doc.FCStd> --analysis <name> --config <config.json>
+#
+# Example of a configuration file; leaving out a detector's section skips that detector:
+#   {
+#       "connection_detector": {"refinement_method": "BoundBox",
+#                               "config_param_refinement": {"swellDistance": 0.01},
+#                               "solver_method": "DistToShape",
+#                               "config_param_solver": {"minDistance": 1e-05}},
+#       "obstruction_detector": {"motion_directions": ["POS_X", "NEG_X", "POS_Y", "NEG_Y", "POS_Z", "NEG_Z"],
+#                                "linear_deflection": 0.1,
+#                                "refinement_method": "BoundBox",
+#                                "config_param_refinement": {},
+#                                "solver_method": "DistToShape",
+#                                "config_param_solver": {"overlapTolerance": 1e-05, "minDistance": 1e-05, "classificationTolerance": 1e-05},
+#                                "config_param_solver_general": {"variableStepSizeEnabled": true, "stepSizeCoefficient": 0.1,
+#                                                                "minStepSize": 1.0, "fixedStepSize": 1.0}}
+#   }
+
+try:
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+    import json
+    import os
+    import sys
+    import time
+    import typing
+except ImportError as ie:
+    print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
+
+try:
+    import FreeCAD
+except ModuleNotFoundError as me:
+    FREECAD_LIBDIR: typing.Optional[str]
+    if FREECAD_LIBDIR := os.getenv("FREECAD_LIBDIR"):
+        sys.path.append(FREECAD_LIBDIR)
+        import FreeCAD
+    else:
+        print("Missing environment variable!",
+              "Please add FREECAD_LIBDIR (i.e. the path of your FreeCAD's library directory) to your machine's environment variables.")
+import Aplan
+from aplanobjects import graphs
+import aplansolvers.aplan_connection_detectors.swell_occt as swellOCCT
+import aplansolvers.aplan_obstruction_detectors.base_obstruction_detector as base
+import aplansolvers.aplan_obstruction_detectors.occt as occt
+from aplantools import result_store
+
+
+CONNECTION_DETECTOR:  typing.Final[str] = "connection_detector"
+OBSTRUCTION_DETECTOR: typing.Final[str] = "obstruction_detector"
+
+
+def loadConfig(configPath: str) -> typing.Dict:
+    with open(configPath, 'r') as file:
+        return json.load(file)
+
+
+def openAnalysis(filePath: str, analysisName: str) -> typing.Tuple[typing.Any, typing.Any]:
+    """Opens the document hidden, makes it the active one and returns it together with the requested analysis.
+    The analysis is looked up by its name first and by its label second.
+    """
+    doc = FreeCAD.openDocument(filePath, hidden=True)
+    FreeCAD.setActiveDocument(doc.Name)
+    return doc, findAnalysis(doc, analysisName)
+
+
+def findAnalysis(doc, analysisName: str) -> typing.Any:
+    """Returns the analysis of an open document by its name, or by its label if no object has that name."""
+    analysis = doc.getObject(analysisName) or next(iter(doc.getObjectsByLabel(analysisName)), None)
+    if analysis is None or not analysis.isDerivedFrom("Aplan::AplanAnalysis"):
+        raise ValueError("Could not find the APLAN analysis '{}' in '{}'".format(analysisName, doc.FileName))
+    return analysis
+
+
+def detectConnections(analysis, detectorConfig: typing.Dict) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], float]:
+    refinementMethod: swellOCCT.RefinementMethod = swellOCCT.RefinementMethod[detectorConfig.get("refinement_method", swellOCCT.RefinementMethod.None_.name)]
+    solverMethod: swellOCCT.SolverMethod = swellOCCT.SolverMethod[detectorConfig["solver_method"]]
+    configParamRefinement: typing.Dict = detectorConfig.get("config_param_refinement", {})
+    configParamSolver: typing.Dict = detectorConfig.get("config_param_solver", {})
+
+    solver: swellOCCT.SwellOCCTSolver = swellOCCT.SwellOCCTSolver(analysis.Components)
+    time0: float = time.perf_counter()
+    topologicalConstraints: typing.Set[typing.Tuple[str, str]] = set()
+    chunk: typing.List[typing.Tuple[str, str]]
+    for chunk in solver.refine(refinementMethod, configParamRefinement):
+        topologicalConstraints.update(solver.solve(solverMethod, configParamSolver, potConnections=chunk))
+    time1: float = time.perf_counter()
+    return topologicalConstraints, time1-time0
+
+
+def detectObstructions(analysis, motionDirection: base.CartesianMotionDirection, detectorConfig: typing.Dict) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], float]:
+    refinementMethod: occt.RefinementMethod = occt.RefinementMethod[detectorConfig.get("refinement_method", occt.RefinementMethod.None_.name)]
+    solverMethod: occt.SolverMethod = occt.SolverMethod[detectorConfig["solver_method"]]
+    configParamRefinement: typing.Dict = detectorConfig.get("config_param_refinement", {})
+    configParamSolver: typing.Dict = detectorConfig.get("config_param_solver", {})
+    configParamSolverGeneral: typing.Dict = detectorConfig.get("config_param_solver_general", {})
+    linearDeflection: float = float(detectorConfig.get("linear_deflection", occt.DEF_LIN_DEFLECT))
+
+    solver: occt.OCCTSolver = occt.OCCTSolver(analysis.Components, [motionDirection], linearDeflection)
+    time0: float = time.perf_counter()
+    intervalObstructionsDict: typing.Dict = solver.refine(refinementMethod, configParamRefinement)
+    geometricalConstraints: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]] = solver.solve(solverMethod,
+                                                                                                                          configParamSolver,
+                                                                                                                          configParamSolverGeneral,
+                                                                                                                          intervalObstructionsDict=intervalObstructionsDict)
+    time1: float = time.perf_counter()
+    return geometricalConstraints[motionDirection], time1-time0
+
+
+def runTask(filePath: str, analysisName: str, detector: str, motionDirectionValue: int, detectorConfig: typing.Dict) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], float]:
+    doc, analysis = openAnalysis(filePath, analysisName)
+    try:
+        if detector == CONNECTION_DETECTOR:
+            return detectConnections(analysis, detectorConfig)
+        return detectObstructions(analysis, base.CartesianMotionDirection(motionDirectionValue), detectorConfig)
+    finally:
+        FreeCAD.closeDocument(doc.Name)
+
+
+def mirrorGeomConstraints(motionDirections: typing.Iterable[base.CartesianMotionDirection],
+                          results: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]]) -> typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]]:
+    """Derives the constraints of the negative motion directions by flipping those of the corresponding positive ones."""
+    geomConstraints: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]] = {}
+    for motionDirection in motionDirections:
+        if motionDirection in results.keys():
+            geomConstraints[motionDirection] = results[motionDirection]
+        else:
+            oppositeMotionDirection: base.CartesianMotionDirection = base.CartesianMotionDirection(abs(motionDirection.value))
+            geomConstraints[motionDirection] = {constraint[::-1] for constraint in results.get(oppositeMotionDirection, set())}
+    return geomConstraints
+
+
+def runParameters(detector: str, motionDirectionValue: int, detectorConfig: typing.Dict) -> typing.Tuple[str, typing.Dict]:
+    """Returns the (detector, parameters) a detection task is recorded with in the result store."""
+    if detector == CONNECTION_DETECTOR:
+        return detector, dict(detectorConfig)
+    return detector, {**detectorConfig, "motion_directions": [base.CartesianMotionDirection(motionDirectionValue).name]}
+
+
+def writeResults(workingDir: str,
+                 componentLabels: typing.Iterable[str],
+                 topoConstraints: typing.Optional[typing.Set[typing.Tuple[str, str]]],
+                 geomConstraints: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]],
+                 runs: typing.Iterable[typing.Tuple[str, typing.Dict, float]] = ()) -> typing.List[str]:
+    """Writes the constraint graphs to the files a TopoConstraints/GeomConstraints object with a default label would use,
+    and records them together with the (detector, parameters, computation time) of the runs in the working directory's result store.
+    The document itself is left untouched.
+    """
+    fileLocations: typing.List[str] = []
+    store: result_store.ResultStore = result_store.ResultStore.forWorkingDir(workingDir)
+    if topoConstraints is not None:
+        conGraph: graphs.ConnectionGraph = graphs.ConnectionGraph()
+        conGraph.add_nodes_from(componentLabels)
+        conGraph.add_edges_from(topoConstraints)
+        fileLocations.append("{}/{}.json".format(workingDir, "TopoConstraints"))
+        conGraph.exportToFile(fileLocations[-1])
+        store.replaceConstraints("TopoConstraints", result_store.NO_DIRECTION, conGraph.edges)
+
+    motionDirection: base.CartesianMotionDirection
+    for motionDirection, constraints in geomConstraints.items():
+        obstrGraph: graphs.ObstructionGraph = graphs.ObstructionGraph()
+        obstrGraph.add_nodes_from(componentLabels)
+        obstrGraph.add_edges_from(constraints)
+        fileLocations.append("{}/GeomConstraints_{}.json".format(workingDir, motionDirection.name))
+        obstrGraph.exportToFile(fileLocations[-1])
+        store.replaceConstraints("GeomConstraints_{}".format(motionDirection.name), motionDirection.name, obstrGraph.edges)
+
+    detector: str
+    parameters: typing.Dict
+    computationTime: float
+    for detector, parameters, computationTime in runs:
+        store.endRun(store.beginRun(detector, parameters), computationTime)
+    store.commit()
+    store.close()
+    fileLocations.append(store.dbPath)
+    return fileLocations
+
+
+def main(arguments: argparse.Namespace) -> None:
+    filePath: str = os.path.abspath(arguments.file_path)
+    analysisName: str = arguments.analysis
+    config: typing.Dict = loadConfig(arguments.config)
+
+    doc, analysis = openAnalysis(filePath, analysisName)
+    workingDir: str = arguments.output_dir or str(analysis.WorkingDir)
+    componentLabels: typing.List[str] = [component.Label for component in analysis.Components]
+    FreeCAD.closeDocument(doc.Name)
+
+    # One task for the connection detector and one per non-redundant motion direction for the obstruction detector
+    tasks: typing.List[typing.Tuple[str, int, typing.Dict]] = []
+    if CONNECTION_DETECTOR in config:
+        tasks.append((CONNECTION_DETECTOR, base.UndefMotionDirection.UNDEF.value, config[CONNECTION_DETECTOR]))
+    motionDirections: typing.Set[base.CartesianMotionDirection] = set()
+    if OBSTRUCTION_DETECTOR in config:
+        motionDirections = {base.CartesianMotionDirection[motionDir.upper()]
+                            for motionDir in config[OBSTRUCTION_DETECTOR].get("motion_directions", [m.name for m in base.CartesianMotionDirection])}
+        for motionDirection in {base.CartesianMotionDirection(abs(motionDir_.value)) for motionDir_ in motionDirections}:
+            tasks.append((OBSTRUCTION_DETECTOR, motionDirection.value, config[OBSTRUCTION_DETECTOR]))
+
+    topoConstraints: typing.Optional[typing.Set[typing.Tuple[str, str]]] = None
+    results: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]] = {}
+    runs: typing.List[typing.Tuple[str, typing.Dict, float]] = []
+    with ProcessPoolExecutor(max_workers=arguments.max_workers or len(tasks) or None) as executor:
+        futures = [(task, executor.submit(runTask, filePath, analysisName, *task)) for task in tasks]
+        for (detector, motionDirectionValue, detectorConfig), future in futures:
+            constraints, computationTime = future.result()
+            runs.append(runParameters(detector, motionDirectionValue, detectorConfig) + (computationTime,))
+            if detector == CONNECTION_DETECTOR:
+                topoConstraints = constraints
+                print("{}: found {} topological constraint(s) in {:.3f}s".format(detector, len(constraints), computationTime))
+            else:
+                results[base.CartesianMotionDirection(motionDirectionValue)] = constraints
+                print("{} ({}): found {} geometrical constraint(s) in {:.3f}s".format(detector, base.CartesianMotionDirection(motionDirectionValue).name,
+                                                                                   len(constraints), computationTime))
+
+    fileLocation: str
+    for fileLocation in writeResults(workingDir, componentLabels, topoConstraints, mirrorGeomConstraints(motionDirections, results), runs):
+        print("Written {}".format(fileLocation))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detects the topological and geometrical constraints of an APLAN analysis without GUI.")
+    parser.add_argument("--file_path",   type=str, required=True, help="FreeCAD document (.FCStd) containing the analysis")
+    parser.add_argument("--analysis",    type=str, required=True, help="name or label of the APLAN analysis")
+    parser.add_argument("--config",      type=str, required=True, help="JSON file configuring the detectors")
+    parser.add_argument("--output_dir",  type=str, nargs='?', default=None, help="defaults to the analysis' working directory")
+    parser.add_argument("--max_workers", type=int, nargs='?', default=None, help="defaults to one process per detection task")
+    args: argparse.Namespace
+    args, _ = parser.parse_known_args()
+    main(args)
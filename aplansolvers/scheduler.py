@@ -0,0 +1,263 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__title__ = "Scheduler running the constraint detection of many assemblies on one pool of FreeCAD processes"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+# Usage:
+#   FREECAD_LIBDIR=<FreeCAD lib dir> python -m aplansolvers.scheduler --queue <queue.json> [--max_workers <n>]
+#
+# The queue file lists the assemblies to process; "config" is either a path to a batch configuration file
+# (see aplansolvers/batch.py) or the configuration itself:
+#   [
+#       {"file_path": "/data/gearbox.FCStd", "analysis": "Analysis", "config": "/data/detection.json"},
+#       {"file_path": "/data/pump.FCStd",    "analysis": "Analysis", "config": {...}, "output_dir": "/results/pump"}
+#   ]
+
+try:
+    import argparse
+    from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+    import json
+    import multiprocessing
+    import os
+    import sys
+    import typing
+except ImportError as ie:
+    print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
+
+try:
+    import FreeCAD
+except ModuleNotFoundError as me:
+    FREECAD_LIBDIR: typing.Optional[str]
+    if FREECAD_LIBDIR := os.getenv("FREECAD_LIBDIR"):
+        sys.path.append(FREECAD_LIBDIR)
+        import FreeCAD
+    else:
+        print("Missing environment variable!",
+              "Please add FREECAD_LIBDIR (i.e. the path of your FreeCAD's library directory) to your machine's environment variables.")
+import aplansolvers.aplan_obstruction_detectors.base_obstruction_detector as base
+import aplansolvers.batch as batch
+
+
+# **** START: Worker process state ****
+
+# Documents opened by this worker process by their file path, kept resident while tasks of theirs are in flight
+_openDocuments: typing.Dict[str, typing.Any] = {}
+# Analyses of the open documents by their file path and name; a document may hold several analyses
+_openAnalyses: typing.Dict[typing.Tuple[str, str], typing.Any] = {}
+# Proxy of the scheduler's list of the files with tasks in flight; read when a task runs, not when it was submitted
+_residentFiles: typing.Optional[typing.Sequence[str]] = None
+
+
+def _initWorker(residentFiles: typing.Sequence[str]) -> None:
+    global _residentFiles
+    _residentFiles = residentFiles
+
+
+def _getAnalysis(filePath: str, analysisName: str) -> typing.Any:
+    residentFiles: typing.Set[str] = set(_residentFiles) if _residentFiles is not None else set()
+    for filePath_ in set(_openDocuments.keys()).difference(residentFiles).difference({filePath}):
+        FreeCAD.closeDocument(_openDocuments.pop(filePath_).Name)
+        for key in [key for key in _openAnalyses.keys() if key[0] == filePath_]:
+            del _openAnalyses[key]
+
+    if filePath not in _openDocuments:
+        _openDocuments[filePath], _openAnalyses[(filePath, analysisName)] = batch.openAnalysis(filePath, analysisName)
+    elif (filePath, analysisName) not in _openAnalyses:
+        _openAnalyses[(filePath, analysisName)] = batch.findAnalysis(_openDocuments[filePath], analysisName)
+    FreeCAD.setActiveDocument(_openDocuments[filePath].Name)
+    return _openAnalyses[(filePath, analysisName)]
+
+
+def _estimateTask(filePath: str, analysisName: str) -> typing.Tuple[str, typing.List[str], int]:
+    analysis = _getAnalysis(filePath, analysisName)
+    components: typing.List = analysis.Components
+    return str(analysis.WorkingDir), [component.Label for component in components], sum(len(component.Shape.Faces) for component in components)
+
+
+def _detectionTask(filePath: str, analysisName: str,
+                   detector: str, motionDirectionValue: int, detectorConfig: typing.Dict) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], float]:
+    analysis = _getAnalysis(filePath, analysisName)
+    if detector == batch.CONNECTION_DETECTOR:
+        return batch.detectConnections(analysis, detectorConfig)
+    return batch.detectObstructions(analysis, base.CartesianMotionDirection(motionDirectionValue), detectorConfig)
+
+# **** END: Worker process state ****
+
+
+class Job:
+    def __init__(self, filePath: str, analysisName: str, config: typing.Dict, outputDir: typing.Optional[str] = None) -> None:
+        self.filePath: str = os.path.abspath(filePath)
+        self.analysisName: str = analysisName
+        self.config: typing.Dict = config
+        self.outputDir: typing.Optional[str] = outputDir
+        # Filled in by the estimation pass
+        self.workingDir: str = ""
+        self.componentLabels: typing.List[str] = []
+        self.cost: int = 0
+        # Filled in by the detection tasks
+        self.topoConstraints: typing.Optional[typing.Set[typing.Tuple[str, str]]] = None
+        self.geomConstraints: typing.Dict[base.CartesianMotionDirection, typing.Set[typing.Tuple[str, str]]] = {}
+        self.runs: typing.List[typing.Tuple[str, typing.Dict, float]] = []
+        self.errors: typing.List[str] = []
+
+    @property
+    def motionDirections(self) -> typing.Set[base.CartesianMotionDirection]:
+        if batch.OBSTRUCTION_DETECTOR not in self.config:
+            return set()
+        return {base.CartesianMotionDirection[motionDir.upper()]
+                for motionDir in self.config[batch.OBSTRUCTION_DETECTOR].get("motion_directions", [m.name for m in base.CartesianMotionDirection])}
+
+    def tasks(self) -> typing.List[typing.Tuple[str, int, typing.Dict]]:
+        tasks: typing.List[typing.Tuple[str, int, typing.Dict]] = []
+        if batch.CONNECTION_DETECTOR in self.config:
+            tasks.append((batch.CONNECTION_DETECTOR, base.UndefMotionDirection.UNDEF.value, self.config[batch.CONNECTION_DETECTOR]))
+        for motionDirection in sorted({base.CartesianMotionDirection(abs(motionDir_.value)) for motionDir_ in self.motionDirections}):
+            tasks.append((batch.OBSTRUCTION_DETECTOR, motionDirection.value, self.config[batch.OBSTRUCTION_DETECTOR]))
+        return tasks
+
+
+class BatchScheduler:
+    """Processes a queue of assemblies with a single pool of FreeCAD worker processes.
+
+    Documents are scheduled longest job first, estimated by their number of components times their total number of faces.
+    At most `maxResidentDocuments` documents have tasks in flight at once; the workers keep those documents open
+    and close the others, so every document is opened about once per worker instead of once per task.
+    """
+
+    def __init__(self, maxWorkers: typing.Optional[int] = None, maxResidentDocuments: typing.Optional[int] = None) -> None:
+        self._maxWorkers: int = maxWorkers or os.cpu_count() or 1
+        self._maxResidentDocuments: int = maxResidentDocuments or self._maxWorkers
+        self._jobs: typing.List[Job] = []
+
+    @property
+    def jobs(self) -> typing.List[Job]:
+        return self._jobs
+
+    def addJob(self, filePath: str, analysisName: str, config: typing.Dict, outputDir: typing.Optional[str] = None) -> Job:
+        job: Job = Job(filePath, analysisName, config, outputDir)
+        self._jobs.append(job)
+        return job
+
+    def run(self) -> typing.List[Job]:
+        with multiprocessing.Manager() as manager:
+            residentFiles: typing.MutableSequence[str] = manager.list()
+            with ProcessPoolExecutor(max_workers=self._maxWorkers, initializer=_initWorker, initargs=(residentFiles,)) as executor:
+                self.__estimate(executor)
+                self.__detect(executor, residentFiles)
+        return self._jobs
+
+    def __estimate(self, executor: ProcessPoolExecutor) -> None:
+        futures: typing.Dict[Future, Job] = {executor.submit(_estimateTask, job.filePath, job.analysisName): job for job in self._jobs}
+        for future, job in futures.items():
+            try:
+                job.workingDir, job.componentLabels, noFaces = future.result()
+                job.cost = len(job.componentLabels) * noFaces
+            except Exception as e:
+                job.errors.append("Estimation failed: {}".format(repr(e)))
+
+    def __detect(self, executor: ProcessPoolExecutor, residentFiles: typing.MutableSequence[str]) -> None:
+        pendingJobs: typing.List[Job] = sorted([job for job in self._jobs if not job.errors], key=lambda job: job.cost, reverse=True)
+        residentJobs: typing.Dict[int, Job] = {}
+        remainingTasks: typing.Dict[int, int] = {}
+        futures: typing.Dict[Future, typing.Tuple[Job, str, int, typing.Dict]] = {}
+
+        while pendingJobs or futures:
+            while pendingJobs and len(residentJobs) < self._maxResidentDocuments:
+                job: Job = pendingJobs.pop(0)
+                tasks: typing.List[typing.Tuple[str, int, typing.Dict]] = job.tasks()
+                if not tasks:
+                    self.__finish(job)
+                    continue
+                residentJobs[id(job)] = job
+                remainingTasks[id(job)] = len(tasks)
+                residentFiles[:] = sorted({job_.filePath for job_ in residentJobs.values()})
+                for detector, motionDirectionValue, detectorConfig in tasks:
+                    futures[executor.submit(_detectionTask, job.filePath, job.analysisName,
+                                            detector, motionDirectionValue, detectorConfig)] = (job, detector, motionDirectionValue, detectorConfig)
+
+            done: typing.Set[Future]
+            done, _ = wait(futures.keys(), return_when=FIRST_COMPLETED)
+            for future in done:
+                job_, detector_, motionDirectionValue_, detectorConfig_ = futures.pop(future)
+                try:
+                    constraints, computationTime = future.result()
+                    job_.runs.append(batch.runParameters(detector_, motionDirectionValue_, detectorConfig_) + (computationTime,))
+                    if detector_ == batch.CONNECTION_DETECTOR:
+                        job_.topoConstraints = constraints
+                    else:
+                        job_.geomConstraints[base.CartesianMotionDirection(motionDirectionValue_)] = constraints
+                except Exception as e:
+                    job_.errors.append("{} failed: {}".format(detector_, repr(e)))
+
+                remainingTasks[id(job_)] -= 1
+                if remainingTasks[id(job_)] == 0:
+                    residentJobs.pop(id(job_))
+                    remainingTasks.pop(id(job_))
+                    residentFiles[:] = sorted({job__.filePath for job__ in residentJobs.values()})
+                    self.__finish(job_)
+
+    def __finish(self, job: Job) -> None:
+        if job.errors:
+            return
+        try:
+            batch.writeResults(job.outputDir or job.workingDir,
+                               job.componentLabels,
+                               job.topoConstraints,
+                               batch.mirrorGeomConstraints(job.motionDirections, job.geomConstraints),
+                               job.runs)
+        except Exception as e:
+            job.errors.append("Writing the results failed: {}".format(repr(e)))
+
+
+def main(arguments: argparse.Namespace) -> None:
+    with open(arguments.queue, 'r') as file:
+        queue: typing.List[typing.Dict] = json.load(file)
+
+    scheduler: BatchScheduler = BatchScheduler(arguments.max_workers, arguments.max_resident_documents)
+    entry: typing.Dict
+    for entry in queue:
+        config: typing.Union[str, typing.Dict] = entry["config"]
+        scheduler.addJob(entry["file_path"],
+                         entry["analysis"],
+                         batch.loadConfig(config) if isinstance(config, str) else config,
+                         entry.get("output_dir"))
+
+    job: Job
+    for job in scheduler.run():
+        if job.errors:
+            print("{}: FAILED\n\t{}".format(job.filePath, "\n\t".join(job.errors)))
+        else:
+            print("{}: done (estimated cost: {})".format(job.filePath, job.cost))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detects the constraints of a queue of APLAN analyses on a shared pool of worker processes.")
+    parser.add_argument("--queue",                  type=str, required=True, help="JSON file listing the documents to process")
+    parser.add_argument("--max_workers",            type=int, nargs='?', default=None, help="defaults to the number of CPUs")
+    parser.add_argument("--max_resident_documents", type=int, nargs='?', default=None, help="defaults to the number of workers")
+    args: argparse.Namespace
+    args, _ = parser.parse_known_args()
+    main(args)
@@ -32,7 +32,7 @@ __url__ = "https://www.freecadweb.org"
 
 import FreeCAD
 import FreeCADGui
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 from aplanwebapp import api, browser
 try:
     import json
@@ -72,11 +72,12 @@ class _TaskPanel:
         self._excludedParts: typing.Dict = {excludedPart.Label: excludedPart for partFilter in self._analysis.PartFilterObjects 
                                             for excludedPart in partFilter.ExcludedParts}
 
-        self._prevObstructions: typing.Set[typing.Tuple] = set()
+        self._obstructions: typing.Set[typing.Tuple] = set()
 
-        webServerThread: QtCore.QTimer = QtCore.QTimer(self.form)
-        webServerThread.timeout.connect(self.__callWebServer)
-        webServerThread.start(100)
+        # Changes of the obstruction graph are pushed by the web server
+        self._graphEvents: browser.EventBridge = browser.EventBridge(api.subscribeObstructionGraph, self.form)
+        self._graphEvents.received.connect(self.__onGraphEvent)
+        self._graphEvents.start()
 
         index: int
         motionDirection: str
@@ -106,15 +107,21 @@ class _TaskPanel:
         self.__exit()
         return True
     
-    def __callWebServer(self) -> None:
-        # Check if the set of obstructions has been changed
-        obstructions: typing.Set[typing.Tuple] = api.getObstructionGraphEdges()
-        if obstructions and self._prevObstructions != obstructions:
+    def __onGraphEvent(self, eventType: str, data: typing.Any) -> None:
+        obstructions: typing.Set[typing.Tuple] = set(self._obstructions)
+        if eventType == "reset":
+            obstructions = api.getObstructionGraphEdges()
+        elif eventType == "edges_added":
+            obstructions.update(tuple(edge) for edge in data)
+        elif eventType == "edges_removed":
+            obstructions.difference_update(tuple(edge) for edge in data)
+        if self._obstructions != obstructions:
             self.__resetConstraintsTable(obstructions)
             self.form.l_constraints.setText(str(len(obstructions)))
-            self._prevObstructions = obstructions
+            self._obstructions = obstructions
 
     def __exit(self) -> None:
+        self._graphEvents.stop()
         browser.hide()
         api.clearCacheObstructionGraph()
 
@@ -130,8 +137,15 @@ class _TaskPanel:
         self.form.tw_constraints_list.sortItems(0, order=QtCore.Qt.SortOrder.AscendingOrder)
 
     def __saveObstructionGraph(self, fileLocation: str) -> None:
+        obstructionGraph: typing.Dict = api.getObstructionGraph()
         with open(fileLocation, 'w') as file:
-            json.dump(api.getObstructionGraph(), file)
+            json.dump(obstructionGraph, file)
+        # Only the edited edges are rewritten in the result store
+        with result_store.ResultStore.forWorkingDir(self._analysis.WorkingDir) as store:
+            if self._motionDirection != self._obj.MotionDirection:
+                store.replaceConstraints(self._obj.Label, str(self._obj.MotionDirection).split('.')[-1], set())
+            store.replaceConstraints(self._obj.Label, self._motionDirection.split('.')[-1],
+                                     {(link["source"], link["target"]) for link in obstructionGraph.get("links", [])})
 
     def __switchMotionDirection(self, motionDirection: str) -> None:
         self._motionDirection = motionDirection
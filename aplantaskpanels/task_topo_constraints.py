@@ -30,7 +30,7 @@ __url__ = "https://www.freecadweb.org"
 #  \ingroup APLAN
 #  \brief task panel for APLAN TopoConstraints object
 
-from aplantools import aplanutils
+from aplantools import aplanutils, result_store
 try:
     from aplanwebapp import api, browser
     import FreeCAD
@@ -76,11 +76,12 @@ class _TaskPanel:
                                             for excludedPart in partFilter.ExcludedParts}
 
         self._prevSelectedConnections: typing.Dict = {}
-        self._prevConnections: typing.Set[typing.Tuple] = set()
+        self._connections: typing.Set[typing.Tuple] = set()
 
-        webServerThread: QtCore.QTimer = QtCore.QTimer(self.form)
-        webServerThread.timeout.connect(self.__callWebServer)
-        webServerThread.start(100)
+        # Changes of the connection graph are pushed by the web server
+        self._graphEvents: browser.EventBridge = browser.EventBridge(api.subscribeConnectionGraph, self.form)
+        self._graphEvents.received.connect(self.__onGraphEvent)
+        self._graphEvents.start()
 
         # Connect Signals and Slots
         self.form.cb_animations.stateChanged.connect(self.__toggleAnimations)
@@ -98,21 +99,28 @@ class _TaskPanel:
         self.__exit()
         return True
 
-    def __callWebServer(self) -> None:
-        # Check if the set of selected connections has been changed
-        selectedConnections: typing.Dict = api.getSelectedConnections()
-        if selectedConnections and self._prevSelectedConnections != selectedConnections:
-            self.__highlightTopoConstraints({selectedConnections["source"]: selectedConnections["targets"]})
-            self._prevSelectedConnections = selectedConnections
-
-        # Check if the set of connections has been changed
-        connections: typing.Set[typing.Tuple] = api.getConnectionGraphEdges()
-        if connections and self._prevConnections != connections:
+    def __onGraphEvent(self, eventType: str, data: typing.Any) -> None:
+        if eventType == "selected":
+            # Check if the set of selected connections has been changed
+            if data and self._prevSelectedConnections != data:
+                self.__highlightTopoConstraints({data["source"]: data["targets"]})
+                self._prevSelectedConnections = data
+            return
+
+        connections: typing.Set[typing.Tuple] = set(self._connections)
+        if eventType == "reset":
+            connections = api.getConnectionGraphEdges()
+        elif eventType == "edges_added":
+            connections.update(tuple(sorted(edge)) for edge in data)
+        elif eventType == "edges_removed":
+            connections.difference_update(tuple(sorted(edge)) for edge in data)
+        if self._connections != connections:
             self.__resetConstraintsTable(connections)
             self.form.l_constraints.setText(str(len(connections)))
-            self._prevConnections = connections
+            self._connections = connections
     
     def __exit(self) -> None:
+        self._graphEvents.stop()
         browser.hide()
         api.clearCacheConnectionGraph()
         self.__resetPartViews()
@@ -187,8 +195,13 @@ class _TaskPanel:
                 part.ViewObject.Visibility = self._initialPartViews[part.Label]["Visibility"]
 
     def __saveConnectionGraph(self, fileLocation: str) -> None:
+        connectionGraph: typing.Dict = api.getConnectionGraph()
         with open(fileLocation, 'w') as file:
-            json.dump(api.getConnectionGraph(), file)
+            json.dump(connectionGraph, file)
+        # Only the edited edges are rewritten in the result store
+        with result_store.ResultStore.forWorkingDir(self._analysis.WorkingDir) as store:
+            store.replaceConstraints(self._obj.Label, result_store.NO_DIRECTION,
+                                     {tuple(sorted([link["source"], link["target"]])) for link in connectionGraph.get("links", [])})
 
     def __toggleAnimations(self, state: QtCore.Qt.CheckState) -> None:
         if state == QtCore.Qt.Checked:
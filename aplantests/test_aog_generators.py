@@ -0,0 +1,87 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__title__ = "Tests of the AND/OR graph generators"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+# Usage (from FreeCAD's Mod/Aplan directory): python -m unittest discover -s aplantests -t .
+
+import aplanobjects.graphs as graphs
+import aplansolvers.aplan_aog_generators.reverse_cutset as reverse_cutset
+import aplansolvers.aplan_aog_generators.top_down_cutset as top_down_cutset
+
+import typing
+import unittest
+
+
+def _getConstraints() -> typing.Dict:
+    """A cycle A-B-C-D-A in which A is obstructed by B and C, and C by A and B, each in another direction: [A, B] blocks C
+    and [B, C] blocks A, whereas [A, B, C] blocks nothing. [A, B, C] is feasible on its own, but cannot be grown from a single
+    component through feasible subassemblies, since A and C are not connected.
+    """
+    topoConstraints: graphs.ConnectionGraph = graphs.ConnectionGraph()
+    topoConstraints.add_edges_from([("A", "B"), ("B", "C"), ("C", "D"), ("D", "A")])
+    geomConstraints: typing.List[graphs.ObstructionGraph] = []
+    for edges in ([("A", "C"), ("C", "A")], [("A", "B"), ("C", "B")]):
+        obstructionGraph: graphs.ObstructionGraph = graphs.ObstructionGraph()
+        obstructionGraph.add_nodes_from(["A", "B", "C", "D"])
+        obstructionGraph.add_edges_from(edges)
+        geomConstraints.append(obstructionGraph)
+    return {"topological": topoConstraints, "geometrical": geomConstraints}
+
+
+class TestGenerators(unittest.TestCase):
+    def setUp(self) -> None:
+        components: typing.Set[str] = {"A", "B", "C", "D"}
+        self.reverseGraph: graphs.CompactAndOrGraph = reverse_cutset.ReverseCutset(None, components, _getConstraints()).generate(compact=True)
+        self.topDownGraph: graphs.CompactAndOrGraph = top_down_cutset.TopDownCutset(None, components, _getConstraints()).generate(compact=True)
+
+    def test_reachable_hyperedges(self) -> None:
+        """The hyperedges of ReverseCutset that are reachable from the full assembly are generated by TopDownCutset as well."""
+        reverseHyperedges: typing.Dict[int, typing.Set[typing.Tuple[int, ...]]] = {}
+        for parent, children in self.reverseGraph.iter_hyperedges():
+            reverseHyperedges.setdefault(parent, set()).add(tuple(sorted(children)))
+        topDownHyperedges: typing.Set[typing.Tuple[int, typing.Tuple[int, ...]]] = {(parent, tuple(sorted(children)))
+                                                                                    for parent, children in self.topDownGraph.iter_hyperedges()}
+        reachable: typing.Set[typing.Tuple[int, typing.Tuple[int, ...]]] = set()
+        stack: typing.List[int] = [0b1111]
+        while stack:
+            parent: int = stack.pop()
+            for children in reverseHyperedges.pop(parent, set()):
+                reachable.add((parent, children))
+                stack.extend(children)
+        self.assertTrue(reachable)
+        self.assertLessEqual(reachable, topDownHyperedges)
+
+    def test_feasibility_definitions(self) -> None:
+        """[A, B, C] is only feasible for TopDownCutset, so only its graph holds the cut that removes D first."""
+        self.assertIsNotNone(self.topDownGraph.node_id(0b0111))
+        self.assertIsNone(self.reverseGraph.node_id(0b0111))
+        self.assertIn((0b0111, 0b1000), {tuple(sorted(children)) for parent, children in self.topDownGraph.iter_hyperedges()
+                                         if parent == 0b1111})
+
+
+if __name__ == "__main__":
+    unittest.main()
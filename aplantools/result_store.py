@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2022 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+__title__ = "APLAN result store"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+try:
+    import json
+    import os
+    import sqlite3
+    import time
+    import typing
+except ImportError as ie:
+    print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
+
+
+STORE_FILE_NAME: typing.Final[str] = "AplanResults.sqlite"
+
+# Direction of constraints that do not depend on a motion direction, e.g. topological constraints
+NO_DIRECTION: typing.Final[str] = ""
+
+_SCHEMA: typing.Final[str] = """
+CREATE TABLE IF NOT EXISTS runs (
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    detector   TEXT NOT NULL,
+    parameters TEXT NOT NULL,
+    started    REAL NOT NULL,
+    duration   REAL
+);
+CREATE TABLE IF NOT EXISTS constraints (
+    label     TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    target    TEXT NOT NULL,
+    run_id    INTEGER REFERENCES runs(id),
+    PRIMARY KEY (label, direction, source, target)
+);
+CREATE INDEX IF NOT EXISTS idx_constraints_edge ON constraints (direction, source, target);
+CREATE TABLE IF NOT EXISTS pair_results (
+    run_id    INTEGER NOT NULL REFERENCES runs(id),
+    direction TEXT NOT NULL,
+    source    TEXT NOT NULL,
+    target    TEXT NOT NULL,
+    result    INTEGER NOT NULL,
+    duration  REAL,
+    PRIMARY KEY (run_id, direction, source, target)
+);
+CREATE INDEX IF NOT EXISTS idx_pair_results_edge ON pair_results (direction, source, target);
+"""
+
+
+class ResultStore:
+    """SQLite store holding the constraint edges, per-pair solver results, timings and parameters of an analysis.
+
+    Constraint edges are grouped by the label of the set they belong to (e.g. 'TopoConstraints', 'GeomConstraints_POS_X'
+    or 'GroundTruth_POS_X') and are indexed by (direction, source, target), so that sets can be updated incrementally
+    and compared with each other without loading them as a whole. Edges without a direction are undirected and are stored
+    with their source and target sorted, whatever order they are given in.
+    """
+
+    def __init__(self, dbPath: str) -> None:
+        self._dbPath: str = dbPath
+        self._connection: sqlite3.Connection = sqlite3.connect(dbPath)
+        self._connection.executescript(_SCHEMA)
+
+    @classmethod
+    def forWorkingDir(cls, workingDir: str) -> ResultStore:
+        return cls(os.path.join(workingDir, STORE_FILE_NAME))
+
+    @property
+    def dbPath(self) -> str:
+        return self._dbPath
+
+    def __enter__(self) -> ResultStore:
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        if excType is None:
+            self._connection.commit()
+        self.close()
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def commit(self) -> None:
+        self._connection.commit()
+
+    # ********************* START: Runs *********************
+
+    def beginRun(self, detector: str, parameters: typing.Dict) -> int:
+        cursor: sqlite3.Cursor = self._connection.execute("INSERT INTO runs (detector, parameters, started) VALUES (?, ?, ?)",
+                                                          (detector, json.dumps(parameters, default=str, sort_keys=True), time.time()))
+        return int(cursor.lastrowid)
+
+    def endRun(self, runId: int, duration: float) -> None:
+        self._connection.execute("UPDATE runs SET duration = ? WHERE id = ?", (duration, runId))
+
+    def getRuns(self, detector: typing.Optional[str] = None) -> typing.List[typing.Dict]:
+        query: str = "SELECT id, detector, parameters, started, duration FROM runs"
+        args: typing.Tuple = ()
+        if detector is not None:
+            query += " WHERE detector = ?"
+            args = (detector,)
+        return [{"id": row[0], "detector": row[1], "parameters": json.loads(row[2]), "started": row[3], "duration": row[4]}
+                for row in self._connection.execute(query + " ORDER BY id", args)]
+
+    def upsertPairResults(self, runId: int, direction: str,
+                          results: typing.Iterable[typing.Tuple[str, str, bool, typing.Optional[float]]]) -> None:
+        self._connection.executemany("""INSERT INTO pair_results (run_id, direction, source, target, result, duration) VALUES (?, ?, ?, ?, ?, ?)
+                                        ON CONFLICT (run_id, direction, source, target) DO UPDATE SET result = excluded.result, duration = excluded.duration""",
+                                     ((runId, direction) + self.__normalizeEdge(direction, (source, target)) + (int(result), duration)
+                                      for source, target, result, duration in results))
+
+    def getPairResults(self, runId: int, direction: str = NO_DIRECTION) -> typing.Dict[typing.Tuple[str, str], bool]:
+        return {(row[0], row[1]): bool(row[2]) for row in self._connection.execute(
+            "SELECT source, target, result FROM pair_results WHERE run_id = ? AND direction = ?", (runId, direction))}
+
+    # ********************* END: Runs *********************
+
+    # ********************* START: Constraints *********************
+
+    def getConstraints(self, label: str, direction: str = NO_DIRECTION) -> typing.Set[typing.Tuple[str, str]]:
+        return {(row[0], row[1]) for row in self._connection.execute(
+            "SELECT source, target FROM constraints WHERE label = ? AND direction = ?", (label, direction))}
+
+    def upsertConstraints(self, label: str, direction: str, edges: typing.Iterable[typing.Tuple[str, str]], runId: typing.Optional[int] = None) -> None:
+        self._connection.executemany("""INSERT INTO constraints (label, direction, source, target, run_id) VALUES (?, ?, ?, ?, ?)
+                                        ON CONFLICT (label, direction, source, target) DO UPDATE SET run_id = excluded.run_id""",
+                                     ((label, direction) + self.__normalizeEdge(direction, edge) + (runId,) for edge in edges))
+
+    def removeConstraints(self, label: str, direction: str, edges: typing.Iterable[typing.Tuple[str, str]]) -> None:
+        self._connection.executemany("DELETE FROM constraints WHERE label = ? AND direction = ? AND source = ? AND target = ?",
+                                     ((label, direction) + self.__normalizeEdge(direction, edge) for edge in edges))
+
+    def replaceConstraints(self, label: str, direction: str, edges: typing.Iterable[typing.Tuple[str, str]], runId: typing.Optional[int] = None) -> None:
+        """Makes the stored set equal to `edges` by only removing and inserting the edges that differ."""
+        newEdges: typing.Set[typing.Tuple[str, str]] = {self.__normalizeEdge(direction, edge) for edge in edges}
+        oldEdges: typing.Set[typing.Tuple[str, str]] = self.getConstraints(label, direction)
+        self.removeConstraints(label, direction, oldEdges.difference(newEdges))
+        self.upsertConstraints(label, direction, newEdges.difference(oldEdges), runId)
+
+    def diffConstraints(self, label: str, referenceLabel: str,
+                        direction: str = NO_DIRECTION) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], typing.Set[typing.Tuple[str, str]]]:
+        """Returns the edges of the reference set that are missing in the set and the edges of the set in excess of the reference set."""
+        query: str = """SELECT source, target FROM constraints WHERE label = ? AND direction = ?
+                        EXCEPT
+                        SELECT source, target FROM constraints WHERE label = ? AND direction = ?"""
+        missing: typing.Set[typing.Tuple[str, str]] = {(row[0], row[1]) for row in self._connection.execute(query, (referenceLabel, direction, label, direction))}
+        excess: typing.Set[typing.Tuple[str, str]] = {(row[0], row[1]) for row in self._connection.execute(query, (label, direction, referenceLabel, direction))}
+        return missing, excess
+
+    def diffPairResults(self, runId: int, referenceLabel: str,
+                        direction: str = NO_DIRECTION) -> typing.Tuple[typing.Set[typing.Tuple[str, str]], typing.Set[typing.Tuple[str, str]]]:
+        """Same as diffConstraints, but compares the positive pair results of a run against the reference set."""
+        missing: typing.Set[typing.Tuple[str, str]] = {(row[0], row[1]) for row in self._connection.execute(
+            """SELECT source, target FROM constraints WHERE label = ? AND direction = ?
+               EXCEPT
+               SELECT source, target FROM pair_results WHERE run_id = ? AND direction = ? AND result = 1""",
+            (referenceLabel, direction, runId, direction))}
+        excess: typing.Set[typing.Tuple[str, str]] = {(row[0], row[1]) for row in self._connection.execute(
+            """SELECT source, target FROM pair_results WHERE run_id = ? AND direction = ? AND result = 1
+               EXCEPT
+               SELECT source, target FROM constraints WHERE label = ? AND direction = ?""",
+            (runId, direction, referenceLabel, direction))}
+        return missing, excess
+
+    @staticmethod
+    def __normalizeEdge(direction: str, edge: typing.Tuple[str, str]) -> typing.Tuple[str, str]:
+        if direction == NO_DIRECTION:
+            return tuple(sorted((str(edge[0]), str(edge[1]))))
+        return str(edge[0]), str(edge[1])
+
+    # ********************* END: Constraints *********************
@@ -27,63 +27,329 @@ __author__ = "Martijn Cramer"
 __url__ = "https://www.freecadweb.org"
 
 try:
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    import json
     import requests
+    import threading
     import typing
 except ImportError as ie:
     print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
 
 
+DEFAULT_HOST:    typing.Final[str] = "0.0.0.0"
+DEFAULT_PORT:    typing.Final[int] = 8080
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT: typing.Final[typing.Tuple[float, float]] = (3.05, 30.0)
+
+
+# ********************* Change events *********************
+class EventStream(threading.Thread):
+    """Receives the Server-Sent Events of a graph on its own thread and passes their type and data to `callback`.
+
+    The stream is reopened with the ID of the last received event whenever the server closes it. The callback is called
+    on the thread of the stream, so GUI code should hand the events over to the GUI thread (see browser.EventBridge).
+    """
+
+    def __init__(self, url: str, callback: typing.Callable[[str, typing.Any], None],
+                 timeout: typing.Tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+        super(EventStream, self).__init__(daemon=True)
+        self._url: str = url
+        self._callback: typing.Callable[[str, typing.Any], None] = callback
+        self._timeout: typing.Tuple[float, float] = timeout
+        self._session: requests.Session = requests.Session()
+        self._lastEventId: typing.Optional[str] = None
+        self._response: typing.Optional[requests.Response] = None
+        self._stopped: threading.Event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                headers: typing.Dict[str, str] = {"Last-Event-ID": self._lastEventId} if self._lastEventId else {}
+                with self._session.get(self._url, headers=headers, stream=True, timeout=self._timeout) as response:
+                    self._response = response
+                    self.__readEvents(response)
+            except Exception:
+                if not self._stopped.is_set():
+                    self._stopped.wait(1.0)
+        self._session.close()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._response is not None:
+            self._response.close()
+
+    def __readEvents(self, response: requests.Response) -> None:
+        eventType: str = "message"
+        data: typing.List[str] = []
+        line: str
+        for line in response.iter_lines(decode_unicode=True):
+            if self._stopped.is_set():
+                return
+            if not line:
+                if data:
+                    self._callback(eventType, json.loads("\n".join(data)))
+                eventType, data = "message", []
+            elif not line.startswith(":"):
+                field, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if field == "event":
+                    eventType = value
+                elif field == "data":
+                    data.append(value)
+                elif field == "id":
+                    self._lastEventId = value
+
+
+# ********************* Client *********************
+class ApiClient:
+    """Client of the APLAN web app that keeps its connections to the server alive in a requests.Session.
+
+    `timeout` is the (connect, read) timeout of every request in seconds; requests that fail raise requests.RequestException.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 timeout: typing.Tuple[float, float] = DEFAULT_TIMEOUT, maxConnections: int = 4) -> None:
+        self._baseUrl: str = "http://{}:{}/aplan".format(host, port)
+        self._timeout: typing.Tuple[float, float] = timeout
+        self._session: requests.Session = requests.Session()
+        adapter: requests.adapters.HTTPAdapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=maxConnections)
+        self._session.mount("http://", adapter)
+
+    @property
+    def baseUrl(self) -> str:
+        return self._baseUrl
+
+    @property
+    def timeout(self) -> typing.Tuple[float, float]:
+        return self._timeout
+
+    def __enter__(self) -> "ApiClient":
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._session.close()
+
+    # ********************* General *********************
+    def toggleAnimations(self, enable: bool) -> None:
+        self.__post("/animations", params={"enable": str(enable)})
+
+    # ********************* Connection graph *********************
+    def clearCacheConnectionGraph(self) -> None:
+        self.__post("/connection_graph/clear_cache")
+
+    def getConnectionGraph(self) -> typing.Dict:
+        return self.__get("/connection_graph/json").json()
+
+    def getConnectionGraphChanges(self, since: int) -> typing.Dict:
+        """Returns the changes of the graph since version `since` (see server.graphJSON), or the whole graph under "graph"."""
+        return self.__get("/connection_graph/json", params={"since": since}).json()
+
+    def patchConnectionGraph(self, changes: typing.Dict[str, typing.List], version: typing.Optional[int] = None) -> int:
+        """Applies the changes to the graph, if it is still at `version` (when given), and returns its new version."""
+        headers: typing.Dict[str, str] = {"If-Match": '"{}"'.format(version)} if version is not None else {}
+        return self.__request("PATCH", "/connection_graph/json", headers=headers, json=changes).json()["version"]
+
+    def getConnectionGraphEdges(self) -> typing.Set[typing.Tuple]:
+        connectionGraph: typing.Dict = self.getConnectionGraph()
+        if connectionGraph:
+            return {tuple(sorted([link["source"], link["target"]])) for link in connectionGraph["links"]}
+        else:
+            return set()
+
+    def getSelectedConnections(self) -> typing.Dict:
+        return self.__get("/connection_graph/selected_connections").json()
+
+    def subscribeConnectionGraph(self, callback: typing.Callable[[str, typing.Any], None]) -> EventStream:
+        """Passes the 'reset', 'edges_added', 'edges_removed' and 'selected' events of the connection graph to `callback`."""
+        eventStream: EventStream = EventStream(self._baseUrl + "/connection_graph/events", callback, self._timeout)
+        eventStream.start()
+        return eventStream
+
+    # ********************* Obstruction graph *********************
+    def clearCacheObstructionGraph(self) -> None:
+        self.__post("/obstruction_graph/clear_cache")
+
+    def getObstructionGraph(self) -> typing.Dict:
+        return self.__get("/obstruction_graph/json").json()
+
+    def getObstructionGraphChanges(self, since: int) -> typing.Dict:
+        """Returns the changes of the graph since version `since` (see server.graphJSON), or the whole graph under "graph"."""
+        return self.__get("/obstruction_graph/json", params={"since": since}).json()
+
+    def patchObstructionGraph(self, changes: typing.Dict[str, typing.List], version: typing.Optional[int] = None) -> int:
+        """Applies the changes to the graph, if it is still at `version` (when given), and returns its new version."""
+        headers: typing.Dict[str, str] = {"If-Match": '"{}"'.format(version)} if version is not None else {}
+        return self.__request("PATCH", "/obstruction_graph/json", headers=headers, json=changes).json()["version"]
+
+    def getObstructionGraphEdges(self) -> typing.Set[typing.Tuple]:
+        obstructionGraph: typing.Dict = self.getObstructionGraph()
+        if obstructionGraph:
+            return {tuple([link["source"], link["target"]]) for link in obstructionGraph["links"]}
+        else:
+            return set()
+
+    def getSelectedObstructions(self) -> typing.Dict:
+        return self.__get("/obstruction_graph/selected_obstructions").json()
+
+    def subscribeObstructionGraph(self, callback: typing.Callable[[str, typing.Any], None]) -> EventStream:
+        """Passes the 'reset', 'edges_added', 'edges_removed' and 'selected' events of the obstruction graph to `callback`."""
+        eventStream: EventStream = EventStream(self._baseUrl + "/obstruction_graph/events", callback, self._timeout)
+        eventStream.start()
+        return eventStream
+
+    def __get(self, path: str, params: typing.Optional[typing.Dict] = None) -> requests.Response:
+        return self.__request("GET", path, params=params)
+
+    def __post(self, path: str, params: typing.Optional[typing.Dict] = None, data: typing.Any = None) -> requests.Response:
+        return self.__request("POST", path, params=params, json=data)
+
+    def __request(self, method: str, path: str, **kwargs) -> requests.Response:
+        response: requests.Response = self._session.request(method, self._baseUrl + path, timeout=self._timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+
+class AsyncApiClient:
+    """asyncio variant of ApiClient, e.g. to fetch a graph and its selection concurrently with asyncio.gather.
+
+    The requests are run on a pool of `maxWorkers` threads, each with its own ApiClient (a requests.Session is not meant
+    to be shared between threads), so that awaiting them never blocks the event loop.
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                 timeout: typing.Tuple[float, float] = DEFAULT_TIMEOUT, maxWorkers: int = 4) -> None:
+        self._host: str = host
+        self._port: int = port
+        self._timeout: typing.Tuple[float, float] = timeout
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="AplanApiClient")
+        self._local: threading.local = threading.local()
+        self._clients: typing.List[ApiClient] = []
+        self._clientsLock: threading.Lock = threading.Lock()
+
+    async def __aenter__(self) -> "AsyncApiClient":
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Same as close, but waits for the pending requests on a separate thread instead of blocking the event loop."""
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        for client in self._clients:
+            client.close()
+
+    async def toggleAnimations(self, enable: bool) -> None:
+        await self.__run(ApiClient.toggleAnimations, enable)
+
+    async def clearCacheConnectionGraph(self) -> None:
+        await self.__run(ApiClient.clearCacheConnectionGraph)
+
+    async def getConnectionGraph(self) -> typing.Dict:
+        return await self.__run(ApiClient.getConnectionGraph)
+
+    async def getConnectionGraphChanges(self, since: int) -> typing.Dict:
+        return await self.__run(ApiClient.getConnectionGraphChanges, since)
+
+    async def patchConnectionGraph(self, changes: typing.Dict[str, typing.List], version: typing.Optional[int] = None) -> int:
+        return await self.__run(ApiClient.patchConnectionGraph, changes, version)
+
+    async def getConnectionGraphEdges(self) -> typing.Set[typing.Tuple]:
+        return await self.__run(ApiClient.getConnectionGraphEdges)
+
+    async def getSelectedConnections(self) -> typing.Dict:
+        return await self.__run(ApiClient.getSelectedConnections)
+
+    async def clearCacheObstructionGraph(self) -> None:
+        await self.__run(ApiClient.clearCacheObstructionGraph)
+
+    async def getObstructionGraph(self) -> typing.Dict:
+        return await self.__run(ApiClient.getObstructionGraph)
+
+    async def getObstructionGraphChanges(self, since: int) -> typing.Dict:
+        return await self.__run(ApiClient.getObstructionGraphChanges, since)
+
+    async def patchObstructionGraph(self, changes: typing.Dict[str, typing.List], version: typing.Optional[int] = None) -> int:
+        return await self.__run(ApiClient.patchObstructionGraph, changes, version)
+
+    async def getObstructionGraphEdges(self) -> typing.Set[typing.Tuple]:
+        return await self.__run(ApiClient.getObstructionGraphEdges)
+
+    async def getSelectedObstructions(self) -> typing.Dict:
+        return await self.__run(ApiClient.getSelectedObstructions)
+
+    async def __run(self, method: typing.Callable, *args) -> typing.Any:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, lambda: method(self.__getClient(), *args))
+
+    def __getClient(self) -> ApiClient:
+        client: typing.Optional[ApiClient] = getattr(self._local, "client", None)
+        if client is None:
+            client = ApiClient(self._host, self._port, self._timeout, maxConnections=1)
+            self._local.client = client
+            with self._clientsLock:
+                self._clients.append(client)
+        return client
+
+
+# The client used by the functions below
+_client: typing.Optional[ApiClient] = None
+
+
+def getClient() -> ApiClient:
+    global _client
+    if _client is None:
+        _client = ApiClient()
+    return _client
+
+
 # ********************* General *********************
 def toggleAnimations(enable: bool) -> None:
-    requests.post(
-        "http://0.0.0.0:8080/aplan/animations?enable={}".format(str(enable)))
+    getClient().toggleAnimations(enable)
 
 
 # ********************* Connection graph *********************
 def clearCacheConnectionGraph() -> None:
-    requests.post("http://0.0.0.0:8080/aplan/connection_graph/clear_cache")
+    getClient().clearCacheConnectionGraph()
 
 
 def getConnectionGraph() -> typing.Dict:
-    r = requests.get(
-        "http://0.0.0.0:8080/aplan/connection_graph/json")
-    return r.json()
+    return getClient().getConnectionGraph()
 
 
 def getConnectionGraphEdges() -> typing.Set[typing.Tuple]:
-    connectionGraph: typing.Dict = getConnectionGraph()
-    if connectionGraph:
-        return {tuple(sorted([link["source"], link["target"]])) for link in connectionGraph["links"]}
-    else:
-        return set()
+    return getClient().getConnectionGraphEdges()
 
 
 def getSelectedConnections() -> typing.Dict:
-    r = requests.get(
-        "http://0.0.0.0:8080/aplan/connection_graph/selected_connections")
-    return r.json()
+    return getClient().getSelectedConnections()
+
+
+def subscribeConnectionGraph(callback: typing.Callable[[str, typing.Any], None]) -> EventStream:
+    return getClient().subscribeConnectionGraph(callback)
 
 
 # ********************* Obstruction graph *********************
 def clearCacheObstructionGraph() -> None:
-    requests.post("http://0.0.0.0:8080/aplan/obstruction_graph/clear_cache")
+    getClient().clearCacheObstructionGraph()
 
 
 def getObstructionGraph() -> typing.Dict:
-    r = requests.get(
-        "http://0.0.0.0:8080/aplan/obstruction_graph/json")
-    return r.json()
+    return getClient().getObstructionGraph()
 
 
 def getObstructionGraphEdges() -> typing.Set[typing.Tuple]:
-    obstructionGraph: typing.Dict = getObstructionGraph()
-    if obstructionGraph:
-        return {tuple([link["source"], link["target"]]) for link in obstructionGraph["links"]}
-    else:
-        return set()
+    return getClient().getObstructionGraphEdges()
 
 
 def getSelectedObstructions() -> typing.Dict:
-    r = requests.get(
-        "http://0.0.0.0:8080/aplan/obstruction_graph/selected_obstructions")
-    return r.json()
+    return getClient().getSelectedObstructions()
+
+
+def subscribeObstructionGraph(callback: typing.Callable[[str, typing.Any], None]) -> EventStream:
+    return getClient().subscribeObstructionGraph(callback)
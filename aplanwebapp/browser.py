@@ -31,6 +31,7 @@ from aplantools import aplanutils
 try:
     import FreeCADGui
     from PySide2 import QtCore, QtWebEngineWidgets, QtWidgets
+    import typing
 except ImportError as ie:
     aplanutils.missingPythonModule(str(ie.name or ""))
 
@@ -144,3 +145,25 @@ class Dialog(QtWidgets.QDialog):
         if event.type() == QtCore.QEvent.ShortcutOverride:
             event.accept()
         return super(Dialog, self).event(event)
+
+
+class EventBridge(QtCore.QObject):
+    """Re-emits the events of an api.EventStream, received on the stream's thread, as a signal handled on the GUI thread.
+
+    The stream is only subscribed to by start(), so that the slots can be connected to `received` first and no event is missed.
+    """
+    received = QtCore.Signal(str, object)
+
+    def __init__(self, subscribe: typing.Callable, parent: typing.Optional[QtCore.QObject] = None) -> None:
+        super(EventBridge, self).__init__(parent)
+        self._subscribe: typing.Callable = subscribe
+        self._eventStream = None
+
+    def start(self) -> None:
+        if self._eventStream is None:
+            self._eventStream = self._subscribe(self.received.emit)
+
+    def stop(self) -> None:
+        if self._eventStream is not None:
+            self._eventStream.stop()
+            self._eventStream = None
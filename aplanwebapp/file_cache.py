@@ -0,0 +1,120 @@
+# ***************************************************************************
+# *                                                                         *
+# *   Copyright (c) 2023 Martijn Cramer <martijn.cramer@outlook.com>        *
+# *                                                                         *
+# *   This file is part of the FreeCAD CAx development system.              *
+# *                                                                         *
+# *   This program is free software; you can redistribute it and/or modify  *
+# *   it under the terms of the GNU Lesser General Public License (LGPL)    *
+# *   as published by the Free Software Foundation; either version 2 of     *
+# *   the License, or (at your option) any later version.                   *
+# *   for detail see the LICENCE text file.                                 *
+# *                                                                         *
+# *   This program is distributed in the hope that it will be useful,       *
+# *   but WITHOUT ANY WARRANTY; without even the implied warranty of        *
+# *   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the         *
+# *   GNU Library General Public License for more details.                  *
+# *                                                                         *
+# *   You should have received a copy of the GNU Library General Public     *
+# *   License along with this program; if not, write to the Free Software   *
+# *   Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  *
+# *   USA                                                                   *
+# *                                                                         *
+# ***************************************************************************
+
+
+__title__ = "FreeCAD APLAN Flask web app file cache"
+__author__ = "Martijn Cramer"
+__url__ = "https://www.freecadweb.org"
+
+try:
+    from collections import OrderedDict
+    import gzip
+    import json
+    import os
+    import threading
+    import typing
+except ImportError as ie:
+    print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
+
+
+# Responses smaller than this are not worth compressing
+MIN_GZIP_SIZE: typing.Final[int] = 1024
+
+
+class CachedFile:
+    """A JSON file serialized once, compactly and gzip-compressed, and parsed on first access to `data`."""
+
+    def __init__(self, stamp: typing.Tuple[int, int], body: bytes, gzipBody: typing.Optional[bytes],
+                 data: typing.Any = None) -> None:
+        self.stamp: typing.Tuple[int, int] = stamp
+        self.body: bytes = body
+        self.gzipBody: typing.Optional[bytes] = gzipBody
+        self._data: typing.Any = data
+        self._parsed: bool = data is not None
+
+    @property
+    def etag(self) -> str:
+        return "{:x}-{:x}".format(*self.stamp)
+
+    @property
+    def data(self) -> typing.Any:
+        """The parsed file; it is shared by all requests, so it must not be modified."""
+        if not self._parsed:
+            self._data = json.loads(self.body)
+            self._parsed = True
+        return self._data
+
+
+class FileCache:
+    """Cache of JSON files keyed by their path and invalidated when their modification time or size changes.
+
+    Every process keeps the latest `maxEntries` files in memory. If a `sharedCache` (e.g. a flask_caching.Cache with a
+    FileSystemCache backend) is given, the serialized files are stored there as well, so that the workers of a multi-process
+    server only read, parse and compress each version of a file once between them.
+    """
+
+    def __init__(self, sharedCache: typing.Any = None, maxEntries: int = 32) -> None:
+        self._sharedCache: typing.Any = sharedCache
+        self._maxEntries: int = maxEntries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock: threading.Lock = threading.Lock()
+
+    def setSharedCache(self, sharedCache: typing.Any) -> None:
+        self._sharedCache = sharedCache
+
+    def get(self, fileLoc: str) -> CachedFile:
+        """Returns the cached file; raises OSError if it cannot be read and ValueError if it is not valid JSON."""
+        fileLoc = os.path.abspath(fileLoc)
+        stat: os.stat_result = os.stat(fileLoc)
+        stamp: typing.Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry: typing.Optional[CachedFile] = self._entries.get(fileLoc)
+            if entry is not None and entry.stamp == stamp:
+                self._entries.move_to_end(fileLoc)
+                return entry
+
+        sharedKey: str = "file_cache:" + fileLoc
+        shared: typing.Optional[typing.Tuple[typing.Tuple[int, int], bytes, typing.Optional[bytes]]] = None
+        if self._sharedCache is not None:
+            shared = self._sharedCache.get(sharedKey)
+        if shared is not None and tuple(shared[0]) == stamp:
+            entry = CachedFile(stamp, shared[1], shared[2])
+        else:
+            with open(fileLoc, "rb") as file:
+                data: typing.Any = json.load(file)
+            body: bytes = json.dumps(data, separators=(",", ":")).encode("utf-8")
+            entry = CachedFile(stamp, body, gzip.compress(body, compresslevel=6) if len(body) >= MIN_GZIP_SIZE else None, data)
+            if self._sharedCache is not None:
+                self._sharedCache.set(sharedKey, (stamp, entry.body, entry.gzipBody), timeout=0)
+
+        with self._lock:
+            self._entries[fileLoc] = entry
+            self._entries.move_to_end(fileLoc)
+            while len(self._entries) > self._maxEntries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
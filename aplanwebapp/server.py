@@ -26,14 +26,50 @@ __title__ = "FreeCAD APLAN Flask web app"
 __author__ = "Martijn Cramer"
 __url__ = "https://www.freecadweb.org"
 
-import FreeCAD
+# Usage (production mode, outside of FreeCAD, from FreeCAD's Mod/Aplan directory):
+#   FREECAD_LIBDIR=<FreeCAD lib dir> python -m aplanwebapp.server --production [--host <host>] [--port <port>]
+#                                                                  [--workers <n>] [--threads <n>] [--cache_dir <dir>]
+# Several worker processes require gunicorn (Unix); otherwise, a single multi-threaded waitress process is run.
+
 try:
+    import argparse
+    import collections
+    import contextlib
     import flask
     import flask_caching
+    import gzip
     import json
+    import os
+    import sys
+    import tempfile
+    import threading
+    import time
     import typing
 except ImportError as ie:
     print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")))
+try:
+    # Unix only; serializes the changes of the worker processes of a production server
+    import fcntl
+except ImportError:
+    fcntl = None
+try:
+    # Optional; responses are gzip-compressed only without it
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import FreeCAD
+except ModuleNotFoundError as me:
+    FREECAD_LIBDIR: typing.Optional[str]
+    if FREECAD_LIBDIR := os.getenv("FREECAD_LIBDIR"):
+        sys.path.append(FREECAD_LIBDIR)
+        import FreeCAD
+    else:
+        print("Missing environment variable!",
+              "Please add FREECAD_LIBDIR (i.e. the path of your FreeCAD's library directory) to your machine's environment variables.")
+import aplanobjects.graphs as graphs
+from aplanwebapp import file_cache
 
 
 staticDir:    typing.Final[str] = FreeCAD.getHomePath() + "Mod/Aplan/aplanwebapp/static/"
@@ -48,6 +84,274 @@ config = {
 app = flask.Flask(__name__, template_folder = templatesDir)
 app.config.from_mapping(config)
 cache = flask_caching.Cache(app)
+# Parsed and serialized JSON files (graphs, configuration), so that they are only read again once they change on disk
+fileCache: file_cache.FileCache = file_cache.FileCache()
+
+
+# ********************* Locks *********************
+class ProcessLock:
+    """Lock shared by the threads of this process and, if a lock file is given, by every process that locks that file."""
+
+    def __init__(self, lockFile: typing.Optional[str] = None) -> None:
+        self._threadLock: threading.Lock = threading.Lock()
+        self._lockFile: typing.Optional[str] = lockFile if fcntl is not None else None
+        self._file: typing.Optional[typing.IO] = None
+
+    def __enter__(self) -> "ProcessLock":
+        self._threadLock.acquire()
+        if self._lockFile is not None:
+            self._file = open(self._lockFile, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, excType, excValue, traceback) -> None:
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        self._threadLock.release()
+
+
+# ********************* Change events *********************
+# Seconds between keep-alive comments and after which an event stream is closed; clients reconnect with the last event ID,
+# so that a stream only holds a server thread for a bounded time.
+EVENT_KEEP_ALIVE:      typing.Final[float] = 15.0
+EVENT_STREAM_DURATION: typing.Final[float] = 60.0
+
+
+class EventChannel:
+    """Log of the latest change events of a graph, pushed to its subscribers as Server-Sent Events.
+
+    Events are numbered consecutively. A subscriber that connects without the ID of the last event it received, or that
+    missed events which are no longer in the log, is sent a 'reset' event instead, after which it should fetch the state once.
+    """
+
+    def __init__(self, maxEvents: int = 1000) -> None:
+        self._condition: threading.Condition = threading.Condition()
+        self._events: collections.deque = collections.deque(maxlen=maxEvents)
+        self._lastEventId: int = 0
+
+    def publish(self, eventType: str, data: typing.Any = None) -> None:
+        with self._condition:
+            self._lastEventId += 1
+            self._events.append((self._lastEventId, eventType, data))
+            self._condition.notify_all()
+
+    def wait(self, lastEventId: typing.Optional[int], timeout: float) -> typing.List[typing.Tuple[int, str, typing.Any]]:
+        """Returns the events after `lastEventId`, waiting at most `timeout` seconds for one to be published."""
+        with self._condition:
+            oldestEventId: int = self._events[0][0] if self._events else self._lastEventId + 1
+            if lastEventId is None or lastEventId < oldestEventId - 1 or lastEventId > self._lastEventId:
+                return [(self._lastEventId, "reset", None)]
+            self._condition.wait_for(lambda: self._lastEventId > lastEventId, timeout)
+            return [event for event in self._events if event[0] > lastEventId]
+
+
+class SharedEventChannel(EventChannel):
+    """EventChannel whose log is kept in the cache, so that it is shared by the worker processes of a production server.
+
+    Subscribers poll the log every POLL_INTERVAL seconds instead of being notified.
+    """
+
+    POLL_INTERVAL: typing.Final[float] = 0.25
+
+    def __init__(self, key: str, lock: ProcessLock, maxEvents: int = 1000) -> None:
+        super(SharedEventChannel, self).__init__(maxEvents)
+        self._key: str = key
+        self._lock: ProcessLock = lock
+        self._maxEvents: int = maxEvents
+
+    def publish(self, eventType: str, data: typing.Any = None) -> None:
+        with self._lock:
+            lastEventId, events = cache.get(self._key) or (0, [])
+            lastEventId += 1
+            cache.set(self._key, (lastEventId, (events + [(lastEventId, eventType, data)])[-self._maxEvents:]), timeout=0)
+
+    def wait(self, lastEventId: typing.Optional[int], timeout: float) -> typing.List[typing.Tuple[int, str, typing.Any]]:
+        deadline: float = time.monotonic() + timeout
+        while True:
+            currentEventId, events = cache.get(self._key) or (0, [])
+            oldestEventId: int = events[0][0] if events else currentEventId + 1
+            if lastEventId is None or lastEventId < oldestEventId - 1 or lastEventId > currentEventId:
+                return [(currentEventId, "reset", None)]
+            if currentEventId > lastEventId or time.monotonic() >= deadline:
+                return [tuple(event) for event in events if event[0] > lastEventId]
+            time.sleep(self.POLL_INTERVAL)
+
+
+eventChannels: typing.Dict[str, EventChannel] = {
+    "connection_graph":  EventChannel(),
+    "obstruction_graph": EventChannel()
+}
+# Serializes the read-modify-write of a cached graph with the publication of its changes
+graphLock: ProcessLock = ProcessLock()
+
+
+def streamEvents(channel: EventChannel) -> flask.Response:
+    lastEventId: typing.Optional[str] = flask.request.headers.get("Last-Event-ID", flask.request.args.get("lastEventId"))
+
+    def generate(lastEventId: typing.Optional[int]) -> typing.Iterator[str]:
+        yield "retry: 1000\n\n"
+        deadline: float = time.monotonic() + EVENT_STREAM_DURATION
+        while time.monotonic() < deadline:
+            events: typing.List[typing.Tuple[int, str, typing.Any]] = channel.wait(lastEventId, EVENT_KEEP_ALIVE)
+            if not events:
+                yield ": keep-alive\n\n"
+            for eventId, eventType, data in events:
+                yield "id: {}\nevent: {}\ndata: {}\n\n".format(eventId, eventType, json.dumps(data))
+                lastEventId = eventId
+
+    return flask.Response(generate(int(lastEventId) if lastEventId else None), mimetype="text/event-stream",
+                          headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ********************* Versioned graphs *********************
+# The cached graphs are versioned; the changes of the last GRAPH_HISTORY_LENGTH versions are kept, so that clients can
+# fetch the difference with the version they have instead of the whole graph. A change, as well as the body of a PATCH
+# request, has the form {"add_nodes": [{"name": ...}], "remove_nodes": [name], "add_links": [{"source": ..., "target": ...}],
+# "remove_links": [...]}. Removals are applied before additions, adding an existing node replaces it, and the links of
+# removed nodes are listed among the removed links.
+GRAPH_HISTORY_LENGTH: typing.Final[int] = 100
+GRAPH_CHANGE_KEYS:    typing.Final[typing.Tuple[str, ...]] = ("add_nodes", "remove_nodes", "add_links", "remove_links")
+
+
+def linkKey(link: typing.Dict, directed: bool) -> typing.Tuple[str, str]:
+    return (link["source"], link["target"]) if directed else tuple(sorted([link["source"], link["target"]]))
+
+
+def diffGraphs(oldGraph: typing.Optional[typing.Dict], newGraph: typing.Optional[typing.Dict], directed: bool) -> typing.Dict[str, typing.List]:
+    oldNodes: typing.Dict[str, typing.Dict] = {node["name"]: node for node in (oldGraph or {}).get("nodes", [])}
+    newNodes: typing.Dict[str, typing.Dict] = {node["name"]: node for node in (newGraph or {}).get("nodes", [])}
+    oldLinks: typing.Dict[typing.Tuple[str, str], typing.Dict] = {linkKey(link, directed): link for link in (oldGraph or {}).get("links", [])}
+    newLinks: typing.Dict[typing.Tuple[str, str], typing.Dict] = {linkKey(link, directed): link for link in (newGraph or {}).get("links", [])}
+    return {"add_nodes":    [node for name, node in newNodes.items() if oldNodes.get(name) != node],
+            "remove_nodes": [name for name in oldNodes.keys() if name not in newNodes],
+            "add_links":    [link for key, link in newLinks.items() if key not in oldLinks],
+            "remove_links": [link for key, link in oldLinks.items() if key not in newLinks]}
+
+
+def patchGraph(graph: typing.Optional[typing.Dict], changes: typing.Dict[str, typing.List],
+               directed: bool) -> typing.Tuple[typing.Dict, typing.Dict[str, typing.List]]:
+    """Returns the patched graph and the changes that took effect; the links of removed nodes are removed as well."""
+    nodes: typing.Dict[str, typing.Dict] = {node["name"]: node for node in (graph or {}).get("nodes", [])}
+    links: typing.Dict[typing.Tuple[str, str], typing.Dict] = {linkKey(link, directed): link for link in (graph or {}).get("links", [])}
+    removedNodes: typing.Set[str] = {name for name in changes.get("remove_nodes", []) if name in nodes}
+    removedLinks: typing.Set[typing.Tuple[str, str]] = {linkKey(link, directed) for link in changes.get("remove_links", [])}
+    removedLinks.update(key for key in links.keys() if removedNodes.intersection(key))
+    removedLinks.intersection_update(links.keys())
+    effectiveChanges: typing.Dict[str, typing.List] = {"add_nodes":    [],
+                                                       "remove_nodes": sorted(removedNodes),
+                                                       "add_links":    [],
+                                                       "remove_links": [links.pop(key) for key in sorted(removedLinks)]}
+    for name in removedNodes:
+        nodes.pop(name)
+
+    node: typing.Dict
+    for node in changes.get("add_nodes", []):
+        if nodes.get(node["name"]) != node:
+            nodes[node["name"]] = node
+            effectiveChanges["add_nodes"].append(node)
+    link: typing.Dict
+    for link in changes.get("add_links", []):
+        if linkKey(link, directed) not in links:
+            for name in (link["source"], link["target"]):
+                if name not in nodes:
+                    nodes[name] = {"name": name}
+                    effectiveChanges["add_nodes"].append(nodes[name])
+            links[linkKey(link, directed)] = link
+            effectiveChanges["add_links"].append(link)
+    return {"nodes": list(nodes.values()), "links": list(links.values())}, effectiveChanges
+
+
+def mergeGraphChanges(history: typing.Iterable[typing.Tuple[int, typing.Dict[str, typing.List]]], directed: bool) -> typing.Dict[str, typing.List]:
+    """Merges consecutive changes into one, to be applied like a single change (removals before additions)."""
+    addedNodes: typing.Dict[str, typing.Dict] = {}
+    removedNodes: typing.Set[str] = set()
+    addedLinks: typing.Dict[typing.Tuple[str, str], typing.Dict] = {}
+    removedLinks: typing.Dict[typing.Tuple[str, str], typing.Dict] = {}
+    for _, changes in history:
+        for name in changes["remove_nodes"]:
+            addedNodes.pop(name, None)
+            removedNodes.add(name)
+        for link in changes["remove_links"]:
+            addedLinks.pop(linkKey(link, directed), None)
+            removedLinks[linkKey(link, directed)] = link
+        for node in changes["add_nodes"]:
+            addedNodes[node["name"]] = node
+        for link in changes["add_links"]:
+            addedLinks[linkKey(link, directed)] = link
+    return {"add_nodes": list(addedNodes.values()), "remove_nodes": sorted(removedNodes),
+            "add_links": list(addedLinks.values()), "remove_links": list(removedLinks.values())}
+
+
+def graphVersion(prefix: str) -> int:
+    """Returns the current version of the graph.
+
+    The first version is taken from the clock (in milliseconds), so that versions never go backwards, even when the cache
+    is lost by a restart; an ETag or ?since version of an earlier run therefore never matches a later graph.
+    """
+    version: typing.Optional[int] = cache.get(prefix + "_version")
+    if version is None:
+        cache.add(prefix + "_version", time.time_ns() // 1000000, timeout=0)
+        version = cache.get(prefix + "_version")
+    return version
+
+
+def commitGraph(prefix: str, channel: EventChannel, graph: typing.Optional[typing.Dict], changes: typing.Dict[str, typing.List], directed: bool) -> int:
+    """Caches the graph as a new version, if it changed, and publishes its changed edges; returns the current version."""
+    version: int = graphVersion(prefix)
+    if not any(changes[key] for key in GRAPH_CHANGE_KEYS):
+        return version
+    version += 1
+    history: typing.List = (cache.get(prefix + "_history") or [])[-(GRAPH_HISTORY_LENGTH-1):]
+    history.append((version, changes))
+    # Without a timeout; an expired version would restart the count
+    cache.set_many({prefix + "_graph": graph, prefix + "_version": version, prefix + "_history": history}, timeout=0)
+
+    if changes["remove_links"]:
+        channel.publish("edges_removed", sorted(linkKey(link, directed) for link in changes["remove_links"]))
+    if changes["add_links"]:
+        channel.publish("edges_added", sorted(linkKey(link, directed) for link in changes["add_links"]))
+    return version
+
+
+def replaceGraph(prefix: str, channel: EventChannel, graph: typing.Optional[typing.Dict], directed: bool) -> int:
+    with graphLock:
+        return commitGraph(prefix, channel, graph, diffGraphs(cache.get(prefix + "_graph"), graph, directed), directed)
+
+
+def graphJSON(prefix: str, channel: EventChannel, directed: bool) -> flask.Response:
+    """Serves GET (the graph, or with ?since=<version> only the changes since that version) and PATCH requests of a graph.
+
+    Responses carry the version as their ETag. A GET with a matching If-None-Match header is answered with 304 Not Modified,
+    and a PATCH whose If-Match header does not match the current version with 412 Precondition Failed.
+    """
+    response: flask.Response
+    if flask.request.method == "PATCH":
+        with graphLock:
+            version: int = graphVersion(prefix)
+            if flask.request.if_match and not flask.request.if_match.contains(str(version)):
+                return flask.make_response(flask.jsonify({"version": version}), 412)
+            graph, changes = patchGraph(cache.get(prefix + "_graph"), flask.request.get_json(), directed)
+            version = commitGraph(prefix, channel, graph, changes, directed)
+        response = flask.jsonify({"version": version})
+    else:
+        version = graphVersion(prefix)
+        if flask.request.if_none_match.contains(str(version)):
+            response = flask.make_response("", 304)
+        else:
+            since: typing.Optional[int] = flask.request.args.get("since", type=int)
+            history: typing.List = cache.get(prefix + "_history") or []
+            if since is not None and since <= version and (since == version or (history and history[0][0] <= since + 1)):
+                response = flask.jsonify({"version": version, "since": since,
+                                          **mergeGraphChanges((entry for entry in history if entry[0] > since), directed)})
+            elif since is not None:
+                # The changes since that version are no longer known
+                response = flask.jsonify({"version": version, "graph": cache.get(prefix + "_graph")})
+            else:
+                response = flask.jsonify(cache.get(prefix + "_graph"))
+    response.set_etag(str(version))
+    return response
 
 
 # ********************* General *********************
@@ -61,11 +365,20 @@ def error_500(error: Exception) -> flask.typing.ResponseReturnValue:
     return flask.render_template("error_500.html"), 500
 
 
+def cachedFileResponse(cachedFile: file_cache.CachedFile) -> flask.Response:
+    """Serves a cached JSON file as it was serialized, gzip-compressed if the client accepts that, with its version as ETag."""
+    compress: bool = cachedFile.gzipBody is not None and "gzip" in flask.request.accept_encodings
+    response: flask.Response = flask.Response(cachedFile.gzipBody if compress else cachedFile.body, mimetype="application/json")
+    if compress:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    response.set_etag(cachedFile.etag + ("-gzip" if compress else ""))
+    return response.make_conditional(flask.request)
+
+
 @app.route("/aplan/config_params")
 def getConfigParams():
-    with open(staticDir + "json/config_params.json", "r") as read_file:
-        message = json.load(read_file)
-    return flask.jsonify(message)
+    return cachedFileResponse(fileCache.get(staticDir + "json/config_params.json"))
 
 
 @app.route("/aplan/animations", methods=["GET", "POST"])
@@ -82,7 +395,6 @@ def toggleAnimations():
 connectionGraphCachedParams = [
     "animations",
     "cg_file_location",
-    "cg_graph",
     "cg_selected_connections"
 ]
 
@@ -92,6 +404,9 @@ def clearCacheConnectionGraph():
     param: str
     for param in connectionGraphCachedParams:
         cache.delete(param)
+    # Cleared as a new version, so that clients fetching the changes since an earlier one are told
+    replaceGraph("cg", eventChannels["connection_graph"], None, directed=False)
+    eventChannels["connection_graph"].publish("reset")
     return "Success", 200
 
 
@@ -100,20 +415,23 @@ def connectionGraphJS():
     if flask.request.method == "GET":
         try:
             args: typing.Dict[str, str] = flask.request.args.to_dict()
-            with open(args.get("fileLoc", ""), "r") as read_file:
-                data = json.load(read_file)
-            cache.set("cg_graph", data)
-            return flask.jsonify(data)
+            cachedFile: file_cache.CachedFile = fileCache.get(args.get("fileLoc", ""))
+            setConnectionGraph(cachedFile.data)
+            return cachedFileResponse(cachedFile)
         except Exception as e:
             return flask.jsonify({"nodes": [], "links": []})
     elif flask.request.method == "POST":
-        cache.set("cg_graph", flask.request.get_json())
+        setConnectionGraph(flask.request.get_json())
         return "Success", 200
 
 
-@app.route("/aplan/connection_graph/json")
+def setConnectionGraph(data: typing.Dict) -> None:
+    replaceGraph("cg", eventChannels["connection_graph"], data, directed=False)
+
+
+@app.route("/aplan/connection_graph/json", methods=["GET", "PATCH"])
 def getConnectionGraphJSON():
-    return flask.jsonify(cache.get("cg_graph"))
+    return graphJSON("cg", eventChannels["connection_graph"], directed=False)
 
 
 @app.route("/aplan/connection_graph/selected_connections", methods=["GET", "POST"])
@@ -122,9 +440,15 @@ def getSelectedConnections():
         return flask.jsonify(cache.get("cg_selected_connections"))
     elif flask.request.method == "POST":
         cache.set("cg_selected_connections", flask.request.get_json())
+        eventChannels["connection_graph"].publish("selected", flask.request.get_json())
         return "Success", 200
 
 
+@app.route("/aplan/connection_graph/events")
+def getConnectionGraphEvents():
+    return streamEvents(eventChannels["connection_graph"])
+
+
 @app.route("/aplan/connection_graph")
 def renderConnectionGraph():
     args: typing.Dict[str, str] = flask.request.args.to_dict()
@@ -136,7 +460,6 @@ def renderConnectionGraph():
 obstructionGraphCachedParams = [
     "animations",
     "og_file_location",
-    "og_graph",
     "og_selected_obstructions"
 ]
 
@@ -146,6 +469,9 @@ def clearCacheObstructionGraph():
     param: str
     for param in obstructionGraphCachedParams:
         cache.delete(param)
+    # Cleared as a new version, so that clients fetching the changes since an earlier one are told
+    replaceGraph("og", eventChannels["obstruction_graph"], None, directed=True)
+    eventChannels["obstruction_graph"].publish("reset")
     return "Success", 200
 
 
@@ -154,20 +480,23 @@ def obstructionGraphJS():
     if flask.request.method == "GET":
         try:
             args: typing.Dict[str, str] = flask.request.args.to_dict()
-            with open(args.get("fileLoc", ""), "r") as read_file:
-                data = json.load(read_file)
-            cache.set("og_graph", data)
-            return flask.jsonify(data)
+            cachedFile: file_cache.CachedFile = fileCache.get(args.get("fileLoc", ""))
+            setObstructionGraph(cachedFile.data)
+            return cachedFileResponse(cachedFile)
         except Exception as e:
             return flask.jsonify({"nodes": [], "links": []})
     elif flask.request.method == "POST":
-        cache.set("og_graph", flask.request.get_json())
+        setObstructionGraph(flask.request.get_json())
         return "Success", 200
 
 
-@app.route("/aplan/obstruction_graph/json")
+def setObstructionGraph(data: typing.Dict) -> None:
+    replaceGraph("og", eventChannels["obstruction_graph"], data, directed=True)
+
+
+@app.route("/aplan/obstruction_graph/json", methods=["GET", "PATCH"])
 def getObstructionGraphJSON():
-    return flask.jsonify(cache.get("og_graph"))
+    return graphJSON("og", eventChannels["obstruction_graph"], directed=True)
 
 
 @app.route("/aplan/obstruction_graph/selected_obstructions", methods=["GET", "POST"])
@@ -176,11 +505,225 @@ def getSelectedObstructions():
         return flask.jsonify(cache.get("og_selected_obstructions"))
     elif flask.request.method == "POST":
         cache.set("og_selected_obstructions", flask.request.get_json())
+        eventChannels["obstruction_graph"].publish("selected", flask.request.get_json())
         return "Success", 200
 
 
+@app.route("/aplan/obstruction_graph/events")
+def getObstructionGraphEvents():
+    return streamEvents(eventChannels["obstruction_graph"])
+
+
 @app.route("/aplan/obstruction_graph")
 def renderObstructionGraph():
     args: typing.Dict[str, str] = flask.request.args.to_dict()
     cache.set("og_file_location", args.get("fileLoc", ""))
     return flask.render_template("obstruction_graph.html", fileLocation=cache.get("og_file_location"))
+
+
+# ********************* AND/OR graph *********************
+# Memory-mapped CompactAndOrGraphs with the modification time and size of their header by file location; they are read-only
+# and can be shared by the request threads. A graph is loaded again once its header changes, i.e. once it has been saved again.
+# StoredAndOrGraphs are opened per request instead, as an SQLite connection cannot be shared between threads.
+andOrGraphs: typing.Dict[str, typing.Tuple[typing.Tuple[int, int], graphs.CompactAndOrGraph]] = {}
+
+andOrGraphCachedParams = [
+    "aog_file_location"
+]
+
+AND_OR_GRAPH_PAGE_SIZE: typing.Final[int] = 50
+
+
+@contextlib.contextmanager
+def openAndOrGraph(fileLoc: str) -> typing.Iterator[typing.Union[graphs.CompactAndOrGraph, graphs.StoredAndOrGraph]]:
+    """Opens a graph saved by CompactAndOrGraph.save (a directory) or written by StoredAndOrGraph (an SQLite file)."""
+    if os.path.isdir(fileLoc):
+        stat: os.stat_result = os.stat(os.path.join(fileLoc, "header.json"))
+        stamp: typing.Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+        entry: typing.Optional[typing.Tuple[typing.Tuple[int, int], graphs.CompactAndOrGraph]] = andOrGraphs.get(fileLoc)
+        if entry is None or entry[0] != stamp:
+            entry = andOrGraphs[fileLoc] = (stamp, graphs.CompactAndOrGraph.load(fileLoc))
+        yield entry[1]
+    elif os.path.isfile(fileLoc):
+        graph: graphs.StoredAndOrGraph = graphs.StoredAndOrGraph(fileLoc)
+        try:
+            yield graph
+        finally:
+            graph.close()
+    else:
+        raise FileNotFoundError(fileLoc)
+
+
+def andOrGraphNode(graph: typing.Union[graphs.CompactAndOrGraph, graphs.StoredAndOrGraph], mask: int) -> typing.Dict:
+    elements: typing.List[str] = [label for index, label in enumerate(graph.labels) if mask >> index & 1]
+    return {"id": graphs.node_key(mask), "name": "[{}]".format(", ".join(elements)), "size": len(elements)}
+
+
+@app.route("/aplan/and_or_graph/clear_cache", methods=["POST"])
+def clearCacheAndOrGraph():
+    param: str
+    for param in andOrGraphCachedParams:
+        cache.delete(param)
+    andOrGraphs.clear()
+    return "Success", 200
+
+
+@app.route("/aplan/and_or_graph/root")
+def getAndOrGraphRoot():
+    args: typing.Dict[str, str] = flask.request.args.to_dict()
+    try:
+        with openAndOrGraph(args.get("fileLoc", "")) as graph:
+            rootMask: int = (1 << len(graph.labels)) - 1
+            hasRoot: bool = graph.node_id(rootMask) is not None if isinstance(graph, graphs.CompactAndOrGraph) else graph.has_subassembly(rootMask)
+            return flask.jsonify({"labels": graph.labels,
+                                  "no_nodes": graph.number_of_nodes(),
+                                  "no_hyperedges": graph.number_of_edges(),
+                                  "root": andOrGraphNode(graph, rootMask) if hasRoot else None})
+    except Exception as e:
+        return flask.jsonify({"labels": [], "no_nodes": 0, "no_hyperedges": 0, "root": None})
+
+
+@app.route("/aplan/and_or_graph/node/<nodeId>")
+def getAndOrGraphSubtree(nodeId: str):
+    """Returns one page of the hyperedges of a node, i.e. one level of its subtree; the children are expanded by requesting them in turn."""
+    args: typing.Dict[str, str] = flask.request.args.to_dict()
+    offset: int = int(args.get("offset", 0))
+    limit: int = int(args.get("limit", AND_OR_GRAPH_PAGE_SIZE))
+    try:
+        with openAndOrGraph(args.get("fileLoc", "")) as graph:
+            mask: int = int(nodeId, 16)
+            return flask.jsonify({**andOrGraphNode(graph, mask),
+                                  "no_hyperedges": graph.number_of_cutsets(mask),
+                                  "offset": offset,
+                                  "hyperedges": [{"children": [andOrGraphNode(graph, child) for child in children]}
+                                                 for children in graph.iter_cutsets(mask, offset, limit)]})
+    except Exception as e:
+        flask.abort(404)
+
+
+@app.route("/aplan/and_or_graph")
+def renderAndOrGraph():
+    args: typing.Dict[str, str] = flask.request.args.to_dict()
+    cache.set("aog_file_location", args.get("fileLoc", ""))
+    return flask.render_template("and_or_graph.html", fileLocation=cache.get("aog_file_location"))
+
+
+# ********************* Production serving *********************
+productionConfig = {
+    "DEBUG": False,
+    "CACHE_TYPE": "FileSystemCache",
+    "CACHE_DEFAULT_TIMEOUT": 0,
+    # No pruning; it would delete arbitrary entries, among which the graph versions and histories and the shared events.
+    # The number of entries is bounded by the graphs and by the files served through fileCache (one entry per path).
+    "CACHE_THRESHOLD": 0,
+    # Cache-Control max-age of the files under /static; they are revalidated with their ETag afterwards
+    "SEND_FILE_MAX_AGE_DEFAULT": 3600
+}
+
+COMPRESSIBLE_MIMETYPES: typing.Final[typing.FrozenSet[str]] = frozenset({"application/json", "application/javascript", "image/svg+xml",
+                                                                         "text/css", "text/html", "text/javascript", "text/plain"})
+# Compressed static files by (path, ETag, encoding)
+compressedStaticFiles: typing.Dict[typing.Tuple[str, str, str], bytes] = {}
+
+
+def compressResponse(response: flask.Response) -> flask.Response:
+    """Compresses the response with brotli or gzip, whichever the client prefers and is available; streams are left alone."""
+    isStatic: bool = flask.request.endpoint == "static"
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_MIMETYPES or "Content-Encoding" in response.headers
+            or (response.is_streamed and not isStatic)):
+        return response
+
+    encoding: typing.Optional[str] = None
+    if brotli is not None and "br" in flask.request.accept_encodings:
+        encoding = "br"
+    elif "gzip" in flask.request.accept_encodings:
+        encoding = "gzip"
+    response.vary.add("Accept-Encoding")
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    if etag is not None and flask.request.if_none_match.contains("{}-{}".format(etag, encoding)):
+        # The conditional request was checked against the ETag of the uncompressed response
+        notModified: flask.Response = flask.Response(status=304)
+        for header in ("Cache-Control", "Expires", "Vary"):
+            if header in response.headers:
+                notModified.headers[header] = response.headers[header]
+        notModified.set_etag("{}-{}".format(etag, encoding), weak)
+        return notModified
+
+    key: typing.Tuple[str, str, str] = (flask.request.path, str(etag), encoding)
+    body: typing.Optional[bytes] = compressedStaticFiles.get(key) if isStatic else None
+    if body is None:
+        response.direct_passthrough = False
+        data: bytes = response.get_data()
+        if len(data) < file_cache.MIN_GZIP_SIZE:
+            return response
+        body = brotli.compress(data) if encoding == "br" else gzip.compress(data, compresslevel=6)
+        if isStatic:
+            compressedStaticFiles[key] = body
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    if etag is not None:
+        response.set_etag("{}-{}".format(etag, encoding), weak)
+    return response
+
+
+def configureProduction(cacheDir: str) -> None:
+    """Switches to a cache in `cacheDir` that is shared by all worker processes, and compresses the responses."""
+    global graphLock, eventChannels
+    os.makedirs(cacheDir, exist_ok=True)
+    app.config.from_mapping({**productionConfig, "CACHE_DIR": cacheDir})
+    cache.init_app(app)
+    fileCache.setSharedCache(cache)
+
+    graphLock = ProcessLock(os.path.join(cacheDir, "graphs.lock"))
+    eventLock: ProcessLock = ProcessLock(os.path.join(cacheDir, "events.lock"))
+    eventChannels = {name: SharedEventChannel("events_" + name, eventLock) for name in eventChannels.keys()}
+    app.after_request(compressResponse)
+
+
+def serve(host: str, port: int, workers: int, threads: int) -> None:
+    """Runs the app with `workers` gunicorn processes of `threads` threads, or with a waitress process if there is a single
+    worker or gunicorn is unavailable. Every open event stream holds one of the threads."""
+    if workers > 1:
+        try:
+            import gunicorn.app.base
+
+            class Application(gunicorn.app.base.BaseApplication):
+                def load_config(self) -> None:
+                    for key, value in {"bind": "{}:{}".format(host, port), "workers": workers, "threads": threads,
+                                       "worker_class": "gthread", "timeout": 120}.items():
+                        self.cfg.set(key, value)
+
+                def load(self) -> flask.Flask:
+                    return app
+
+            Application().run()
+            return
+        except ImportError as ie:
+            print("Missing dependency! Please install the following Python module: {}".format(str(ie.name or "")),
+                  "Serving with a single process instead.")
+    import waitress
+    waitress.serve(app, host=host, port=port, threads=threads)
+
+
+def main(arguments: argparse.Namespace) -> None:
+    if arguments.production:
+        configureProduction(arguments.cache_dir)
+        serve(arguments.host, arguments.port, arguments.workers, arguments.threads)
+    else:
+        app.run(host=arguments.host, port=arguments.port, threaded=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serves the APLAN web app.")
+    parser.add_argument("--production", action="store_true", help="multi-worker server with a shared cache and compressed responses")
+    parser.add_argument("--host",       type=str, nargs='?', default="0.0.0.0")
+    parser.add_argument("--port",       type=int, nargs='?', default=8080)
+    parser.add_argument("--workers",    type=int, nargs='?', default=os.cpu_count() or 1, help="defaults to the number of CPUs")
+    parser.add_argument("--threads",    type=int, nargs='?', default=8, help="per worker")
+    parser.add_argument("--cache_dir",  type=str, nargs='?', default=os.path.join(tempfile.gettempdir(), "aplan_webapp_cache"))
+    args: argparse.Namespace
+    args, _ = parser.parse_known_args()
+    main(args)
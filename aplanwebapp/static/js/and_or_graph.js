@@ -0,0 +1,221 @@
+// Level-of-detail view of an AND/OR graph: only the root is loaded initially and the hyperedges of a subassembly are
+// requested by its node ID once it is expanded, one page at a time. Shared subassemblies are shown once per parent.
+class AndOrGraph {
+    constructor(fileLocation) {
+        var fileLocation = fileLocation;
+    }
+
+    run() {
+        d3.json("/aplan/config_params", function (jsonData) {
+            const params = jsonData;
+
+            var width = window.innerWidth,
+                height = window.innerHeight;
+
+            var i = 0;
+            var duration = 250;
+            var root = null;
+
+            var scale = parseFloat(params.force_simulation.init_scale) / 2;
+            var tx = width / 4,
+                ty = height / 2;
+
+            var svg = d3.select("div#container")
+                .append("div")
+                .classed("svg-container", true)
+                .append("svg")
+                .attr("viewBox", `0 0 ${width} ${height}`)
+                .classed("svg-content-responsive", true)
+                .on('wheel.zoom', zoom)
+                .append('g')
+                .attr('transform', `translate(${tx}, ${ty}) scale(${scale})`);
+
+            var tree = d3.layout.tree()
+                .nodeSize([2.5 * params.node.default.radius, 12 * params.node.default.radius]);
+
+            var diagonal = d3.svg.diagonal()
+                .projection(function (n) { return [n.y, n.x]; });
+
+            d3.json(`/aplan/and_or_graph/root?fileLoc=${fileLocation}`, function (json) {
+                if (json.root === null) {
+                    return;
+                }
+                root = orNode(json.root);
+                root.x0 = 0;
+                root.y0 = 0;
+                update(root);
+            });
+
+            function orNode(node) {
+                return {
+                    id: node.id,
+                    name: node.name,
+                    type: "or",
+                    expandable: node.size > 1,
+                    loaded: false,
+                    noHyperedges: 0,
+                    children: null,
+                    _children: null
+                };
+            }
+
+            function andNode(hyperedge) {
+                return {
+                    name: "",
+                    type: "and",
+                    expandable: true,
+                    loaded: true,
+                    children: hyperedge.children.map(orNode),
+                    _children: null
+                };
+            }
+
+            function moreNode(parent) {
+                return {
+                    name: `... ${parent.noHyperedges - loadedHyperedges(parent)} more`,
+                    type: "more",
+                    expandable: false,
+                    parent: parent,
+                    children: null,
+                    _children: null
+                };
+            }
+
+            function loadedHyperedges(n) {
+                return (n.children || n._children || []).filter(c => c.type === "and").length;
+            }
+
+            function loadHyperedges(n) {
+                d3.json(`/aplan/and_or_graph/node/${n.id}?fileLoc=${fileLocation}&offset=${loadedHyperedges(n)}`, function (json) {
+                    if (!json) {
+                        return;
+                    }
+                    let children = (n.children || n._children || []).filter(c => c.type === "and")
+                        .concat(json.hyperedges.map(andNode));
+                    n.noHyperedges = json.no_hyperedges;
+                    n.loaded = true;
+                    n.children = children;
+                    n._children = null;
+                    if (children.length < n.noHyperedges) {
+                        n.children.push(moreNode(n));
+                    }
+                    update(n);
+                });
+            }
+
+            function click(n) {
+                if (n.type === "more") {
+                    loadHyperedges(n.parent);
+                } else if (n.children) {
+                    n._children = n.children;
+                    n.children = null;
+                    update(n);
+                } else if (n._children) {
+                    n.children = n._children;
+                    n._children = null;
+                    update(n);
+                } else if (n.expandable && !n.loaded) {
+                    loadHyperedges(n);
+                }
+            }
+
+            // Source: https://gist.github.com/KarolAltamirano/b54c263184be0516a59d6baf7f053f3e
+            function zoom() {
+                // prevent default event behaviour
+                d3.event.preventDefault();
+
+                // set zooming
+                var factor = 1.1;
+                var center = d3.mouse(document.querySelector('svg'));
+                var newTx, newTy, newScale;
+
+                // calculate new scale
+                if (d3.event.deltaY < 0) {
+                    newScale = scale * factor;
+                } else {
+                    newScale = scale / factor;
+                }
+
+                // calculate new translate position
+                // [current mouse position] = ([current mouse position] - [current translate]) * magnification
+                newTx = center[0] - (center[0] - tx) * newScale / scale;
+                newTy = center[1] - (center[1] - ty) * newScale / scale;
+
+                // set new scale and translate position
+                scale = newScale;
+                tx = newTx;
+                ty = newTy;
+
+                svg.attr('transform', `translate(${tx}, ${ty}) scale(${scale})`);
+            }
+
+            function update(source) {
+                let nodes = tree.nodes(root);
+                let links = tree.links(nodes);
+
+                var node = svg.selectAll(".node")
+                    .data(nodes, function (n) { return n.uid || (n.uid = ++i); });
+
+                var nodeEnter = node.enter().append("g")
+                    .attr("class", "node")
+                    .attr("transform", function () { return `translate(${source.y0},${source.x0})`; })
+                    .on("click", click);
+
+                nodeEnter.filter(n => n.type === "or").append("circle")
+                    .attr("r", params.node.default.radius);
+
+                nodeEnter.filter(n => n.type === "and").append("rect")
+                    .attr("x", -params.node.default.radius / 2)
+                    .attr("y", -params.node.default.radius / 2)
+                    .attr("width", params.node.default.radius)
+                    .attr("height", params.node.default.radius)
+                    .style("fill", params.node.default.colour);
+
+                nodeEnter.append("text")
+                    .attr("dx", params.label.default.dx)
+                    .attr("dy", params.label.default.dy)
+                    .text(function (n) { return n.name; });
+
+                node.select("circle")
+                    .style("fill", function (n) { return n.expandable && !n.children ? params.node.highlight.colour : "#fff"; });
+
+                node.transition()
+                    .duration(duration)
+                    .attr("transform", function (n) { return `translate(${n.y},${n.x})`; });
+
+                node.exit().transition()
+                    .duration(duration)
+                    .attr("transform", function () { return `translate(${source.y},${source.x})`; })
+                    .remove();
+
+                var link = svg.selectAll(".link")
+                    .data(links, function (l) { return l.target.uid; });
+
+                link.enter().insert("path", "g")
+                    .attr("class", "link")
+                    .style("fill", "none")
+                    .attr("d", function () {
+                        let o = { x: source.x0, y: source.y0 };
+                        return diagonal({ source: o, target: o });
+                    });
+
+                link.transition()
+                    .duration(duration)
+                    .attr("d", diagonal);
+
+                link.exit().transition()
+                    .duration(duration)
+                    .attr("d", function () {
+                        let o = { x: source.x, y: source.y };
+                        return diagonal({ source: o, target: o });
+                    })
+                    .remove();
+
+                nodes.forEach(function (n) {
+                    n.x0 = n.x;
+                    n.y0 = n.y;
+                });
+            }
+        });
+    }
+}
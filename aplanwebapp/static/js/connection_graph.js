@@ -178,6 +178,7 @@ class ConnectionGraph {
                 defaultLinks(links);
 
                 links.splice(i, 1);
+                patchConnectionGraph({ remove_links: [{ source: link.source.name, target: link.target.name }] });
 
                 adjacentNodesDict[link.source.name] = adjacentNodesDict[link.source.name].filter(n => (n != link.target.name));
                 adjacentNodesDict[link.target.name] = adjacentNodesDict[link.target.name].filter(n => (n != link.source.name));
@@ -242,6 +243,7 @@ class ConnectionGraph {
                             source: newLink.source.name,
                             target: newLink.target.name
                         };
+                        patchConnectionGraph({ add_links: [newLinkNames] });
                         adjacentNodesDict[newLink.source.name].push(newLink.target.name);
                         adjacentNodesDict[newLink.target.name].push(newLink.source.name);
                         adjacentLinksDict[newLink.source.name].push(newLinkNames);
@@ -358,27 +360,12 @@ class ConnectionGraph {
                     .attr("transform", function (n) { return "translate(" + n.x + "," + n.y + ")"; });
             }
 
-            function postConnectionGraph() {
-                let processedGraph = {
-                    nodes: [],
-                    links: []
-                }
-
-                nodes.forEach(function (node) {
-                    processedGraph.nodes.push({ name: node.name });
-                });
-
-                links.forEach(function (link) {
-                    processedGraph.links.push({
-                        source: link.source.name,
-                        target: link.target.name
-                    });
-                });
-
-                fetch("/aplan/connection_graph/js", {
-                    method: "POST",
+            function patchConnectionGraph(changes) {
+                // Only the edited links are sent; the server keeps the graph and its versions
+                fetch("/aplan/connection_graph/json", {
+                    method: "PATCH",
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(processedGraph)
+                    body: JSON.stringify(changes)
                 });
             }
 
@@ -407,8 +394,6 @@ class ConnectionGraph {
                 link.exit()
                     .remove();
 
-                postConnectionGraph();
-
                 force.start();
             }
         });
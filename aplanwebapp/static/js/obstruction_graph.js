@@ -211,6 +211,7 @@ class ObstructionGraph {
                 defaultLinks(links);
 
                 links.splice(i, 1);
+                patchObstructionGraph({ remove_links: [{ source: link.source.name, target: link.target.name }] });
 
                 adjacentNodesDict[link.source.name] = adjacentNodesDict[link.source.name].filter(n => (n != link.target.name));
                 adjacentLinksDict[link.source.name] = adjacentLinksDict[link.source.name].filter(l => !(l.source === link.source.name && l.target === link.target.name));
@@ -270,6 +271,7 @@ class ObstructionGraph {
                             source: newLink.source.name,
                             target: newLink.target.name
                         };
+                        patchObstructionGraph({ add_links: [newLinkNames] });
                         adjacentNodesDict[newLink.source.name].push(newLink.target.name);
                         adjacentLinksDict[newLink.source.name].push(newLinkNames);
                         restart();
@@ -399,27 +401,12 @@ class ObstructionGraph {
                     .attr("transform", function (n) { return "translate(" + n.x + "," + n.y + ")"; });
             }
 
-            function postObstructionGraph() {
-                let processedGraph = {
-                    nodes: [],
-                    links: []
-                }
-
-                nodes.forEach(function (node) {
-                    processedGraph.nodes.push({ name: node.name });
-                });
-
-                links.forEach(function (link) {
-                    processedGraph.links.push({
-                        source: link.source.name,
-                        target: link.target.name
-                    });
-                });
-
-                fetch("/aplan/obstruction_graph/js", {
-                    method: "POST",
+            function patchObstructionGraph(changes) {
+                // Only the edited links are sent; the server keeps the graph and its versions
+                fetch("/aplan/obstruction_graph/json", {
+                    method: "PATCH",
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify(processedGraph)
+                    body: JSON.stringify(changes)
                 });
             }
 
@@ -449,8 +436,6 @@ class ObstructionGraph {
                 link.exit()
                     .remove();
 
-                postObstructionGraph();
-                
                 force.start();
             }
         });